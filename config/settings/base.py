@@ -21,6 +21,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "students.middleware.QueryInstrumentationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -62,3 +63,18 @@ STORAGES = {
 }
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# リクエストごとの SQL 計測（students.middleware.QueryInstrumentationMiddleware）
+# ビュー名 → 1 リクエストで許容するクエリ数。超えると WARNING ログ、
+# QUERY_BUDGET_ENFORCE=True（テスト）では例外にして N+1 の混入を検出する
+QUERY_BUDGETS = {
+    "company_portal_index": 6,
+    "admin:students_student_changelist": 16,
+    "admin:students_student_change": 20,
+}
+QUERY_BUDGET_ENFORCE = False
+QUERY_LOG_SLOWEST = 3
+
+# 学生の編集ロックの置き場所（students.services.edit_lock）
+# "table": StudentLock テーブル（既定） / "cache": Django キャッシュ（全プロセスで共有されるバックエンドが必要）
+STUDENT_LOCK_BACKEND = "table"
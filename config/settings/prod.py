@@ -36,6 +36,8 @@ LOGGING = {
         "django.request": {"handlers": ["console"], "level": "ERROR", "propagate": False},
         # DB/ORM系の例外調査に便利（うるさければ後でOFF）
         "django.db.backends": {"handlers": ["console"], "level": "ERROR", "propagate": False},
+        # リクエストごとのクエリ数・DB 時間（students.middleware）
+        "students.queries": {"handlers": ["console"], "level": "INFO", "propagate": False},
         # セキュリティ/CSRF系
         "django.security": {"handlers": ["console"], "level": "WARNING", "propagate": False},
     },
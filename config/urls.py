@@ -5,6 +5,7 @@ from students.views import (
     portal_index,
     redirect_to_company_students,
     upload_csv,
+    import_job_status,
     download_csv_template,
     exchange_csv,
 )
@@ -19,6 +20,9 @@ urlpatterns = [
     # ✅ CSVアップロード画面
     path("portal/upload/<int:company_id>/", upload_csv, name="student_upload_csv"),
 
+    # ✅ CSV取り込みジョブの進捗（JSON）
+    path("portal/upload/jobs/<int:job_id>/", import_job_status, name="student_import_job_status"),
+
     # ✅️ CSVテンプレートダウンロード
     path("portal/upload/<int:company_id>/template/", download_csv_template, name="student_csv_template"),
 
@@ -2,10 +2,17 @@
 set -eu
 
 echo "entrypoint start"
-echo "PORT=${PORT}"
+echo "PORT=${PORT:-}"
 echo "DJANGO_SETTINGS_MODULE=${DJANGO_SETTINGS_MODULE:-}"
 echo "PYTHONUNBUFFERED=${PYTHONUNBUFFERED:-}"
 
+# CSV 取り込みワーカー（ImportJob を処理）は Web とは別のサービス / コンテナとして起動する
+#   例: APP_ROLE=worker で同じイメージを起動（CPU を常時割り当てた Cloud Run サービスなど）
+# ワーカーをこのプロセスの本体として exec するので、落ちればコンテナごと終了し、実行基盤が再起動する
+if [ "${APP_ROLE:-web}" = "worker" ]; then
+  exec python manage.py run_import_worker
+fi
+
 exec gunicorn config.wsgi:application \
   --bind 0.0.0.0:${PORT} \
   --workers 1 \
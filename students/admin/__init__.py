@@ -3,3 +3,4 @@ from . import student
 from . import pattern
 from . import company
 from . import call_result
+from . import import_job
@@ -1,8 +1,23 @@
 from django.contrib import admin
-from ..models import CallResult
+from ..models import CallResult, CallResultOption
+
+
+class CallResultOptionInline(admin.TabularInline):
+    model = CallResultOption
+    fields = ('sort_order', 'label', 'code')
+    extra = 1
 
 
 @admin.register(CallResult)
 class CallResultAdmin(admin.ModelAdmin):
-    list_display = ('name', 'results')
+    inlines = [CallResultOptionInline]
+    list_display = ('name', 'result_labels')
     search_fields = ('name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('options')
+
+    def result_labels(self, obj):
+        return "、".join(obj.get_result_list())
+
+    result_labels.short_description = "コール結果リスト"
@@ -0,0 +1,191 @@
+import hashlib
+import json
+
+from django.contrib.admin.utils import build_q_object_from_lookup_parameters
+from django.contrib.admin.views.main import (
+    ALL_VAR, ChangeList, IS_FACETS_VAR, ORDER_VAR, PAGE_VAR,
+)
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+
+from ..filters.facets import FacetCountsMixin
+from ..services.edit_lock import get_lock_store
+from ..services.navigation import rows_after
+
+
+# キーセットページングのカーソル（前ページ最後の学生 ID）を渡すパラメータ
+CURSOR_VAR = 'after'
+
+# 件数の見積もりがこれを超えたら COUNT(*) をせず見積もり値を使う
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# フィルターの件数表示（?_facets=True）をキャッシュする秒数
+FACET_CACHE_TIMEOUT = 30
+
+# 件数に影響しないパラメータ（キャッシュキーから除く）
+FACET_IGNORED_PARAMS = (PAGE_VAR, ALL_VAR, ORDER_VAR, IS_FACETS_VAR, CURSOR_VAR)
+
+
+
+
+# *****************
+# クエリの件数を Postgres の実行計画から見積もる
+# ・EXPLAIN は実際には行を読まないので件数に関わらず一定時間
+# ・Postgres 以外では None（＝見積もれない）
+# *****************
+def estimate_count(queryset):
+    if connection.vendor != 'postgresql':
+        return None
+    if queryset.query.is_empty():
+        return 0
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+
+
+# *****************
+# 件数が多いときは見積もり値で済ませるページネーター
+# *****************
+class EstimatedCountPaginator(Paginator):
+    is_estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+            self.is_estimated = True
+            return estimate
+        return super().count
+
+
+
+
+# *****************
+# 学生一覧のチェンジリスト
+# ・?after=<学生ID> があれば、その学生の次の行から list_per_page 件を表示する（キーセットページング）
+# ・「次へ」リンクは常にキーセットで作るので、深いページでも OFFSET の読み飛ばしが発生しない
+# ・列ヘッダーで並び替えているときは通常のページ番号だけを使う
+# ・フィルターの件数表示は全フィルター分を集計クエリ 1 回で求める（get_facet_counts）
+# ・表示する行の編集ロックはロックストアから 1 回でまとめて読み、各行の lock_info に載せる
+# *****************
+class StudentChangeList(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        self.request = request
+        self.keyset_enabled = ORDER_VAR not in request.GET
+        self.cursor = None
+        self.has_next = False
+        if self.keyset_enabled:
+            try:
+                self.cursor = int(request.GET.get(CURSOR_VAR, ''))
+            except ValueError:
+                pass
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_filters(self, request):
+        filters = super().get_filters(request)
+        # 件数集計の母集団に使うため、フィルター以外の条件（company など）を控えておく
+        self.remaining_lookup_params = filters[2]
+        return filters
+
+    # *****************
+    # フィルターの件数表示
+    # ・各フィルターの選択肢ごとに「他のフィルターの選択条件 AND その選択肢」を
+    #   Count(filter=...) にして、1 回の aggregate で全フィルター分を数える
+    # ・同じ絞り込み条件の結果は FACET_CACHE_TIMEOUT 秒だけキャッシュする
+    # *****************
+    def get_facet_counts(self, filter_spec):
+        index = self.filter_specs.index(filter_spec)
+        prefix = f"{index}_"
+        return {
+            key[len(prefix):]: count
+            for key, count in self.facet_counts.items()
+            if key.startswith(prefix)
+        }
+
+    @cached_property
+    def facet_counts(self):
+        params = sorted(
+            (key, value) for key, value in self.request.GET.lists()
+            if key not in FACET_IGNORED_PARAMS
+        )
+        digest = hashlib.md5(repr(params).encode()).hexdigest()
+        key = f"students:facets:{self.request.GET.get('company')}:{digest}"
+        counts = cache.get(key)
+        if counts is None:
+            counts = self._aggregate_facet_counts()
+            cache.set(key, counts, FACET_CACHE_TIMEOUT)
+        return counts
+
+    def _aggregate_facet_counts(self):
+        qs = self.root_queryset.filter(
+            build_q_object_from_lookup_parameters(self.remaining_lookup_params)
+        )
+        qs, _ = self.model_admin.get_search_results(self.request, qs, self.query)
+
+        specs = [spec for spec in self.filter_specs if isinstance(spec, FacetCountsMixin)]
+        selected = {spec: spec.selected_q() for spec in specs}
+        aggregates = {}
+        for spec in specs:
+            others = Q()
+            for other in specs:
+                if other is not spec:
+                    others &= selected[other]
+            prefix = f"{self.filter_specs.index(spec)}_"
+            for key, choice_q in spec.get_facet_counts(self.pk_attname, qs).items():
+                aggregates[prefix + key] = Count(self.pk_attname, filter=choice_q & others)
+        if not aggregates:
+            return {}
+        return qs.order_by().aggregate(**aggregates)
+
+    def get_results(self, request):
+        super().get_results(request)
+        if self.cursor is not None:
+            self._get_keyset_results()
+        self._attach_locks(request)
+
+    def _get_keyset_results(self):
+        anchor = self.root_queryset.filter(pk=self.cursor).values_list('name', flat=True)
+        if not anchor:
+            self.cursor = None
+            return
+        rows = rows_after(self.queryset, anchor[0], self.cursor, self.list_per_page + 1)
+        self.has_next = len(rows) > self.list_per_page
+        self.result_list = rows[:self.list_per_page]
+        self.multi_page = True
+        self.can_show_all = False
+
+    def _attach_locks(self, request):
+        self.result_list = list(self.result_list)
+        locks = get_lock_store().get_many([obj.pk for obj in self.result_list])
+        for obj in self.result_list:
+            obj.lock_info = locks.get(obj.pk)
+            obj.lock_is_mine = obj.lock_info is not None and obj.lock_info.user_id == request.user.pk
+
+    @cached_property
+    def next_page_url(self):
+        if not self.keyset_enabled or not self.multi_page or self.show_all:
+            return None
+        if self.cursor is None:
+            if self.page_num >= self.paginator.num_pages:
+                return None
+            rows = list(self.result_list)
+        elif self.has_next:
+            rows = self.result_list
+        else:
+            return None
+        if not rows:
+            return None
+        return self.get_query_string({CURSOR_VAR: rows[-1].pk})
+
+    @cached_property
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
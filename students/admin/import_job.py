@@ -0,0 +1,16 @@
+from django.contrib import admin
+from ..models import ImportJob
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('company', 'filename', 'mode', 'dry_run', 'status', 'progress', 'created_count', 'updated_count', 'error_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'mode')
+    list_select_related = ('company',)
+    readonly_fields = (
+        'company', 'filename', 'mode', 'dry_run', 'status', 'progress', 'processed_rows',
+        'created_count', 'updated_count', 'unchanged_count', 'changes', 'error_count', 'errors', 'message', 'created_by', 'created_at', 'started_at', 'finished_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
@@ -1,44 +1,35 @@
-from datetime import timedelta
-from django.utils import timezone
-
-# ロックの最長有効時間（分）
-LOCK_EXPIRE_MINUTES = 1
+from ..services.edit_lock import HEARTBEAT_INTERVAL_SECONDS, LOCK_EXPIRE_MINUTES, get_lock, get_lock_store
 
 
+# *****************
+# 学生の編集ロック
+# ・ロックは Student の行ではなくロックストア（StudentLock テーブル or キャッシュ）に持つ
+#   （settings.STUDENT_LOCK_BACKEND、services.edit_lock を参照）
+# ・is_locked / lock_holder は判定だけで書き込みはしない
+# *****************
 def is_locked(student, user):
     """
     他ユーザーによってロック中かを判定。
-    同一ユーザーならロック継続（タイムスタンプ更新）。
-    他ユーザーは1分以内ならロック中、それ以降は解除扱い。
+    他ユーザーは LOCK_EXPIRE_MINUTES 以内ならロック中、それ以降は解除扱い。
     """
-    # ① ロックされていない or clear_lock が走っていれば編集可
-    if not student.locked_by:
-        return False
+    holder = get_lock(student.pk)
+    return holder is not None and holder.user_id != user.pk
 
-    # ② 同じユーザーならリフレッシュ＆編集可
-    if student.locked_by == user:
-        set_lock(student, user)
-        return False
 
-    # ③ 明示的に clear_lock() が呼ばれていない限りロック中
-    # 　→ フォールバックでタイムアウトを使う
-    expired = (timezone.now() - student.locked_at) >= timedelta(minutes=LOCK_EXPIRE_MINUTES)
-    return not expired
+def lock_holder(student):
+    """有効なロックを持っているユーザー名（無ければ None）"""
+    holder = get_lock(student.pk)
+    return holder.username if holder else None
 
 
 def set_lock(student, user):
     """
-    student を user でロック。locked_at を今に更新。
-    同一ユーザーが再度アクセスしたときにも呼ぶことで
-    タイムアウト延長を実現。
+    student を user でロック（同一ユーザーなら locked_at を今に更新して延長）。
+    他ユーザーが有効なロックを持っていれば何もせず False を返す。
     """
-    student.locked_by = user
-    student.locked_at = timezone.now()
-    student.save(update_fields=('locked_by', 'locked_at'))
+    return get_lock_store().acquire(student.pk, user)
 
 
-def clear_lock(student):
-    """ロックを明示解除する"""
-    student.locked_by = None
-    student.locked_at = None
-    student.save(update_fields=('locked_by', 'locked_at'))
+def clear_lock(student, user=None):
+    """ロックを明示解除する（user 指定時はその user のロックだけ）"""
+    get_lock_store().release(student.pk, user)
@@ -0,0 +1,29 @@
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from ..services.edit_lock import get_lock_store
+from .lock_status_view import LOCK_STATUS_MAX_IDS
+
+# 編集画面からの生存確認・ロック解除（CSRF トークン付きの POST）
+# ・ids=1,2,3 … 同じブラウザで開いている編集画面の学生 ID をまとめて送る（タブが何枚でも 1 リクエスト）
+# ・action=keepalive … 空き・期限切れ・自分のロックを 1 文で取得 / 延長（学生の行は書き換えない）
+#                      取れなかった学生 ID を lost で返す（他ユーザーに取られた。画面側で警告して開き直す）
+# ・action=release   … 自分が持っているロックを DELETE 1 回で解除（ページ離脱時に sendBeacon で送る）
+@require_POST
+def lock_heartbeat_view(request):
+    if not (request.user.is_active and request.user.is_staff):
+        return JsonResponse({'status': 'forbidden'}, status=403)
+    student_ids = [int(v) for v in request.POST.get('ids', '').split(',') if v.isdigit()]
+    student_ids = student_ids[:LOCK_STATUS_MAX_IDS]
+    action = request.POST.get('action', 'keepalive')
+    if action not in ('keepalive', 'release'):
+        return JsonResponse({'status': 'bad_request'}, status=400)
+    if not student_ids:
+        return JsonResponse({'status': action, 'held': 0, 'lost': []})
+
+    store = get_lock_store()
+    if action == 'release':
+        store.release_many(student_ids, request.user)
+        return JsonResponse({'status': 'released', 'held': 0, 'lost': []})
+    lost = store.heartbeat(student_ids, request.user)
+    return JsonResponse({'status': 'keepalive', 'held': len(student_ids) - len(lost), 'lost': lost})
@@ -0,0 +1,21 @@
+from django.http import JsonResponse
+
+from ..services.edit_lock import get_lock_store
+
+# 1 リクエストで問い合わせられる学生 ID の上限（一覧の最大表示件数より多めに）
+LOCK_STATUS_MAX_IDS = 500
+
+# チェンジリストのロック表示の定期更新
+# ?ids=1,2,3 の学生について、有効なロックを持っているユーザーをロックストアから 1 回で返す
+# 返すのはロック中の学生だけ（{"locks": {"<学生ID>": {"user": ユーザー名, "mine": 自分か}}}）
+def lock_status_view(request):
+    if not (request.user.is_active and request.user.is_staff):
+        return JsonResponse({'status': 'forbidden'}, status=403)
+    student_ids = [int(v) for v in request.GET.get('ids', '').split(',') if v.isdigit()]
+    locks = get_lock_store().get_many(student_ids[:LOCK_STATUS_MAX_IDS]) if student_ids else {}
+    return JsonResponse({
+        'locks': {
+            str(student_id): {'user': info.username, 'mine': info.user_id == request.user.pk}
+            for student_id, info in locks.items()
+        },
+    })
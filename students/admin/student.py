@@ -1,21 +1,29 @@
+from urllib.parse import urlencode
+
 from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
+from django.core.exceptions import FieldDoesNotExist, PermissionDenied
 from django.http import QueryDict
-from django.contrib.admin.views.main import ChangeList
-from django.http import HttpResponse
 from django.shortcuts import redirect
-from django.urls import reverse
-from django.db.models import Q
-from django.db.models.functions import Collate
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.views.decorators.http import require_POST
 
 from ..models import Student, Company
 from ..forms.student import StudentAdminForm
+from ..services.call_queue import claim_next_entry, parse_queue_key
+from ..services.call_results import get_pattern_config
+from ..services.csv_export import stream_students_csv
+from ..services.navigation import get_neighbour_ids, name_sort_key
 from ..filters.major_class import MajorClassByCompanyFilter
 from ..filters.minor_class import MinorClassByMajorFilter
 from ..filters.call_progress import CallProgressFilter
 from ..filters.call_progress_detailed import DetailedCallProgressFilter
 from ..filters.call_date import CallDateFilter
+from ..filters.grad_year import GradYearFilter
 
-from .lock import LOCK_EXPIRE_MINUTES, is_locked, set_lock, clear_lock
+from .changelist import EstimatedCountPaginator, StudentChangeList
+from .lock import HEARTBEAT_INTERVAL_SECONDS, LOCK_EXPIRE_MINUTES, set_lock, clear_lock, lock_holder
 from .urls import urlpatterns as custom_urls
 
 
@@ -30,15 +38,16 @@ class StudentAdmin(admin.ModelAdmin):
 
     # *****************
     # エントリー一覧への表示設定
-    # シメイ、電話番号、大分類、1コール目結果、2コール目結果、3コール目結果、TEL終了/処理済
+    # シメイ、電話番号、大分類、1コール目結果、2コール目結果、3コール目結果、TEL終了/処理済、編集中
     # *****************
     form = StudentAdminForm
     list_display = (
         'name', 'phone_number', 'major_class',
         'first_call_notes', 'second_call_notes', 'third_call_notes', 'done_tel',
+        'lock_status',
     )
     list_filter = (
-        'grad_year',
+        ('grad_year', GradYearFilter),
         MajorClassByCompanyFilter,
         MinorClassByMajorFilter,
         CallProgressFilter,
@@ -48,6 +57,15 @@ class StudentAdmin(admin.ModelAdmin):
     search_fields = ('name', 'phone_number')
     list_display_links = ('name',)
 
+    # *****************
+    # ページング
+    # ・件数が多い企業では COUNT(*) の代わりに実行計画の見積もり件数を使う
+    # ・絞り込みなしの全件数（full_result_count）は数えない
+    # ・「次へ」はキーセット（シメイ + id）で進む（StudentChangeList）
+    # *****************
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     class Media:
         css = {'all': ('students/css/admin_student.css',)}
 
@@ -58,56 +76,124 @@ class StudentAdmin(admin.ModelAdmin):
     # 選択された学生を CSV 形式でダウンロードするアクション
     # *****************
     def export_as_csv(self, request, queryset):
-        import io, csv
-        meta = self.model._meta
-        field_names = [
-            'company',              'name',                'phone_number',     'process_destination',
-            'data_id',              'grad_year',           'major_class',      'minor_class',
-            'first_call_date',      'first_call_timezone', 'first_call_notes', 'second_call_date',
-            'second_call_timezone', 'second_call_notes',   'third_call_date',  'third_call_timezone',
-            'third_call_notes',     'need_process',        'done_draft',       'done_tel',
-            'before_special_notes', 'after_special_notes', 'full_name',        'university',
-            'faculty',              'department',          'first_entry_date'
-        ]
-        filename = f"{meta.verbose_name_plural}.csv"
-
-        # 1） メモリ上に UTF-8 CSV を組み立て
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # ヘッダー行：英語のフィールド名そのまま
-        writer.writerow(field_names)
-
-        # 各レコードをループ
-        for obj in queryset:
-            row = []
-            for fn in field_names:
-                val = getattr(obj, fn)
-                if val is None:
-                    row.append('')
-                elif hasattr(val, '__str__') and not isinstance(val, (str, int, float)):
-                    row.append(str(val))
-                else:
-                    row.append(val)
-            writer.writerow(row)
-
-        # 2） Shift_JIS (cp932) に変換して応答
-        csv_data = output.getvalue().encode('cp932', errors='replace')
-        response = HttpResponse(csv_data, content_type='text/csv; charset=cp932')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        filename = f"{self.model._meta.verbose_name_plural}.csv"
+        return stream_students_csv(queryset, filename)
 
     export_as_csv.short_description = "選択された エントリー一覧 のダウンロード"
 
 
 
 
+    # *****************
+    # 編集中のユーザー表示
+    # ・lock_info は StudentChangeList が表示行分まとめて読んだもの（行ごとのクエリはない）
+    # ・表示後は change_list.js が lock-status エンドポイントで定期的に更新する
+    # *****************
+    def lock_status(self, obj):
+        info = getattr(obj, 'lock_info', None)
+        css_class = 'lock-badge'
+        if info:
+            css_class += ' is-mine' if obj.lock_is_mine else ' is-locked'
+        return format_html(
+            '<span class="{}" data-student-id="{}">{}</span>',
+            css_class, obj.pk, info.username if info else '',
+        )
+
+    lock_status.short_description = "編集中"
+
+
+
+
+
+
+    # *****************
+    # 一覧の絞り込み条件に一致する学生をすべて CSV で出力する
+    # ・チェックボックスでの選択を経由しないので件数取得や pk__in の往復がない
+    # *****************
+    def export_filtered_csv(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        filename = f"{self.model._meta.verbose_name_plural}.csv"
+        return stream_students_csv(self.get_filtered_queryset(request), filename)
+
+
+
+
+    # *****************
+    # 架電キューから次の学生を開く
+    # ・キューの行を取得済みにして編集ロックを取るので、CSRF トークン付きの POST のみ受け付ける
+    # ・一覧の company / detailed_call（例: 2_noon）で選んだキューの先頭を取得済みにして編集画面へ
+    # ・一覧の絞り込み条件は _changelist_filters で引き継ぐ（保存後に一覧へ戻れるように）
+    # ・キューが空なら一覧へ戻す
+    # *****************
+    def next_in_queue(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        changelist_url = f"{reverse('admin:students_student_changelist')}?{request.GET.urlencode()}"
+        queue_key = parse_queue_key(request.GET.get('detailed_call'))
+        company_id = request.GET.get('company', '')
+        if queue_key is None or not company_id.isdigit():
+            messages.warning(request, "企業と 2・3コール目の時間帯を選んでから開いてください。")
+            return redirect(changelist_url)
+        student_id = claim_next_entry(int(company_id), *queue_key, request.user)
+        if student_id is None:
+            messages.info(request, "本日の架電キューに残っている学生はいません。")
+            return redirect(changelist_url)
+        change_url = reverse('admin:students_student_change', args=[student_id])
+        return redirect(f"{change_url}?{urlencode({'_changelist_filters': request.GET.urlencode()})}")
+
+
+
+
+    def get_changelist(self, request, **kwargs):
+        return StudentChangeList
+
+
 
 
     def get_urls(self):
         from . import urls as custom_urls_module
+        export_urls = [
+            path(
+                'export/',
+                self.admin_site.admin_view(self.export_filtered_csv),
+                name='students_student_export',
+            ),
+            path(
+                'queue/next/',
+                self.admin_site.admin_view(require_POST(self.next_in_queue)),
+                name='students_student_queue_next',
+            ),
+        ]
         # カスタムURL を先頭に追加
-        return custom_urls_module.urlpatterns + super().get_urls()
+        return export_urls + custom_urls_module.urlpatterns + super().get_urls()
+
+
+
+
+    # *****************
+    # チェンジリストと同じ条件で絞り込んだクエリセット
+    # ・params は一覧のクエリ文字列（省略時は request.GET）
+    # ・company / call_date は filter_by_company、それ以外は list_filter のフィルタークラスをそのまま使う
+    # ・ChangeList を作らないので件数取得やページングのクエリは走らない
+    # *****************
+    def get_filtered_queryset(self, request, params=None):
+        params = request.GET if params is None else params
+        qs = self.filter_by_company(self.model._default_manager.all(), params)
+        filter_params = dict(params.lists())
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, type) and issubclass(list_filter, admin.SimpleListFilter):
+                spec = list_filter(request, filter_params, self.model, self)
+                qs = spec.queryset(request, qs)
+
+        # 項目フィルター（卒業年）と検索ボックス
+        grad_year = params.get('grad_year')
+        if grad_year:
+            qs = qs.filter(grad_year=grad_year)
+        search_term = params.get('q')
+        if search_term:
+            qs, _ = self.get_search_results(request, qs, search_term)
+        return qs
 
 
 
@@ -127,24 +213,10 @@ class StudentAdmin(admin.ModelAdmin):
                 extra_context['current_company_id'] = company.id
 
         if request.method == "GET":
-            try:
-                cl = ChangeList(
-                    request, self.model, self.list_display,
-                    self.list_display_links, self.list_filter,
-                    self.date_hierarchy, self.search_fields,
-                    self.list_select_related, self.list_per_page,
-                    self.list_max_show_all, self.list_editable, self
-                )
-                filtered_qs = cl.get_queryset(request)
-                ordering = self.get_ordering(request)
-                filtered_qs = filtered_qs.order_by(*ordering) if ordering else filtered_qs
-                id_list = list(filtered_qs.values_list("id", flat=True))
-
-                # 前後遷移に必要な情報をセッションへ保存
-                request.session["filtered_student_ids"] = id_list
-                request.session["_changelist_filters"] = request.GET.urlencode()
-            except Exception:
-                pass
+            # 前後遷移は詳細画面で絞り込み条件から都度求めるので、条件の文字列だけを保存する
+            request.session["_changelist_filters"] = request.GET.urlencode()
+            # 旧方式の ID リストが残っていれば削除してセッションを小さく保つ
+            request.session.pop("filtered_student_ids", None)
 
         return super().changelist_view(request, extra_context)
 
@@ -162,22 +234,58 @@ class StudentAdmin(admin.ModelAdmin):
             return qs
 
         # それ以外（＝一覧表示）のときだけ company= で絞る
-        company_id = request.GET.get('company')
+        return self.filter_by_company(qs, request.GET)
+
+
+
+
+    # *****************
+    # 一覧を列ヘッダーで並び替えているとき（?o=）の並び
+    # ・ChangeList.get_ordering と同じ解釈：指定した列の順 → queryset の並び（シメイ + id）
+    #   列番号は一覧の列（アクションがあれば先頭にチェックボックス列が付く）の位置
+    # ・並び替えていなければ None（一覧はシメイ + id のキーセット順）
+    # *****************
+    def get_list_ordering(self, request, params, queryset):
+        if not params.get(ORDER_VAR):
+            return None
+        list_display = list(self.get_list_display(request))
+        if self.get_actions(request):
+            list_display.insert(0, 'action_checkbox')
+        ordering = []
+        for part in params[ORDER_VAR].split('.'):
+            _, prefix, index = part.rpartition('-')
+            try:
+                field_name = list_display[int(index)]
+            except (IndexError, ValueError):
+                continue
+            try:
+                order_field = self.model._meta.get_field(field_name).name
+            except FieldDoesNotExist:
+                order_field = getattr(getattr(self, field_name, None), 'admin_order_field', None)
+            if order_field:
+                ordering.append(prefix + order_field)
+        return ordering + list(queryset.query.order_by)
+
+
+
+
+    # *****************
+    # 一覧の company / call_date の絞り込みと並び順
+    # *****************
+    def filter_by_company(self, qs, params):
+        company_id = params.get('company')
         if not company_id:
             # company パラメータがなければ一覧表示も何も出さない
             return qs.none()
         qs = qs.filter(company_id=company_id)
 
-        # ここに call_date の OR 絞り込みを追加
-        call_date = request.GET.get('call_date')
+        # 1〜3 コール目のいずれかが call_date の学生（コール履歴の索引で引く）
+        call_date = params.get('call_date')
         if call_date:
-            qs = qs.filter(
-                Q(first_call_date=call_date) |
-                Q(second_call_date=call_date) |
-                Q(third_call_date=call_date)
-            )
+            qs = qs.called_on(call_date)
 
-        return qs.order_by(Collate("name", "ja-x-icu"))
+        # id を第 2 キーにして student_company_name_idx の並びと一致させる
+        return qs.order_by(name_sort_key(), "id")
 
 
 
@@ -204,6 +312,7 @@ class StudentAdmin(admin.ModelAdmin):
     # ①セッションにチェンジリストのフィルタ情報を保存
     # ②トークスクリプト URL を取得
     # ③編集ロックのチェックと設定
+    # ④一覧の並びでの前後の学生へのリンク
     # *****************
     def change_view(self, request, object_id, form_url='', extra_context=None):
         student = self.get_object(request, object_id)
@@ -217,36 +326,15 @@ class StudentAdmin(admin.ModelAdmin):
                 request.session['_changelist_filters'] = filters
                 request.session['student_back_url'] = f"{reverse('admin:students_student_changelist')}?{filters}"
 
-        # ②filtersからQueryDictを再構成
-        filters = request.GET.get('_changelist_filters', '')
-        filter_qs = QueryDict(filters, mutable=False)
-
-        # 自前フィルタの構築（必要な分だけ追加）
-        qs = Student.objects.all()
+        # ②トークスクリプトURL（フォームの選択肢と同じキャッシュから。温まっていればクエリなし）
+        pattern_config = get_pattern_config(student.company_id, student.major_class)
+        talk_script_url = pattern_config.talk_script_url if pattern_config else None
 
-        if 'company' in filter_qs:
-            qs = qs.filter(company_id=filter_qs['company'])
-        if 'grad_year' in filter_qs:
-            qs = qs.filter(grad_year=filter_qs['grad_year'])
-        if 'major_class' in filter_qs:
-            qs = qs.filter(major_class=filter_qs['major_class'])
-
-        # ②トークスクリプトURL（既存コード維持）
-        talk_script_url = None
-        if student.company and student.major_class:
-            try:
-                pattern = student.company.pattern_config
-                item = pattern.items.filter(major_class=student.major_class).first()
-                if item and item.talk_script:
-                    talk_script_url = item.talk_script
-            except Company.pattern_config.RelatedObjectDoesNotExist:
-                pass
-
-        # ③編集ロック判定
-        if is_locked(student, request.user):
+        # ③編集ロックの取得（ロックストアへの条件付き書き込み。取れなければ他ユーザーが編集中）
+        if not set_lock(student, request.user):
             messages.warning(
                 request,
-                f"学生「{student.name}」は「{student.locked_by}」さんが編集中です。しばらく待ってから再度開いてください。"
+                f"学生「{student.name}」は「{lock_holder(student)}」さんが編集中です。しばらく待ってから再度開いてください。"
             )
             # 直前に保存されたチェンジリストのURLがあればそこへ、
             # なければ company パラメータだけのURLへフォールバック
@@ -256,15 +344,30 @@ class StudentAdmin(admin.ModelAdmin):
             base = reverse('admin:students_student_changelist')
             return redirect(f"{base}?company={student.company_id}")
 
-        set_lock(student, request.user)
+        # ④一覧の絞り込み条件から前後の学生を求める（ID リストは保持しない）
+        prev_student_url = next_student_url = None
+        if request.method == "GET":
+            filters = request.GET.get('_changelist_filters') or request.session.get('_changelist_filters', '')
+            filter_qs = QueryDict(filters)
+            filtered = self.get_filtered_queryset(request, filter_qs)
+            prev_id, next_id = get_neighbour_ids(filtered, student, self.get_list_ordering(request, filter_qs, filtered))
+            change_url = 'admin:students_student_change'
+            nav_query = f"?{urlencode({'_changelist_filters': filters})}" if filters else ''
+            if prev_id:
+                prev_student_url = f"{reverse(change_url, args=[prev_id])}{nav_query}"
+            if next_id:
+                next_student_url = f"{reverse(change_url, args=[next_id])}{nav_query}"
 
         # extra_contextの構築
         extra_context = extra_context or {}
 
         extra_context.update({
-            'unlock_url': reverse('admin:students_student_unlock', args=[object_id]),
+            'lock_heartbeat_url': reverse('admin:students_student_lock_heartbeat'),
+            'lock_heartbeat_seconds': HEARTBEAT_INTERVAL_SECONDS,
             'lock_expire_minutes': LOCK_EXPIRE_MINUTES,
             'talk_script_url': talk_script_url,
+            'prev_student_url': prev_student_url,
+            'next_student_url': next_student_url,
         })
 
         return super().change_view(request, object_id, form_url, extra_context)
@@ -278,7 +381,7 @@ class StudentAdmin(admin.ModelAdmin):
     # ・「保存して前の画面に戻る」リクエストを処理
     # *****************
     def response_change(self, request, obj):
-        clear_lock(obj)
+        clear_lock(obj, request.user)
 
         if "_save_back" in request.POST:
             back_url = request.session.pop("student_back_url", None)
@@ -295,5 +398,5 @@ class StudentAdmin(admin.ModelAdmin):
     # ・編集ロックを解除して通常のレスポンスを返す
     # *****************
     def response_add(self, request, obj, post_url_continue=None):
-        clear_lock(obj)
+        clear_lock(obj, request.user)
         return super().response_add(request, obj, post_url_continue)
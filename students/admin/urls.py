@@ -1,12 +1,19 @@
 from django.urls import path
-from .unlock_view import unlock_view
+from .lock_heartbeat_view import lock_heartbeat_view
+from .lock_status_view import lock_status_view
 
 app_name = 'students_admin'
 urlpatterns = [
-    # 詳細画面離脱時に呼ぶエンドポイント
+    # 編集画面からの生存確認・離脱時のロック解除（複数の学生をまとめて）
     path(
-        '<int:object_id>/unlock/',
-        unlock_view,
-        name='students_student_unlock'
+        'lock-heartbeat/',
+        lock_heartbeat_view,
+        name='students_student_lock_heartbeat'
+    ),
+    # 一覧のロック表示を定期更新するエンドポイント
+    path(
+        'lock-status/',
+        lock_status_view,
+        name='students_student_lock_status'
     ),
 ]
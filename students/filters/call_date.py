@@ -1,6 +1,5 @@
 # students/filters/call_date.py
 from django.contrib import admin
-from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 
 
@@ -21,9 +20,5 @@ class CallDateFilter(admin.SimpleListFilter):
         val = self.value()
         if not val:
             return queryset
-        # first_call_date, second_call_date, third_call_date のいずれかが選択日と一致するものを OR 条件で抽出
-        return queryset.filter(
-            Q(first_call_date=val) |
-            Q(second_call_date=val) |
-            Q(third_call_date=val)
-        )
+        # 1〜3 コール目のいずれかが選択日と一致するもの（CallAttempt の (call_date, student) 索引で引く）
+        return queryset.called_on(val)
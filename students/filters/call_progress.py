@@ -1,13 +1,24 @@
 from django.contrib import admin
+from django.db.models import Q
+
+from .facets import FacetCountsMixin
 
 
 # *****************
 # 架電ステータスフィルター
 # *****************
-class CallProgressFilter(admin.SimpleListFilter):
+class CallProgressFilter(FacetCountsMixin, admin.SimpleListFilter):
     title = '架電ステータス'
     parameter_name = 'call_progress'
 
+    # パラメータ値 → Student.call_stage
+    CALL_STAGES = {
+        'first': 'first',
+        'second': 'second',
+        'third': 'third',
+        'third_done_not_closed': 'third_done',
+    }
+
     def lookups(self, request, model_admin):
         return [
             ('first', '1コール目'),
@@ -17,35 +28,19 @@ class CallProgressFilter(admin.SimpleListFilter):
             ('done', 'TEL終了/処理済'),
         ]
 
+    # *****************
+    # 保存時に計算済みの call_stage で絞り込む
+    # (company, done_tel, call_stage, next_call_slot) の索引に乗る
+    # *****************
+    def choice_q(self, value):
+        if value == 'done':
+            return Q(done_tel=True)
+        if value in self.CALL_STAGES:
+            return Q(done_tel=False, call_stage=self.CALL_STAGES[value])
+        return None
+
     def queryset(self, request, queryset):
-        v = self.value()
-        if v == 'first':
-            return queryset.filter(
-                first_call_date__isnull=True,
-                done_tel=False
-                )
-        if v == 'second':
-            return queryset.filter(
-                first_call_date__isnull=False,
-                second_call_date__isnull=True,
-                done_tel=False
-                )
-        if v == 'third':
-            return queryset.filter(
-                first_call_date__isnull=False,
-                second_call_date__isnull=False,
-                third_call_date__isnull=True,
-                done_tel=False
-            )
-        if v == 'third_done_not_closed':
-            return queryset.filter(
-                first_call_date__isnull=False,
-                second_call_date__isnull=False,
-                third_call_date__isnull=False,
-                done_tel=False
-            )
-        if v == 'done':
-            return queryset.filter(
-                done_tel=True
-                )
-        return queryset
+        q = self.choice_q(self.value())
+        if q is None:
+            return queryset
+        return queryset.filter(q)
@@ -1,41 +1,9 @@
 from django.contrib import admin
+from django.db.models import Q
 from django.utils import timezone
-from ..models import Student
-
-
-# *****************
-# 1コール目の time zone から、「次に振り分ける」2コール目の time zone を返す。
-# morning → noon, noon → evening, evening → morning
-# *****************
-def determine_second_call_timezone(first):
-    timezones = ['morning', 'noon', 'evening']
-    try:
-        return timezones[(timezones.index(first) + 1) % 3]
-    except ValueError:
-        return None
-
-
-
-
-# *****************
-# 1,2コール目の time zone から、3コール目の time zone を返す。
-# - 異なる 2 つなら、残りのひとつ
-# - 同じなら、2コール目の次の time zone
-# *****************
-def determine_third_call_timezone(first, second):
-    timezones = ['morning', 'noon', 'evening']
-    used = {first, second}
-    if len(used) == 2:
-        remaining = list(set(timezones) - used)
-        return remaining[0] if remaining else None
-    else:
-        try:
-            idx = timezones.index(second)
-            return timezones[(idx + 1) % 3]
-        except ValueError:
-            return None
-
 
+from ..services.call_slot import call_due_q
+from .facets import FacetCountsMixin
 
 
 # *****************
@@ -43,7 +11,7 @@ def determine_third_call_timezone(first, second):
 # - 2コール目の時間帯（朝、昼、夕）
 # - 3コール目の時間帯（朝、昼、夕）
 # *****************
-class DetailedCallProgressFilter(admin.SimpleListFilter):
+class DetailedCallProgressFilter(FacetCountsMixin, admin.SimpleListFilter):
     title = '架電時間帯'
     parameter_name = 'detailed_call'
 
@@ -61,50 +29,19 @@ class DetailedCallProgressFilter(admin.SimpleListFilter):
     # クエリセットをフィルタリングする
     # - 2コール目の時間帯が指定された場合、1コール目の時間帯から次の時間帯を決定し、それに一致するレコードを抽出
     # - 3コール目の時間帯が指定された場合、1コール目と2コール目の時間帯から次の時間帯を決定し、それに一致するレコードを抽出
+    # - 次の時間帯は保存時に計算済みの next_call_slot で判定する（Student.objects.due_for_call と同じ条件）
     # - それ以外は何もしない
+    # - 条件は choice_q で Q として返し、件数表示の一括集計にも使う
     # *****************
-    def queryset(self, request, queryset):
-        v = self.value()
-        today = timezone.localdate()
-
-        # ベース queryset を作る
-        if v and v.startswith('2_'):
-            # ２コール目対象のみ抽出
-            base2 = queryset.filter(
-                done_tel=False,
-                first_call_date__isnull=False,
-                second_call_date__isnull=True,
-                first_call_date__lt=today
-            )
-            # "次の時間帯" が一致するものだけ残す
-            target_tz = v.split('_')[1]  # 'morning' etc.
-            # pks を Python 側で決めてからINで絞り込む
-            pks = [
-                s.pk
-                for s in base2
-                if determine_second_call_timezone(s.first_call_timezone) == target_tz
-            ]
-            return queryset.filter(pk__in=pks)
-
-        if v and v.startswith('3_'):
-            # ３コール目対象のみ抽出
-            base3 = queryset.filter(
-                done_tel=False,
-                first_call_date__isnull=False,
-                second_call_date__isnull=False,
-                third_call_date__isnull=True,
-                second_call_date__lt=today
-            )
-            target_tz = v.split('_')[1]
-            pks = [
-                s.pk
-                for s in base3
-                if determine_third_call_timezone(
-                    s.first_call_timezone,
-                    s.second_call_timezone
-                ) == target_tz
-            ]
-            return queryset.filter(pk__in=pks)
+    def choice_q(self, value):
+        if not value or value[:2] not in ('2_', '3_'):
+            return None
+        call_no = int(value[0])
+        target_tz = value.split('_')[1]  # 'morning' etc.
+        return call_due_q(call_no, timezone.localdate()) & Q(next_call_slot=target_tz)
 
-        # それ以外は何もしない
-        return queryset
+    def queryset(self, request, queryset):
+        q = self.choice_q(self.value())
+        if q is None:
+            return queryset
+        return queryset.filter(q)
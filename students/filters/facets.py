@@ -0,0 +1,44 @@
+from django.contrib.admin.utils import build_q_object_from_lookup_parameters
+from django.db.models import Q
+
+
+# *****************
+# 件数表示（?_facets=True）を StudentChangeList でまとめて計算するためのフィルター共通部品
+# ・choice_q(value) で選択肢ごとの条件を Q で返す（pk__in のサブクエリを作らない）
+# ・件数はフィルターごとに集計せず、changelist.get_facet_counts(self) から受け取る
+# *****************
+class FacetCountsMixin:
+    def choice_q(self, value):
+        raise NotImplementedError
+
+    def selected_q(self):
+        """現在選択されている条件（未選択なら空の Q）"""
+        value = self.value()
+        if value is None:
+            return Q()
+        return self.choice_q(value) or Q()
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {
+            f"{i}__c": q
+            for i, (lookup, _title) in enumerate(self.lookup_choices)
+            if (q := self.choice_q(lookup)) is not None
+        }
+
+    def get_facet_queryset(self, changelist):
+        return changelist.get_facet_counts(self)
+
+
+
+
+# *****************
+# 項目フィルター（FieldListFilter）用
+# 選択肢と選択中の条件は used_parameters から Q を組み立てる
+# *****************
+class FieldFacetCountsMixin(FacetCountsMixin):
+    def selected_q(self):
+        return build_q_object_from_lookup_parameters(self.used_parameters)
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        counts = super(FacetCountsMixin, self).get_facet_counts(pk_attname, filtered_qs)
+        return {key: count.filter for key, count in counts.items()}
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .facets import FieldFacetCountsMixin
+
+
+# *****************
+# 卒業年のフィルター
+# 選択肢は標準の AllValuesFieldListFilter と同じで、件数だけ一括集計に乗せる
+# *****************
+class GradYearFilter(FieldFacetCountsMixin, admin.AllValuesFieldListFilter):
+    pass
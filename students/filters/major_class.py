@@ -1,5 +1,7 @@
 from django.contrib import admin
-from ..models import Student
+from django.db.models import Q
+from .facets import FacetCountsMixin
+from ..services.class_choices import major_class_choices
 
 
 # *****************
@@ -7,7 +9,7 @@ from ..models import Student
 # このフィルタは、特定の企業に紐づく学生の大分類を選択できるようにする
 # 企業が選択されている場合、その企業に紐づく学生の大分類を取得し、選択肢として表示する
 # *****************
-class MajorClassByCompanyFilter(admin.SimpleListFilter):
+class MajorClassByCompanyFilter(FacetCountsMixin, admin.SimpleListFilter):
     title = '大分類'
     parameter_name = 'major_class'
 
@@ -17,15 +19,13 @@ class MajorClassByCompanyFilter(admin.SimpleListFilter):
         if not company_id:
             return []
 
-        # その企業かつ done_tel=False のレコードから distinct な major_class を取得
-        qs = Student.objects.filter(
-            company_id=company_id,
-            done_tel=False
-        )
-        choices = qs.values_list('major_class', 'major_class').distinct()
-        return [(mc, mc) for mc, _ in choices]
+        # その企業かつ done_tel=False のレコードにある major_class（企業ごとにキャッシュ）
+        return [(mc, mc) for mc in major_class_choices(company_id)]
+
+    def choice_q(self, value):
+        return Q(major_class=value) if value else None
 
     def queryset(self, request, queryset):
         if self.value():
-            return queryset.filter(major_class=self.value())
+            return queryset.filter(self.choice_q(self.value()))
         return queryset
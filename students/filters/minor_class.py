@@ -1,5 +1,7 @@
 from django.contrib import admin
-from ..models import Student
+from django.db.models import Q
+from .facets import FacetCountsMixin
+from ..services.class_choices import minor_class_choices
 
 
 # *****************
@@ -7,7 +9,7 @@ from ..models import Student
 # このフィルタは、特定の企業と大分類に紐づく学生の小分類を選択できるようにする
 # 企業と大分類が選択されている場合、その組み合わせに紐づく学生の小分類を取得し、選択肢として表示する
 # *****************
-class MinorClassByMajorFilter(admin.SimpleListFilter):
+class MinorClassByMajorFilter(FacetCountsMixin, admin.SimpleListFilter):
     title = '小分類'
     parameter_name = 'minor_class'
 
@@ -18,23 +20,15 @@ class MinorClassByMajorFilter(admin.SimpleListFilter):
         if not company_id or not major_class:
             return []
 
-        # 2) 「当該企業・大分類・小分類」ごとに、TEL終了（done_tel=True）ではないレコードが 1 件以上ある小分類だけを取得
-        #    -> 具体的には、まずすべての小分類を distinct で一覧化し、
-        #       さらにそのうち「done_tel が False のレコードを含む」ものだけを残す
+        # 2) 「当該企業・大分類」で TEL終了（done_tel=True）ではないレコードがある小分類を取得
+        #    企業ごとの 大分類 → 小分類 の対応をキャッシュから引く（services.class_choices）
+        # 3) タプル (value, display) のリスト形式で返却
+        return [(mc, mc) for mc in minor_class_choices(company_id, major_class)]
 
-        qs = Student.objects.filter(
-            company_id=company_id,
-            major_class=major_class,
-            done_tel=False
-        )
-
-        # 3) 上記クエリセットから distinct な minor_class 値を取り出す
-        choices = qs.values_list('minor_class', 'minor_class').distinct()
-
-        # 4) タプル (value, display) のリスト形式で返却
-        return [(mc, mc) for mc, _ in choices]
+    def choice_q(self, value):
+        return Q(minor_class=value) if value else None
 
     def queryset(self, request, queryset):
         if self.value():
-            return queryset.filter(minor_class=self.value())
+            return queryset.filter(self.choice_q(self.value()))
         return queryset
@@ -1,10 +1,11 @@
 from django import forms
-from ..models import Student, PatternItem
+from ..models import Student
+from ..services.call_results import get_pattern_config
 
 
 # *****************
 # フィールドの動的選択肢設定
-# ・company_id と major_class の組み合わせから PatternItem を取得
+# ・company_id と major_class の組み合わせからパターン設定を取得（services.call_results のキャッシュ）
 # ・該当する分類(classification)があれば、その結果リストを
 #   1〜3 コール目の「通話結果」フィールドの選択肢として設定
 # *****************
@@ -27,18 +28,10 @@ class StudentAdminForm(forms.ModelForm):
             or self.data.get("major_class")
         )
 
-        if company_id and major_class:
-            pattern_item = (
-                PatternItem.objects
-                .filter(pattern__company_id=company_id, major_class=major_class)
-                .select_related("classification")
-                .first()
+        config = get_pattern_config(company_id, major_class)
+        if config and config.results is not None:
+            select_widget = forms.Select(
+                choices=[("", "---------")] + [(r, r) for r in config.results]
             )
-
-            if pattern_item and pattern_item.classification:
-                results = pattern_item.classification.get_result_list()
-                select_widget = forms.Select(
-                    choices=[("", "---------")] + [(r, r) for r in results]
-                )
-                for field in ["first_call_notes", "second_call_notes", "third_call_notes"]:
-                    self.fields[field].widget = select_widget
+            for field in ["first_call_notes", "second_call_notes", "third_call_notes"]:
+                self.fields[field].widget = select_widget
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from students.models import Student
+
+
+# *****************
+# call_stage / next_call_slot / コール結果の選択肢（*_call_outcome）/ コール履歴の再計算
+# ・SQL 直接編集などで save() を通らずに更新された行を修復する
+# ・選択肢やパターンの変更を既存の学生に反映する
+# ・対象行をそれぞれ UPDATE 1 回（コール履歴は UPSERT + DELETE）でまとめて再計算する
+# *****************
+class Command(BaseCommand):
+    help = "学生の架電ステータス（call_stage / next_call_slot）・コール結果の選択肢・コール履歴を再計算します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--company", type=int, action="append", dest="company_ids",
+            help="対象の企業ID（複数指定可、省略時は全件）",
+        )
+
+    def handle(self, *args, company_ids=None, **options):
+        qs = Student.objects.all()
+        if company_ids:
+            qs = qs.filter(company_id__in=company_ids)
+        updated = qs.refresh_call_state()
+        qs.refresh_call_outcomes()
+        qs.sync_call_attempts()
+        self.stdout.write(self.style.SUCCESS(f"再計算完了: {updated} 件"))
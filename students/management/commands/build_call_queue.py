@@ -0,0 +1,41 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from students.services.call_queue import build_call_queue
+
+
+# *****************
+# その日の架電キュー（CallQueueEntry）を作る
+# ・毎朝、架電開始前に cron などで実行する想定
+# ・日中に作り直しても、取得済みの行は残して未取得の行だけ入れ替える
+# *****************
+class Command(BaseCommand):
+    help = "企業 × コール回数 × 時間帯ごとの架電キューを作成します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", type=date.fromisoformat, dest="queue_date",
+            help="対象日（YYYY-MM-DD、省略時は今日）",
+        )
+        parser.add_argument(
+            "--company", type=int, action="append", dest="company_ids",
+            help="対象の企業ID（複数指定可、省略時は全件）",
+        )
+        parser.add_argument(
+            "--operator", action="append", dest="operators",
+            help="割り振るオペレーターのユーザー名（複数指定可、省略時は割り振りなし）",
+        )
+
+    def handle(self, *args, queue_date=None, company_ids=None, operators=None, **options):
+        users = None
+        if operators:
+            User = get_user_model()
+            found = {u.get_username(): u for u in User.objects.filter(**{f"{User.USERNAME_FIELD}__in": operators})}
+            missing = [name for name in operators if name not in found]
+            if missing:
+                raise CommandError(f"ユーザーが見つかりません: {', '.join(missing)}")
+            users = [found[name] for name in operators]
+        created = build_call_queue(queue_date, company_ids, users)
+        self.stdout.write(self.style.SUCCESS(f"架電キュー作成完了: 未取得 {created} 件"))
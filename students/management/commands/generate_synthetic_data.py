@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from students.models import Company
+from students.services.synthetic import SYNTHETIC_COMPANY_PREFIX, generate_dataset
+
+
+# *****************
+# 負荷確認用の合成データ作成
+# ・企業名は「合成企業0000」から連番。--clear で既存の合成企業を学生ごと削除してから作る
+# *****************
+class Command(BaseCommand):
+    help = "負荷確認用の合成データ（企業・パターン・学生）を作成します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--companies", type=int, default=5, help="作成する企業数")
+        parser.add_argument("--students", type=int, default=1000, help="1 企業あたりの学生数")
+        parser.add_argument("--seed", type=int, default=0, help="乱数シード（同じ値なら同じデータ）")
+        parser.add_argument("--clear", action="store_true", help="既存の合成企業を削除してから作成する")
+
+    def handle(self, *args, companies, students, seed, clear, **options):
+        if clear:
+            deleted, _ = Company.objects.filter(name__startswith=SYNTHETIC_COMPANY_PREFIX).delete()
+            self.stdout.write(f"削除: {deleted} 件")
+        created = generate_dataset(companies, students, seed=seed)
+        self.stdout.write(self.style.SUCCESS(
+            f"作成完了: 企業 {len(created)} 社 × 学生 {students} 件"
+        ))
@@ -0,0 +1,74 @@
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from students.services.benchmark import run_suite
+
+
+# *****************
+# ベンチマーク
+# ・テスト用データベースを作り、データ量（1 企業あたりの学生数）ごとに合成データを入れて計測する
+# ・結果は JSON で出力し、コミット間で比較できるようにする
+# ・本番・開発のデータには触れない
+# *****************
+class Command(BaseCommand):
+    help = "主要画面・処理の所要時間を合成データで計測し、JSON で出力します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000", help="1 企業あたりの学生数（カンマ区切り）")
+        parser.add_argument("--companies", type=int, default=5, help="企業数")
+        parser.add_argument("--repeat", type=int, default=5, help="1 シナリオあたりの実行回数")
+        parser.add_argument("--upload-rows", type=int, default=1000, help="アップロード・変換に使う CSV の行数")
+        parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+        parser.add_argument("--output", help="出力先（省略時は benchmark-<日時>.json）")
+
+    def handle(self, *args, sizes, companies, repeat, upload_rows, seed, output, **options):
+        sizes = [int(size) for size in sizes.split(",") if size.strip()]
+        started_at = datetime.now()
+        output = output or f"benchmark-{started_at:%Y%m%d-%H%M%S}.json"
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        results = []
+        try:
+            for size in sizes:
+                call_command("flush", interactive=False, verbosity=0)
+                self.stdout.write(f"計測中: {companies} 社 × {size} 件")
+                for result in run_suite(size, companies, repeat, upload_rows, seed):
+                    results.append(result)
+                    self.stdout.write(
+                        f"  {result['name']:<45} {result['median_ms']:>10.1f} ms  {result['queries']:>4} queries"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "commit": self._git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "companies": companies,
+            "repeat": repeat,
+            "upload_rows": upload_rows,
+            "results": results,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"出力: {output}"))
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
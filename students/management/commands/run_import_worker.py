@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from students.services.import_jobs import process_pending_jobs
+
+
+# *****************
+# CSV 取り込みワーカー
+# ・ImportJob テーブルをキューとして、待機中のジョブを古い順に処理する
+# ・複数プロセスで起動しても SKIP LOCKED で同じジョブは取らない
+# *****************
+class Command(BaseCommand):
+    help = "待機中の CSV 取り込みジョブを処理します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="待機中のジョブを処理したら終了する",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=2.0,
+            help="ジョブがないときのポーリング間隔（秒）",
+        )
+
+    def handle(self, *args, once=False, interval=2.0, **options):
+        while True:
+            close_old_connections()
+            processed = process_pending_jobs()
+            if processed:
+                self.stdout.write(f"処理したジョブ: {processed} 件")
+            if once:
+                break
+            time.sleep(interval)
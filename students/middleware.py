@@ -0,0 +1,104 @@
+import heapq
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger("students.queries")
+
+
+
+
+class QueryBudgetExceeded(Exception):
+    """QUERY_BUDGET_ENFORCE=True のとき、ビューのクエリ数が QUERY_BUDGETS を超えたら送出する"""
+
+
+
+
+# *****************
+# 1 リクエスト分の SQL 計測
+# connection.execute_wrapper に渡し、件数・合計時間・遅い上位の文を記録する
+# *****************
+class QueryStats:
+    def __init__(self, keep_slowest):
+        self.count = 0
+        self.total = 0.0
+        self.keep_slowest = keep_slowest
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            item = (elapsed, self.count, sql)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    @property
+    def slowest(self):
+        return [
+            {"ms": round(elapsed * 1000, 2), "sql": sql[:300]}
+            for elapsed, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+
+
+# *****************
+# リクエストごとの SQL 計測ミドルウェア
+# ・クエリ数 / DB 時間 / 遅い文を構造化ログ（JSON 1 行）に出し、Server-Timing ヘッダーを付ける
+# ・QUERY_BUDGETS（ビュー名 → 上限クエリ数）を超えたら WARNING、
+#   QUERY_BUDGET_ENFORCE=True（テスト用）なら QueryBudgetExceeded を送出する
+# ・StreamingHttpResponse の本文を返す間のクエリは計測対象外
+# *****************
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats(getattr(settings, "QUERY_LOG_SLOWEST", 3))
+        start = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = getattr(settings, "QUERY_BUDGETS", {}).get(view_name)
+        over_budget = budget is not None and stats.count > budget
+
+        response["Server-Timing"] = (
+            f'db;dur={stats.total * 1000:.1f};desc="{stats.count} queries", '
+            f"total;dur={elapsed * 1000:.1f}"
+        )
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps({
+                "event": "request_queries",
+                "method": request.method,
+                "path": request.path,
+                "view": view_name,
+                "status": response.status_code,
+                "queries": stats.count,
+                "budget": budget,
+                "db_ms": round(stats.total * 1000, 1),
+                "total_ms": round(elapsed * 1000, 1),
+                "slowest": stats.slowest,
+            }, ensure_ascii=False),
+        )
+
+        if over_budget and getattr(settings, "QUERY_BUDGET_ENFORCE", False):
+            raise QueryBudgetExceeded(
+                f"{view_name}: {stats.count} queries (budget {budget})\n"
+                + "\n".join(item["sql"] for item in stats.slowest)
+            )
+        return response
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, CharField, Q, Value, When
+
+
+# この時点の振り分け規則（students.services.call_slot を後で変えても、このマイグレーションの結果は変えない）
+# 2コール目：1コール目の時間帯の次
+SECOND_CALL_SLOT = {'morning': 'noon', 'noon': 'evening', 'evening': 'morning'}
+# 3コール目：1,2コール目が異なれば残りのひとつ、同じなら 2コール目の次
+THIRD_CALL_SLOT = {
+    ('morning', 'morning'): 'noon',
+    ('morning', 'noon'): 'evening',
+    ('morning', 'evening'): 'noon',
+    ('noon', 'morning'): 'evening',
+    ('noon', 'noon'): 'evening',
+    ('noon', 'evening'): 'morning',
+    ('evening', 'morning'): 'noon',
+    ('evening', 'noon'): 'morning',
+    ('evening', 'evening'): 'morning',
+}
+
+
+def backfill_call_state(apps, schema_editor):
+    Student = apps.get_model('students', 'Student')
+    call_stage = Case(
+        When(done_tel=True, then=Value('done')),
+        When(first_call_date__isnull=True, then=Value('first')),
+        When(second_call_date__isnull=True, then=Value('second')),
+        When(third_call_date__isnull=True, then=Value('third')),
+        default=Value('third_done'),
+        output_field=CharField(),
+    )
+    open_q = ~Q(done_tel=True)
+    second_pending = open_q & Q(first_call_date__isnull=False, second_call_date__isnull=True)
+    third_pending = open_q & Q(first_call_date__isnull=False, second_call_date__isnull=False, third_call_date__isnull=True)
+    next_call_slot = Case(
+        *[
+            When(second_pending & Q(first_call_timezone=first), then=Value(slot))
+            for first, slot in SECOND_CALL_SLOT.items()
+        ],
+        *[
+            When(third_pending & Q(first_call_timezone=first, second_call_timezone=second), then=Value(slot))
+            for (first, second), slot in THIRD_CALL_SLOT.items()
+        ],
+        default=None,
+        output_field=CharField(),
+    )
+    Student.objects.update(call_stage=call_stage, next_call_slot=next_call_slot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0022_alter_student_done_tel'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='call_stage',
+            field=models.CharField(choices=[('first', '1コール目'), ('second', '2コール目'), ('third', '3コール目'), ('third_done', '3コール完了・未TEL終了'), ('done', 'TEL終了/処理済')], default='first', editable=False, max_length=20, verbose_name='架電ステータス'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='next_call_slot',
+            field=models.CharField(blank=True, choices=[('morning', '朝（9:00〜12:00）'), ('noon', '昼（12:00〜15:00）'), ('evening', '夕（15:00〜18:00）')], editable=False, max_length=10, null=True, verbose_name='次回架電時間帯'),
+        ),
+        migrations.RunPython(backfill_call_state, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'done_tel', 'call_stage', 'next_call_slot'], name='student_call_state_idx'),
+        ),
+    ]
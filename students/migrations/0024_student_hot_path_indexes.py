@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:57
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0023_student_call_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(models.F('company'), django.db.models.functions.comparison.Collate('name', 'ja-x-icu'), models.F('id'), name='student_company_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('done_tel', False)), fields=['company', 'major_class', 'minor_class'], name='student_open_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'first_call_date'], name='student_first_call_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'second_call_date'], name='student_second_call_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'third_call_date'], name='student_third_call_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0024_student_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255, verbose_name='ファイル名')),
+                ('data', models.BinaryField(verbose_name='ファイル内容')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '処理中'), ('succeeded', '完了'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='状態')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='進捗（%）')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='処理行数')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='登録件数')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='エラー件数')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='エラー内容')),
+                ('message', models.TextField(blank=True, verbose_name='メッセージ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='students.company', verbose_name='企業名')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='登録ユーザー')),
+            ],
+            options={
+                'verbose_name': 'インポートジョブ',
+                'verbose_name_plural': 'インポートジョブ一覧',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='importjob_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:05
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# この時点の正規化（students.services.phone.normalize_phone を後で変えても、このマイグレーションの結果は変えない）
+# 全角数字は NFKC で半角にし、数字以外を取り除く。数字が残らなければ None
+def normalize_phone(value):
+    if not value:
+        return None
+    digits = re.sub(r'\D', '', unicodedata.normalize('NFKC', str(value)))
+    return digits or None
+
+
+def backfill_phone_key(apps, schema_editor):
+    Student = apps.get_model('students', 'Student')
+    batch = []
+    for student in Student.objects.only('pk', 'phone_number').iterator(chunk_size=2000):
+        student.phone_key = normalize_phone(student.phone_number)
+        batch.append(student)
+        if len(batch) >= 2000:
+            Student.objects.bulk_update(batch, ['phone_key'])
+            batch = []
+    if batch:
+        Student.objects.bulk_update(batch, ['phone_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0025_importjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='changes',
+            field=models.JSONField(blank=True, default=list, verbose_name='更新内容（抜粋）'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='dry_run',
+            field=models.BooleanField(default=False, verbose_name='確認のみ（登録しない）'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='mode',
+            field=models.CharField(choices=[('create', '新規登録のみ'), ('upsert', '既存データを更新（学生ID・電話番号で照合）')], default='create', max_length=20, verbose_name='取り込みモード'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='unchanged_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='変更なし件数'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='更新件数'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, verbose_name='電話番号（照合用）'),
+        ),
+        migrations.RunPython(backfill_phone_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'data_id'], name='student_company_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'phone_key'], name='student_company_phone_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0026_import_upsert'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='student',
+            name='locked_at',
+        ),
+        migrations.RemoveField(
+            model_name='student',
+            name='locked_by',
+        ),
+        migrations.CreateModel(
+            name='StudentLock',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='edit_lock', serialize=False, to='students.student', verbose_name='エントリー')),
+                ('locked_at', models.DateTimeField(verbose_name='ロック時刻')),
+                ('locked_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='編集中ユーザー')),
+            ],
+            options={
+                'verbose_name': '編集ロック',
+                'verbose_name_plural': '編集ロック一覧',
+            },
+        ),
+    ]
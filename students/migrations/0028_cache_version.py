@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0027_student_lock_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='キャッシュ名')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='世代番号')),
+            ],
+            options={
+                'verbose_name': 'キャッシュ世代',
+                'verbose_name_plural': 'キャッシュ世代一覧',
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0028_cache_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallResultOption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.PositiveSmallIntegerField(blank=True, verbose_name='コード')),
+                ('label', models.CharField(max_length=100, verbose_name='コール結果')),
+                ('sort_order', models.PositiveSmallIntegerField(default=0, verbose_name='表示順')),
+                ('call_result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='options', to='students.callresult', verbose_name='分類')),
+            ],
+            options={
+                'verbose_name': 'コール結果の選択肢',
+                'verbose_name_plural': 'コール結果の選択肢一覧',
+                'ordering': ('sort_order', 'code'),
+            },
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='first_call_outcome',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='students.callresultoption', verbose_name='1コール目結果（選択肢）'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='second_call_outcome',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='students.callresultoption', verbose_name='2コール目結果（選択肢）'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='third_call_outcome',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='students.callresultoption', verbose_name='3コール目結果（選択肢）'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'first_call_outcome'], name='student_first_outcome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'second_call_outcome'], name='student_second_outcome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['company', 'third_call_outcome'], name='student_third_outcome_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='callresultoption',
+            constraint=models.UniqueConstraint(fields=('call_result', 'code'), name='callresultoption_code_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='callresultoption',
+            constraint=models.UniqueConstraint(fields=('call_result', 'label'), name='callresultoption_label_uniq'),
+        ),
+    ]
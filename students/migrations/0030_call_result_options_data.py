@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def split_results(apps, schema_editor):
+    """カンマ区切りの CallResult.results を CallResultOption の行に分解する"""
+    CallResult = apps.get_model('students', 'CallResult')
+    CallResultOption = apps.get_model('students', 'CallResultOption')
+    options = []
+    for call_result in CallResult.objects.all():
+        labels = []
+        for label in (x.strip() for x in call_result.results.split(',')):
+            if label and label not in labels:
+                labels.append(label)
+        options.extend(
+            CallResultOption(call_result=call_result, code=i + 1, label=label, sort_order=i)
+            for i, label in enumerate(labels)
+        )
+    CallResultOption.objects.bulk_create(options)
+
+
+def link_outcomes(apps, schema_editor):
+    """学生の 1〜3 コール目結果（文字列）を、企業・大分類のパターンの選択肢に紐づける"""
+    Student = apps.get_model('students', 'Student')
+    CallResultOption = apps.get_model('students', 'CallResultOption')
+
+    def outcome(notes_field):
+        return Subquery(
+            CallResultOption.objects
+            .filter(
+                label=OuterRef(notes_field),
+                call_result__patternitem__pattern__company=OuterRef('company'),
+                call_result__patternitem__major_class=OuterRef('major_class'),
+            )
+            .order_by('call_result__patternitem__id')
+            .values('id')[:1]
+        )
+
+    Student.objects.update(**{
+        f'{prefix}_call_outcome': outcome(f'{prefix}_call_notes')
+        for prefix in ('first', 'second', 'third')
+    })
+
+
+def join_results(apps, schema_editor):
+    """逆方向：選択肢を表示順にカンマ区切りで CallResult.results に戻す"""
+    CallResult = apps.get_model('students', 'CallResult')
+    for call_result in CallResult.objects.prefetch_related('options'):
+        options = sorted(call_result.options.all(), key=lambda o: (o.sort_order, o.code))
+        call_result.results = ','.join(o.label for o in options)
+        call_result.save(update_fields=['results'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0029_call_result_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_results, join_results),
+        migrations.RunPython(link_outcomes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0030_call_result_options_data'),
+    ]
+
+    operations = [
+        # 既定値を付けてから削除する（戻すときに既存行へ空文字で列を追加できるように）
+        migrations.AlterField(
+            model_name='callresult',
+            name='results',
+            field=models.TextField(default='', verbose_name='コール結果リスト（カンマ区切り）'),
+        ),
+        migrations.RemoveField(
+            model_name='callresult',
+            name='results',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0031_remove_callresult_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_no', models.PositiveSmallIntegerField(verbose_name='コール回数')),
+                ('call_date', models.DateField(blank=True, null=True, verbose_name='架電日')),
+                ('slot', models.CharField(blank=True, choices=[('morning', '朝（9:00〜12:00）'), ('noon', '昼（12:00〜15:00）'), ('evening', '夕（15:00〜18:00）')], max_length=50, null=True, verbose_name='時間区分')),
+                ('notes', models.CharField(blank=True, max_length=100, null=True, verbose_name='結果')),
+                ('outcome', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='students.callresultoption', verbose_name='結果（選択肢）')),
+                ('student', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='call_attempts', to='students.student', verbose_name='エントリー')),
+            ],
+            options={
+                'verbose_name': 'コール履歴',
+                'verbose_name_plural': 'コール履歴一覧',
+                'indexes': [models.Index(fields=['call_date', 'student'], name='callattempt_date_student_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'attempt_no'), name='callattempt_student_no_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:38
+
+from django.db import migrations
+
+
+# 既存の学生の 1〜3 コール目のカラムからコール履歴を作る（INSERT ... SELECT 1 文）
+BACKFILL_SQL = """
+INSERT INTO students_callattempt (student_id, attempt_no, call_date, slot, notes, outcome_id)
+SELECT s.id, v.attempt_no, v.call_date, v.slot, v.notes, v.outcome_id
+FROM students_student AS s
+CROSS JOIN LATERAL (VALUES
+    (1, s.first_call_date, s.first_call_timezone, s.first_call_notes, s.first_call_outcome_id),
+    (2, s.second_call_date, s.second_call_timezone, s.second_call_notes, s.second_call_outcome_id),
+    (3, s.third_call_date, s.third_call_timezone, s.third_call_notes, s.third_call_outcome_id)
+) AS v (attempt_no, call_date, slot, notes, outcome_id)
+WHERE v.call_date IS NOT NULL OR COALESCE(v.notes, '') <> ''
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0032_call_attempt'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_SQL, "DELETE FROM students_callattempt"),
+        migrations.RunSQL("ANALYZE students_callattempt", migrations.RunSQL.noop),
+    ]
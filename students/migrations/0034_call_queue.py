@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0033_call_attempt_backfill'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallQueueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue_date', models.DateField(verbose_name='架電日')),
+                ('call_no', models.PositiveSmallIntegerField(verbose_name='コール回数')),
+                ('slot', models.CharField(choices=[('morning', '朝（9:00〜12:00）'), ('noon', '昼（12:00〜15:00）'), ('evening', '夕（15:00〜18:00）')], max_length=10, verbose_name='時間区分')),
+                ('position', models.PositiveIntegerField(verbose_name='順番')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='取得時刻')),
+                ('assigned_to', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='担当者')),
+                ('claimed_by', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='取得ユーザー')),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='students.company', verbose_name='企業名')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='students.student', verbose_name='エントリー')),
+            ],
+            options={
+                'verbose_name': '架電キュー',
+                'verbose_name_plural': '架電キュー一覧',
+                'indexes': [models.Index(condition=models.Q(('claimed_at__isnull', True)), fields=['queue_date', 'company', 'call_no', 'slot', 'position'], name='callqueue_next_idx')],
+                'constraints': [models.UniqueConstraint(fields=('queue_date', 'student'), name='callqueue_date_student_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0034_call_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='company',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='students', to='students.company', verbose_name='企業名'),
+        ),
+    ]
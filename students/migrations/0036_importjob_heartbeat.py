@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+# 既に処理中のジョブは開始日時を最後の生存確認とみなす（止まっていれば claim_next_job が取り直す）
+RUNNING_HEARTBEAT_SQL = """
+UPDATE students_importjob
+SET heartbeat_at = COALESCE(started_at, created_at), attempts = 1
+WHERE status = 'running'
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0035_student_company_drop_fk_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='試行回数'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='生存確認日時'),
+        ),
+        migrations.RunSQL(RUNNING_HEARTBEAT_SQL, migrations.RunSQL.noop),
+    ]
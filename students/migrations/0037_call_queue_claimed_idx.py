@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0036_importjob_heartbeat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='callqueueentry',
+            index=models.Index(condition=models.Q(('claimed_at__isnull', False)), fields=['queue_date', 'company', 'call_no', 'slot', 'claimed_at'], name='callqueue_claimed_idx'),
+        ),
+    ]
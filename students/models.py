@@ -1,7 +1,28 @@
 from django.conf import settings
-from django.db import models
+from django.core.cache import cache
+from django.db import connection, models
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Collate
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
-from datetime import timedelta
+
+from .services.call_slot import (
+    call_due_q,
+    call_stage_expression,
+    determine_call_stage,
+    determine_next_call_slot,
+    next_call_slot_expression,
+)
+from .services.phone import normalize_phone
+
+
+# 架電結果の選択肢・トークスクリプトのキャッシュ（services.call_results）の世代名
+CALL_RESULTS_CACHE = 'call_results'
+
+# 大分類・小分類の選択肢のキャッシュ（services.class_choices）の世代名（企業ごとに f"{...}:{company_id}"）
+CLASS_CHOICES_CACHE = 'class_choices'
+
+
 
 
 # *****************
@@ -20,16 +41,60 @@ class Company(models.Model):
 
 
 
+# *****************
+# キャッシュの世代番号
+# ・設定系テーブルを保存・削除したら bump で番号を進め、各プロセスのキャッシュキーを切り替える
+#   （LocMem はプロセスごとなので、削除を伝える代わりに DB の番号でキーを変える）
+# ・current は番号自体を VERSION_CHECK_SECONDS だけプロセス内に持つので、毎回は問い合わせない
+# *****************
+class CacheVersion(models.Model):
+    VERSION_CHECK_SECONDS = 5
+
+    name = models.CharField('キャッシュ名', max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField('世代番号', default=0)
+
+    class Meta:
+        verbose_name = 'キャッシュ世代'
+        verbose_name_plural = 'キャッシュ世代一覧'
+
+    @staticmethod
+    def _cache_key(name):
+        return f"students:version:{name}"
+
+    @classmethod
+    def current(cls, name):
+        version = cache.get(cls._cache_key(name))
+        if version is None:
+            version = cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+            cache.set(cls._cache_key(name), version, cls.VERSION_CHECK_SECONDS)
+        return version
+
+    @classmethod
+    def bump(cls, name):
+        # 行が無ければ 1 で作る。UPSERT 1 文なので、初回の bump が同時に来ても両方の分だけ進む
+        with connection.cursor() as cursor:
+            table = cursor.db.ops.quote_name(cls._meta.db_table)
+            cursor.execute(
+                f"INSERT INTO {table} (name, version) VALUES (%s, 1) "
+                f"ON CONFLICT (name) DO UPDATE SET version = {table}.version + 1",
+                [name],
+            )
+        cache.delete(cls._cache_key(name))
+
+
+
+
 # *****************
 # 架電結果のモデル
 # 管理画面で自由に登録→その後学生のコール結果に利用
+# 選択肢は CallResultOption（表示順・コード付き）に 1 件ずつ持つ
+# 保存・削除すると選択肢キャッシュ（services.call_results）の世代を進める（_bump_call_results）
 # *****************
 class CallResult(models.Model):
     name = models.CharField('分類キー', max_length=50, unique=True)
-    results = models.TextField('コール結果リスト（カンマ区切り）')
 
     def get_result_list(self):
-        return [x.strip() for x in self.results.split(',') if x.strip()]
+        return [option.label for option in self.options.all()]
 
     class Meta:
         verbose_name = 'コール結果'
@@ -41,6 +106,41 @@ class CallResult(models.Model):
 
 
 
+# *****************
+# 架電結果の選択肢
+# ・code は分類内で一意な小さな整数（学生側は *_call_outcome でこの行を参照する）
+# ・code を空で保存すると分類内の最大値 + 1 を振る
+# *****************
+class CallResultOption(models.Model):
+    call_result = models.ForeignKey(CallResult, on_delete=models.CASCADE, related_name='options', verbose_name='分類')
+    code = models.PositiveSmallIntegerField('コード', blank=True)
+    label = models.CharField('コール結果', max_length=100)
+    sort_order = models.PositiveSmallIntegerField('表示順', default=0)
+
+    def save(self, *args, **kwargs):
+        if self.code is None:
+            last_code = (
+                CallResultOption.objects.filter(call_result_id=self.call_result_id)
+                .aggregate(last=models.Max('code'))['last']
+            )
+            self.code = (last_code or 0) + 1
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = 'コール結果の選択肢'
+        verbose_name_plural = 'コール結果の選択肢一覧'
+        ordering = ('sort_order', 'code')
+        constraints = [
+            models.UniqueConstraint(fields=['call_result', 'code'], name='callresultoption_code_uniq'),
+            models.UniqueConstraint(fields=['call_result', 'label'], name='callresultoption_label_uniq'),
+        ]
+
+    def __str__(self):
+        return self.label
+
+
+
+
 # *****************
 # 企業名に紐づく大分類、分類（直確TEL、即TELなど）、トークスクリプトの設定
 # *****************
@@ -60,6 +160,7 @@ class Pattern(models.Model):
 
 # *****************
 # パターンの中身
+# 保存・削除すると選択肢キャッシュ（services.call_results）の世代を進める（_bump_call_results）
 # *****************
 class PatternItem(models.Model):
     pattern = models.ForeignKey(Pattern, on_delete=models.CASCADE, related_name="items")
@@ -73,6 +174,143 @@ class PatternItem(models.Model):
 
 
 
+# *****************
+# 架電結果の設定（CallResult / CallResultOption / Pattern / PatternItem）が変わったら
+# 選択肢キャッシュ（services.call_results）の世代を進める
+# ・save() / delete() の上書きではなくシグナルにする。管理画面の一括削除（QuerySet.delete）や
+#   CASCADE での削除は delete() を通らないが、post_delete は 1 行ずつ送られる
+# ・パターンの企業の付け替え（Pattern の保存）も対象
+# *****************
+def _bump_call_results(sender, **kwargs):
+    CacheVersion.bump(CALL_RESULTS_CACHE)
+
+
+for _model in (CallResult, CallResultOption, Pattern, PatternItem):
+    post_save.connect(_bump_call_results, sender=_model, dispatch_uid=f"call_results_cache_save_{_model.__name__}")
+    post_delete.connect(_bump_call_results, sender=_model, dispatch_uid=f"call_results_cache_delete_{_model.__name__}")
+
+
+
+
+# *****************
+# コール結果の文字列 → 企業・大分類のパターンで一致する選択肢の ID（一括更新・バックフィル用）
+# *****************
+def call_outcome_expression(notes_field):
+    return Subquery(
+        CallResultOption.objects
+        .filter(
+            label=OuterRef(notes_field),
+            call_result__patternitem__pattern__company=OuterRef('company'),
+            call_result__patternitem__major_class=OuterRef('major_class'),
+        )
+        .order_by('call_result__patternitem__id')
+        .values('id')[:1]
+    )
+
+
+
+
+# *****************
+# 学生の 1〜3 コール目のカラム → CallAttempt（attempt_no = 1〜3）
+# ・日付か結果のどちらかが入っているコールだけを行にする
+# ・UPSERT は値が変わった行だけを書き換える
+# ・DELETE はカラムが空になったコールの行を消す（4 回目以降の行は残す）
+# *****************
+CALL_ATTEMPT_UPSERT_SQL = """
+INSERT INTO {attempt} (student_id, attempt_no, call_date, slot, notes, outcome_id)
+SELECT s.id, v.attempt_no, v.call_date, v.slot, v.notes, v.outcome_id
+FROM {student} AS s
+CROSS JOIN LATERAL (VALUES
+    (1, s.first_call_date, s.first_call_timezone, s.first_call_notes, s.first_call_outcome_id),
+    (2, s.second_call_date, s.second_call_timezone, s.second_call_notes, s.second_call_outcome_id),
+    (3, s.third_call_date, s.third_call_timezone, s.third_call_notes, s.third_call_outcome_id)
+) AS v (attempt_no, call_date, slot, notes, outcome_id)
+WHERE s.id IN ({scope})
+  AND (v.call_date IS NOT NULL OR COALESCE(v.notes, '') <> '')
+ON CONFLICT (student_id, attempt_no) DO UPDATE SET
+    call_date = EXCLUDED.call_date,
+    slot = EXCLUDED.slot,
+    notes = EXCLUDED.notes,
+    outcome_id = EXCLUDED.outcome_id
+WHERE ({attempt}.call_date, {attempt}.slot, {attempt}.notes, {attempt}.outcome_id)
+    IS DISTINCT FROM (EXCLUDED.call_date, EXCLUDED.slot, EXCLUDED.notes, EXCLUDED.outcome_id)
+"""
+
+CALL_ATTEMPT_DELETE_SQL = """
+DELETE FROM {attempt} AS a
+USING {student} AS s
+WHERE a.student_id = s.id
+  AND s.id IN ({scope})
+  AND NOT CASE a.attempt_no
+      WHEN 1 THEN s.first_call_date IS NOT NULL OR COALESCE(s.first_call_notes, '') <> ''
+      WHEN 2 THEN s.second_call_date IS NOT NULL OR COALESCE(s.second_call_notes, '') <> ''
+      WHEN 3 THEN s.third_call_date IS NOT NULL OR COALESCE(s.third_call_notes, '') <> ''
+      ELSE TRUE
+  END
+"""
+
+
+
+
+# *****************
+# 学生のクエリセット
+# 架電ステータス・次回時間帯は永続化カラム（call_stage / next_call_slot）で絞り込む
+# *****************
+class StudentQuerySet(models.QuerySet):
+    def due_for_call(self, call_no, slot=None, today=None):
+        """
+        call_no（2 or 3）コール目の架電対象に絞り込む。
+        slot（morning/noon/evening）を指定するとその時間帯のみ。
+        """
+        today = today or timezone.localdate()
+        qs = self.filter(call_due_q(call_no, today))
+        if slot:
+            qs = qs.filter(next_call_slot=slot)
+        return qs
+
+    def refresh_call_state(self):
+        """
+        call_stage / next_call_slot を UPDATE 1 回で再計算する。
+        save() を通らない一括更新（update / bulk_update）の後に呼ぶ。
+        """
+        return self.update(
+            call_stage=call_stage_expression(),
+            next_call_slot=next_call_slot_expression(),
+        )
+
+    def refresh_call_outcomes(self):
+        """
+        *_call_outcome をコール結果の文字列から UPDATE 1 回で再計算する。
+        選択肢やパターンを変更した後、既存の学生に反映するときに呼ぶ。
+        """
+        return self.update(**{
+            f'{prefix}_call_outcome': call_outcome_expression(f'{prefix}_call_notes')
+            for prefix in ('first', 'second', 'third')
+        })
+
+    def called_on(self, call_date):
+        """1〜3 コール目のいずれかが call_date の学生（CallAttempt の (call_date, student) 索引の範囲検索）"""
+        return self.filter(pk__in=CallAttempt.objects.filter(call_date=call_date).values('student_id'))
+
+    def sync_call_attempts(self):
+        """
+        1〜3 コール目のカラムから CallAttempt を作り直す（UPSERT と DELETE の 2 文、学生は読み込まない）。
+        save() を通らない一括登録・更新（COPY / bulk_create / update）の後に呼ぶ。
+        """
+        scope_sql, scope_params = self.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            qn = cursor.db.ops.quote_name
+            tables = {
+                'attempt': qn(CallAttempt._meta.db_table),
+                'student': qn(Student._meta.db_table),
+                'scope': scope_sql,
+            }
+            cursor.execute(CALL_ATTEMPT_UPSERT_SQL.format(**tables), scope_params)
+            cursor.execute(CALL_ATTEMPT_DELETE_SQL.format(**tables), scope_params)
+
+
+
+
 # *****************
 # 学生のモデル
 # *****************
@@ -82,8 +320,37 @@ class Student(models.Model):
         ('noon', '昼（12:00〜15:00）'),
         ('evening', '夕（15:00〜18:00）'),
     ]
-
-    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='students', null=True, verbose_name='企業名')
+    CALL_STAGE_CHOICES = [
+        ('first', '1コール目'),
+        ('second', '2コール目'),
+        ('third', '3コール目'),
+        ('third_done', '3コール完了・未TEL終了'),
+        ('done', 'TEL終了/処理済'),
+    ]
+    # call_stage / next_call_slot の算出に使うフィールド
+    CALL_STATE_SOURCE_FIELDS = frozenset({
+        'done_tel',
+        'first_call_date', 'second_call_date', 'third_call_date',
+        'first_call_timezone', 'second_call_timezone',
+    })
+    # *_call_outcome の算出に使うフィールド
+    CALL_OUTCOME_SOURCE_FIELDS = frozenset({
+        'company', 'major_class',
+        'first_call_notes', 'second_call_notes', 'third_call_notes',
+    })
+    CALL_OUTCOME_FIELDS = ('first_call_outcome', 'second_call_outcome', 'third_call_outcome')
+    # CallAttempt の元になるフィールド（結果の選択肢が変わる会社・大分類の変更も含む）
+    CALL_ATTEMPT_SOURCE_FIELDS = CALL_OUTCOME_SOURCE_FIELDS | frozenset({
+        'first_call_date', 'second_call_date', 'third_call_date',
+        'first_call_timezone', 'second_call_timezone', 'third_call_timezone',
+    })
+    # 大分類・小分類の選択肢（services.class_choices）に関わるフィールド（選択肢は TEL 未終了の学生から作る）
+    CLASS_FIELDS = frozenset({'company', 'company_id', 'major_class', 'minor_class', 'done_tel'})
+    CLASS_ATTNAMES = ('company_id', 'major_class', 'minor_class', 'done_tel')
+
+    # 企業での絞り込みは Meta.indexes の複合インデックス（すべて company が先頭）で引くので、単独のインデックスは作らない
+    # （単独インデックスがあると小さい企業ではプランナーがそちらを選び、複合インデックスの条件が効かない）
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='students', null=True, db_index=False, verbose_name='企業名')
 
     grad_year = models.IntegerField('卒年度', blank=True, null=True)
     major_class = models.CharField('大分類', max_length=100, blank=True, null=True)
@@ -97,12 +364,24 @@ class Student(models.Model):
     first_call_date = models.DateField('1コール目', blank=True, null=True)
     first_call_timezone = models.CharField('1コール目時間区分', max_length=50, blank=True, null=True, choices=CALL_TIMEZONE_CHOICES)
     first_call_notes = models.CharField('1コール目結果', max_length=100, blank=True, null=True)
+    first_call_outcome = models.ForeignKey(
+        CallResultOption, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        db_index=False, editable=False, verbose_name='1コール目結果（選択肢）',
+    )
     second_call_date = models.DateField('2コール目', blank=True, null=True)
     second_call_timezone = models.CharField('2コール目時間区分', max_length=50, blank=True, null=True, choices=CALL_TIMEZONE_CHOICES)
     second_call_notes = models.CharField('2コール目結果', max_length=100, blank=True, null=True)
+    second_call_outcome = models.ForeignKey(
+        CallResultOption, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        db_index=False, editable=False, verbose_name='2コール目結果（選択肢）',
+    )
     third_call_date = models.DateField('3コール目', blank=True, null=True)
     third_call_timezone = models.CharField('3コール目時間区分', max_length=50, blank=True, null=True, choices=CALL_TIMEZONE_CHOICES)
     third_call_notes = models.CharField('3コール目結果', max_length=100, blank=True, null=True)
+    third_call_outcome = models.ForeignKey(
+        CallResultOption, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        db_index=False, editable=False, verbose_name='3コール目結果（選択肢）',
+    )
 
     need_process = models.BooleanField('処理必要', default=False, blank=True, null=True)
     done_draft = models.BooleanField('Wチェ必要', default=False, blank=True, null=True)
@@ -117,45 +396,263 @@ class Student(models.Model):
 
     created_at = models.DateTimeField('登録日時', auto_now_add=True)
 
-    locked_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, verbose_name="編集中ユーザー")
-    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="ロック時刻")
-
-    def is_locked(self, user, expire_minutes=1):
-        """
-        他ユーザーによってロック中かどうか。
-        ロック有効期間はデフォルト 1 分。
-        locked_at は「最後にブラウザが生存確認した時刻」を示すように更新します。
-        """
-        if not self.locked_by or not self.locked_at:
-            return False
-        # 自分がロック中なら常に編集可能
-        if self.locked_by == user:
-            return False
-        # expire_minutes より古ければロック切れ
-        return (timezone.now() - self.locked_at) < timedelta(minutes=expire_minutes)
-
-    def acquire_lock(self, user):
-        """
-        編集開始／生存確認用。呼び出し側で
-        ・画面を開いたとき（初回）と
-        ・定期的（例:30秒ごと）に
-        これを呼ぶようにします。
-        """
-        self.locked_by = user
-        self.locked_at = timezone.now()
-        self.save(update_fields=('locked_by', 'locked_at'))
-
-    def release_lock(self):
-        """
-        明示的にロック解除したいときに呼び出す。
-        """
-        self.locked_by = None
-        self.locked_at = None
-        self.save(update_fields=('locked_by', 'locked_at'))
+    # 架電ステータスと次回架電時間帯（保存時に自動計算する非正規化カラム）
+    call_stage = models.CharField('架電ステータス', max_length=20, choices=CALL_STAGE_CHOICES, default='first', editable=False)
+    next_call_slot = models.CharField('次回架電時間帯', max_length=10, choices=CALL_TIMEZONE_CHOICES, blank=True, null=True, editable=False)
+    # 電話番号の照合キー（数字のみ、CSV 取り込みの重複判定に使用）
+    phone_key = models.CharField('電話番号（照合用）', max_length=20, blank=True, null=True, editable=False)
+
+
+    objects = StudentQuerySet.as_manager()
+
+    def refresh_call_state(self):
+        """コール日・時間帯・TEL終了から call_stage / next_call_slot を再計算する"""
+        self.call_stage = determine_call_stage(
+            self.done_tel, self.first_call_date, self.second_call_date, self.third_call_date,
+        )
+        self.next_call_slot = determine_next_call_slot(
+            self.call_stage, self.first_call_timezone, self.second_call_timezone,
+        )
+
+    def refresh_call_outcomes(self):
+        """1〜3 コール目結果の文字列を企業・大分類の選択肢に照合して *_call_outcome を設定する"""
+        # services.call_results は models を import するので循環しないようここで読み込む
+        from .services.call_results import get_pattern_config
+
+        config = get_pattern_config(self.company_id, self.major_class)
+        option_ids = config.option_ids if config else {}
+        for prefix in ('first', 'second', 'third'):
+            notes = getattr(self, f'{prefix}_call_notes')
+            setattr(self, f'{prefix}_call_outcome_id', option_ids.get(notes))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_classes = instance._class_values()
+        return instance
+
+    def _class_values(self):
+        # 読み込まなかった（defer した）フィールドは None 扱い（属性アクセスで追加のクエリを出さない）
+        return tuple(self.__dict__.get(attname) for attname in self.CLASS_ATTNAMES)
+
+    def save(self, *args, **kwargs):
+        self.refresh_call_state()
+        self.refresh_call_outcomes()
+        self.phone_key = normalize_phone(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        # 大分類・小分類・TEL終了（または企業）が読み込み時から変わったら、選択肢キャッシュの世代を進める
+        loaded_classes = getattr(self, '_loaded_classes', (None,) * len(self.CLASS_ATTNAMES))
+        classes_changed = (
+            (update_fields is None or self.CLASS_FIELDS.intersection(update_fields))
+            and self._class_values() != loaded_classes
+        )
+        # update_fields 指定時も、算出元が含まれていれば非正規化カラムを一緒に保存する
+        if update_fields is not None:
+            extra = set()
+            if self.CALL_STATE_SOURCE_FIELDS.intersection(update_fields):
+                extra |= {'call_stage', 'next_call_slot'}
+            if self.CALL_OUTCOME_SOURCE_FIELDS.intersection(update_fields):
+                extra.update(self.CALL_OUTCOME_FIELDS)
+            if 'phone_number' in update_fields:
+                extra.add('phone_key')
+            if extra:
+                kwargs['update_fields'] = {*update_fields, *extra}
+        super().save(*args, **kwargs)
+        # コール履歴（CallAttempt）を 1〜3 コール目のカラムに合わせる
+        if update_fields is None or self.CALL_ATTEMPT_SOURCE_FIELDS.intersection(update_fields):
+            Student.objects.filter(pk=self.pk).sync_call_attempts()
+        if classes_changed:
+            # services.class_choices は models を import するので循環しないようここで読み込む
+            from .services.class_choices import invalidate_class_choices
+
+            for company_id in {loaded_classes[0], self.company_id} - {None}:
+                invalidate_class_choices(company_id)
+            self._loaded_classes = self._class_values()
 
     class Meta:
         verbose_name = 'エントリー'
         verbose_name_plural = 'エントリー一覧'
+        indexes = [
+            # 架電ステータス／時間帯フィルター・ポータル集計
+            models.Index(
+                fields=['company', 'done_tel', 'call_stage', 'next_call_slot'],
+                name='student_call_state_idx',
+            ),
+            # 一覧の並び順（StudentAdmin.get_queryset の Collate("name", "ja-x-icu")）
+            models.Index(
+                F('company'), Collate('name', 'ja-x-icu'), F('id'),
+                name='student_company_name_idx',
+            ),
+            # 大分類・小分類フィルター（未TEL終了のみが対象なので部分インデックス）
+            models.Index(
+                fields=['company', 'major_class', 'minor_class'],
+                condition=Q(done_tel=False),
+                name='student_open_class_idx',
+            ),
+            # 架電日フィルター（1〜3コール目の OR を BitmapOr で結合させる）
+            models.Index(fields=['company', 'first_call_date'], name='student_first_call_idx'),
+            models.Index(fields=['company', 'second_call_date'], name='student_second_call_idx'),
+            models.Index(fields=['company', 'third_call_date'], name='student_third_call_idx'),
+            # CSV 取り込み（更新モード）の照合
+            models.Index(fields=['company', 'data_id'], name='student_company_data_id_idx'),
+            models.Index(fields=['company', 'phone_key'], name='student_company_phone_idx'),
+            # コール結果（選択肢）での絞り込み・企業ごとの結果別集計
+            models.Index(fields=['company', 'first_call_outcome'], name='student_first_outcome_idx'),
+            models.Index(fields=['company', 'second_call_outcome'], name='student_second_outcome_idx'),
+            models.Index(fields=['company', 'third_call_outcome'], name='student_third_outcome_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+
+
+# *****************
+# コール履歴（1 回のコールにつき 1 行）
+# ・「X 日に架電した／する学生」は (call_date, student) 索引の範囲検索 1 回で引ける
+#   （Student の 1〜3 コール目の日付カラムを OR で並べる必要がない）
+# ・互換のため、登録・編集は従来どおり Student の 1〜3 コール目のカラムで行い、
+#   save() / CSV 取り込みの後に StudentQuerySet.sync_call_attempts でこの表に反映する
+# *****************
+class CallAttempt(models.Model):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='call_attempts', db_index=False, verbose_name='エントリー')
+    attempt_no = models.PositiveSmallIntegerField('コール回数')
+    call_date = models.DateField('架電日', blank=True, null=True)
+    slot = models.CharField('時間区分', max_length=50, blank=True, null=True, choices=Student.CALL_TIMEZONE_CHOICES)
+    notes = models.CharField('結果', max_length=100, blank=True, null=True)
+    outcome = models.ForeignKey(CallResultOption, on_delete=models.SET_NULL, blank=True, null=True, related_name='+', verbose_name='結果（選択肢）')
+
+    class Meta:
+        verbose_name = 'コール履歴'
+        verbose_name_plural = 'コール履歴一覧'
+        constraints = [
+            # 学生ごとの履歴の取得・sync_call_attempts の UPSERT（ON CONFLICT）に使う
+            models.UniqueConstraint(fields=['student', 'attempt_no'], name='callattempt_student_no_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['call_date', 'student'], name='callattempt_date_student_idx'),
+        ]
+
+
+
+
+# *****************
+# その日の架電キュー（2・3コール目 × 時間帯ごと、企業別）
+# ・build_call_queue コマンドが朝に 1 回作る（services.call_queue）
+# ・次の学生は「未取得の行を position 順に 1 件」なので、部分インデックスの先頭を読むだけで決まる
+# ・assigned_to が空の行は誰でも、入っている行はその担当者だけが取る
+# ・取得済みの行は、編集ロックが切れても架電対象のままなら次の取り出し時に未取得へ戻る
+# *****************
+class CallQueueEntry(models.Model):
+    queue_date = models.DateField('架電日')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='+', db_index=False, verbose_name='企業名')
+    call_no = models.PositiveSmallIntegerField('コール回数')
+    slot = models.CharField('時間区分', max_length=10, choices=Student.CALL_TIMEZONE_CHOICES)
+    position = models.PositiveIntegerField('順番')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='+', verbose_name='エントリー')
+    assigned_to = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        db_index=False, verbose_name='担当者',
+    )
+    claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='+',
+        db_index=False, verbose_name='取得ユーザー',
+    )
+    claimed_at = models.DateTimeField('取得時刻', blank=True, null=True)
+
+    class Meta:
+        verbose_name = '架電キュー'
+        verbose_name_plural = '架電キュー一覧'
+        constraints = [
+            models.UniqueConstraint(fields=['queue_date', 'student'], name='callqueue_date_student_uniq'),
+        ]
+        indexes = [
+            # 次の学生の取り出し（未取得の行だけの部分インデックス）
+            models.Index(
+                fields=['queue_date', 'company', 'call_no', 'slot', 'position'],
+                condition=Q(claimed_at__isnull=True),
+                name='callqueue_next_idx',
+            ),
+            # 取得済みのまま放置された行の片付け（services.call_queue._release_stale_claims）
+            models.Index(
+                fields=['queue_date', 'company', 'call_no', 'slot', 'claimed_at'],
+                condition=Q(claimed_at__isnull=False),
+                name='callqueue_claimed_idx',
+            ),
+        ]
+
+
+
+
+# *****************
+# 学生の編集ロック
+# Student の行とは別の小さなテーブルに持ち、生存確認のたびに学生の行を書き換えない
+# 取得・解除は services.edit_lock（STUDENT_LOCK_BACKEND = "table" のとき）
+# *****************
+class StudentLock(models.Model):
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='edit_lock', verbose_name='エントリー')
+    locked_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', verbose_name="編集中ユーザー")
+    locked_at = models.DateTimeField(verbose_name="ロック時刻")
+
+    class Meta:
+        verbose_name = '編集ロック'
+        verbose_name_plural = '編集ロック一覧'
+
+
+
+
+# *****************
+# CSV 取り込みジョブのモデル
+# アップロードされたファイルを保存し、ワーカー（run_import_worker）が非同期で取り込む
+# *****************
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '処理中'),
+        ('succeeded', '完了'),
+        ('failed', '失敗'),
+    ]
+    MODE_CHOICES = [
+        ('create', '新規登録のみ'),
+        ('upsert', '既存データを更新（学生ID・電話番号で照合）'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='import_jobs', verbose_name='企業名')
+    filename = models.CharField('ファイル名', max_length=255)
+    data = models.BinaryField('ファイル内容', editable=False)
+    mode = models.CharField('取り込みモード', max_length=20, choices=MODE_CHOICES, default='create')
+    dry_run = models.BooleanField('確認のみ（登録しない）', default=False)
+    status = models.CharField('状態', max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField('進捗（%）', default=0)
+    processed_rows = models.PositiveIntegerField('処理行数', default=0)
+    created_count = models.PositiveIntegerField('登録件数', default=0)
+    updated_count = models.PositiveIntegerField('更新件数', default=0)
+    unchanged_count = models.PositiveIntegerField('変更なし件数', default=0)
+    changes = models.JSONField('更新内容（抜粋）', default=list, blank=True)
+    error_count = models.PositiveIntegerField('エラー件数', default=0)
+    errors = models.JSONField('エラー内容', default=list, blank=True)
+    message = models.TextField('メッセージ', blank=True)
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, verbose_name="登録ユーザー")
+    created_at = models.DateTimeField('登録日時', auto_now_add=True)
+    started_at = models.DateTimeField('開始日時', null=True, blank=True)
+    # 処理中のワーカーが定期的に更新する。止まったジョブは claim_next_job が取り直す
+    heartbeat_at = models.DateTimeField('生存確認日時', null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField('試行回数', default=0)
+    finished_at = models.DateTimeField('終了日時', null=True, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    class Meta:
+        verbose_name = 'インポートジョブ'
+        verbose_name_plural = 'インポートジョブ一覧'
+        indexes = [
+            # ワーカーが待機中ジョブを古い順に取り出す
+            models.Index(fields=['status', 'created_at'], name='importjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.company.name}: {self.filename}"
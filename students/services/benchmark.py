@@ -0,0 +1,138 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Student
+from .csv_import import OUTPUT_COLUMNS
+from .import_jobs import process_pending_jobs
+from .synthetic import generate_dataset, synthetic_csv, synthetic_rows
+
+
+BENCHMARK_USERNAME = "benchmark"
+
+
+
+
+# *****************
+# 1 シナリオを repeat 回実行して所要時間とクエリ数を記録する
+# ・func は Response を返す。ストリーミングの本文も読み切るまでを計測する
+# *****************
+def measure(name, size, func, repeat):
+    runs = []
+    queries = 0
+    status = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = func()
+            if response.streaming:
+                b"".join(response.streaming_content)
+            else:
+                response.content
+            runs.append((time.perf_counter() - start) * 1000)
+        queries = len(captured)
+        status = response.status_code
+    return {
+        "name": name,
+        "size": size,
+        "status": status,
+        "queries": queries,
+        "runs_ms": [round(ms, 2) for ms in runs],
+        "median_ms": round(statistics.median(runs), 2),
+        "min_ms": round(min(runs), 2),
+        "max_ms": round(max(runs), 2),
+    }
+
+
+
+
+# *****************
+# 「Airワーク」形式の変換元 CSV（exchange_csv のベンチマーク用）
+# *****************
+def _exchange_source_csv(rows):
+    lines = ["ふりがな,電話番号,応募ID,応募者名,学校名,学部・学科・専攻,応募日時"]
+    for row in rows:
+        lines.append(",".join([
+            row["name"], row["phone_number"], row["data_id"], row["full_name"],
+            row["university"], row["faculty"], row["first_entry_date"],
+        ]))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+
+
+# *****************
+# ベンチマーク一式
+# ・companies 社 × size 件の合成データを作り、主要画面・処理を計測する
+# ・空のデータベースで実行する前提（run_benchmarks コマンドがテスト用 DB を用意する）
+# *****************
+def run_suite(size, companies=5, repeat=5, upload_rows=1000, seed=0):
+    created = generate_dataset(companies, size, seed=seed)
+    company = created[-1]
+    today = timezone.localdate().isoformat()
+
+    user = get_user_model().objects.filter(username=BENCHMARK_USERNAME).first()
+    if user is None:
+        user = get_user_model().objects.create_superuser(BENCHMARK_USERNAME, "benchmark@example.com", None)
+    client = Client()
+    client.force_login(user)
+
+    changelist = reverse("admin:students_student_changelist")
+    base = f"company={company.id}"
+    students = company.students.order_by("id")
+    middle = students[students.count() // 2]
+
+    scenarios = [
+        ("portal_index", lambda: client.get(reverse("company_portal_index"))),
+        ("changelist", lambda: client.get(f"{changelist}?{base}")),
+        ("changelist_facets", lambda: client.get(f"{changelist}?{base}&_facets=True")),
+        ("changelist_deep_page", lambda: client.get(f"{changelist}?{base}&after={middle.pk}")),
+        ("changelist_major_minor", lambda: client.get(f"{changelist}?{base}&major_class=直確TEL&minor_class=A")),
+        ("changelist_call_date", lambda: client.get(f"{changelist}?{base}&call_date={today}")),
+    ]
+    for value in ("first", "second", "third", "third_done_not_closed", "done"):
+        scenarios.append((
+            f"changelist_call_progress_{value}",
+            lambda value=value: client.get(f"{changelist}?{base}&call_progress={value}"),
+        ))
+    for call_no in (2, 3):
+        for slot in ("morning", "noon", "evening"):
+            scenarios.append((
+                f"changelist_detailed_call_{call_no}_{slot}",
+                lambda v=f"{call_no}_{slot}": client.get(f"{changelist}?{base}&detailed_call={v}"),
+            ))
+    scenarios += [
+        ("change_view", lambda: client.get(
+            f"{reverse('admin:students_student_change', args=[middle.pk])}?_changelist_filters=company%3D{company.id}"
+        )),
+        ("export_filtered", lambda: client.get(f"{reverse('admin:students_student_export')}?{base}")),
+    ]
+    results = [measure(name, size, func, repeat) for name, func in scenarios]
+
+    # CSV アップロード（受付 + ジョブ実行）。毎回別の学生 ID で新規登録する
+    uploads = iter(range(repeat))
+
+    def upload():
+        data = synthetic_csv(upload_rows, company.name, seed=seed, start=size + next(uploads) * upload_rows)
+        response = client.post(
+            reverse("student_upload_csv", args=[company.id]),
+            {"csv_file": SimpleUploadedFile("benchmark.csv", data), "mode": "create"},
+        )
+        process_pending_jobs()
+        return response
+
+    results.append(measure("csv_upload", size, upload, repeat))
+
+    exchange_source = _exchange_source_csv(synthetic_rows(upload_rows, company.name, seed=seed))
+    results.append(measure("exchange_csv", size, lambda: client.post(reverse("exchange_csv"), {
+        "file": SimpleUploadedFile("source.csv", exchange_source),
+        "format_choice": "Airワーク",
+    }), repeat))
+    return results
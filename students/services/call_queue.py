@@ -0,0 +1,160 @@
+from datetime import timedelta
+from itertools import cycle
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from ..models import CallQueueEntry, Student, StudentLock
+from .call_slot import CALL_TIMEZONES, call_due_q
+from .edit_lock import expire_cutoff, get_lock_store
+from .navigation import name_sort_key
+
+
+# キューを作る対象（2・3コール目。1コール目は時間帯の決まりがない）
+QUEUE_CALL_STAGES = {'second': 2, 'third': 3}
+QUEUE_STAGE_NAMES = {call_no: stage for stage, call_no in QUEUE_CALL_STAGES.items()}
+
+# これより古い日付のキューは作り直すときに削除する
+QUEUE_KEEP_DAYS = 7
+
+# 登録のバッチサイズ
+QUEUE_BATCH_SIZE = 5000
+
+# 取り出した学生の編集ロックが取れなかったとき、次の行を試す回数
+CLAIM_RETRIES = 5
+
+
+
+
+def parse_queue_key(value):
+    """'2_noon' → (2, 'noon')。DetailedCallProgressFilter の値と同じ形式、それ以外は None"""
+    call_no, _, slot = (value or '').partition('_')
+    if call_no not in ('2', '3') or slot not in CALL_TIMEZONES:
+        return None
+    return int(call_no), slot
+
+
+
+
+# *****************
+# その日の架電キューを作る
+# ・対象は DetailedCallProgressFilter / Student.objects.due_for_call と同じ条件（保存済みの call_stage / next_call_slot）
+# ・並びは一覧と同じ（シメイ + id）。企業 × コール回数 × 時間帯ごとに 1 から順番を振る
+# ・operators を渡すと、各キューの行を順番に担当者へ割り振る
+# ・作り直しても、既に取得済みの行はそのまま残す（未取得の行だけ入れ替える）
+# ・戻り値は作り直した後の未取得の行数
+# *****************
+def build_call_queue(queue_date=None, company_ids=None, operators=None):
+    queue_date = queue_date or timezone.localdate()
+    students = Student.objects.filter(company__isnull=False, next_call_slot__isnull=False)
+    if company_ids:
+        students = students.filter(company_id__in=company_ids)
+    due = Q()
+    for call_no in QUEUE_CALL_STAGES.values():
+        due |= call_due_q(call_no, queue_date)
+    rows = (
+        students.filter(due)
+        .order_by('company_id', name_sort_key(), 'id')
+        .values_list('pk', 'company_id', 'call_stage', 'next_call_slot')
+    )
+
+    entries = CallQueueEntry.objects.filter(queue_date=queue_date)
+    if company_ids:
+        entries = entries.filter(company_id__in=company_ids)
+
+    positions = {}
+    assignees = {}
+    batch = []
+    with transaction.atomic():
+        CallQueueEntry.objects.filter(queue_date__lt=queue_date - timedelta(days=QUEUE_KEEP_DAYS)).delete()
+        entries.filter(claimed_at__isnull=True).delete()
+        for student_id, company_id, call_stage, slot in rows.iterator(chunk_size=QUEUE_BATCH_SIZE):
+            key = (company_id, QUEUE_CALL_STAGES[call_stage], slot)
+            positions[key] = positions.get(key, 0) + 1
+            if operators and key not in assignees:
+                assignees[key] = cycle(operators)
+            batch.append(CallQueueEntry(
+                queue_date=queue_date, company_id=company_id, call_no=key[1], slot=slot,
+                position=positions[key], student_id=student_id,
+                assigned_to=next(assignees[key]) if operators else None,
+            ))
+            if len(batch) >= QUEUE_BATCH_SIZE:
+                CallQueueEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            CallQueueEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        return entries.filter(claimed_at__isnull=True).count()
+
+
+
+
+# *****************
+# キューの行の学生が、今もその回数・時間帯の架電対象か
+# ・キューは朝に作るので、その後に一覧から架電結果を入れた学生は call_stage / next_call_slot が進んでいる
+# *****************
+def _still_due(call_no, slot):
+    return Q(student__done_tel=False, student__call_stage=QUEUE_STAGE_NAMES[call_no], student__next_call_slot=slot)
+
+
+
+
+# *****************
+# 取得済みのまま放置された行を片付ける（取り出しのたびに、そのキューの分だけ）
+# ・学生がもう架電対象でない（架電結果を保存した）行は削除する
+# ・残りのうち、取得から編集ロックの有効時間以上たち、有効な編集ロックも無い行（編集画面を閉じた・放置した）は
+#   未取得に戻し、元の順番で再び取り出せるようにする
+# *****************
+def _release_stale_claims(queue, call_no, slot, store):
+    claimed = queue.filter(claimed_at__isnull=False)
+    claimed.exclude(_still_due(call_no, slot)).delete()
+    stale = dict(claimed.filter(claimed_at__lte=expire_cutoff()).values_list('student_id', 'pk'))
+    if not stale:
+        return
+    locks = store.get_many(list(stale))
+    abandoned = [pk for student_id, pk in stale.items() if student_id not in locks]
+    if abandoned:
+        CallQueueEntry.objects.filter(pk__in=abandoned).update(claimed_by=None, claimed_at=None)
+
+
+
+
+# *****************
+# キューから次の学生を 1 人取り出し、編集ロックを取る
+# ・未取得で自分の担当（または担当なし）の行を position 順に 1 件、SELECT ... FOR UPDATE SKIP LOCKED で読む
+#   （callqueue_next_idx の先頭。他のオペレーターが取り出し中の行は待たずに飛ばす）
+# ・今はもう架電対象でない学生（_still_due）、他ユーザーが編集中（有効なロックあり）の学生は飛ばす
+# ・行の取得済み更新と編集ロックの取得は同じトランザクションで行う（ロックが取れなければ次の行へ）
+# ・取り出した学生の ID を返す（残っていなければ None）
+# *****************
+def claim_next_entry(company_id, call_no, slot, user, queue_date=None):
+    queue = CallQueueEntry.objects.filter(
+        queue_date=queue_date or timezone.localdate(), company_id=company_id, call_no=call_no, slot=slot,
+    )
+    locked_by_others = (
+        StudentLock.objects
+        .filter(student_id=OuterRef('student_id'), locked_at__gt=expire_cutoff())
+        .exclude(locked_by=user)
+    )
+    candidates = (
+        queue
+        .filter(_still_due(call_no, slot), claimed_at__isnull=True)
+        .filter(Q(assigned_to=user) | Q(assigned_to__isnull=True))
+        .exclude(Exists(locked_by_others))
+        .order_by('position')
+        .select_for_update(skip_locked=True, of=('self',))
+    )
+    store = get_lock_store()
+    _release_stale_claims(queue, call_no, slot, store)
+    skipped = []
+    with transaction.atomic():
+        for _ in range(CLAIM_RETRIES):
+            entry = candidates.exclude(pk__in=skipped).values_list('pk', 'student_id').first()
+            if entry is None:
+                return None
+            pk, student_id = entry
+            if store.acquire(student_id, user):
+                CallQueueEntry.objects.filter(pk=pk).update(claimed_by=user, claimed_at=timezone.now())
+                return student_id
+            skipped.append(pk)
+    return None
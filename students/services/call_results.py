@@ -0,0 +1,83 @@
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from ..models import CALL_RESULTS_CACHE, CacheVersion, PatternItem, Student
+
+
+# 企業ごとの架電結果設定をキャッシュする秒数（設定変更は世代番号の切り替えで即時に反映される）
+CALL_RESULTS_TIMEOUT = 60 * 60
+
+# 大分類 1 つ分の設定
+# results: 通話結果の選択肢（表示順、分類未設定なら None）
+# talk_script_url: トークスクリプト
+# option_ids: 選択肢の文字列 → CallResultOption の ID
+PatternConfig = namedtuple('PatternConfig', ['results', 'talk_script_url', 'option_ids'])
+
+
+
+
+# *****************
+# 企業の 大分類 → PatternConfig の対応
+# ・企業のパターン項目と選択肢を JOIN した 1 クエリで読み、選択肢のリストにしてキャッシュする
+# ・キーに CacheVersion の世代番号を含めるので、CallResult / CallResultOption / Pattern / PatternItem を
+#   保存すると全プロセスで（最大 CacheVersion.VERSION_CHECK_SECONDS 遅れで）新しい設定に切り替わる
+# ・同じ大分類の項目が複数あるときは先に登録されたもの（従来の .first() と同じ）
+# *****************
+def get_pattern_configs(company_id):
+    key = f"students:call_results:{company_id}:{CacheVersion.current(CALL_RESULTS_CACHE)}"
+    configs = cache.get(key)
+    if configs is None:
+        items = {}
+        rows = (
+            PatternItem.objects
+            .filter(pattern__company_id=company_id)
+            .order_by('id', 'classification__options__sort_order', 'classification__options__code')
+            .values_list(
+                'id', 'major_class', 'classification_id', 'talk_script',
+                'classification__options__id', 'classification__options__label',
+            )
+        )
+        for item_id, major_class, classification_id, talk_script, option_id, label in rows:
+            item = items.setdefault(major_class, {
+                'id': item_id, 'classification_id': classification_id, 'talk_script': talk_script, 'options': [],
+            })
+            if item['id'] == item_id and option_id is not None:
+                item['options'].append((label, option_id))
+        configs = {
+            major_class: PatternConfig(
+                tuple(label for label, _ in item['options']) if item['classification_id'] else None,
+                item['talk_script'] or None,
+                dict(item['options']),
+            )
+            for major_class, item in items.items()
+        }
+        cache.set(key, configs, CALL_RESULTS_TIMEOUT)
+    return configs
+
+
+def get_pattern_config(company_id, major_class):
+    """company_id × major_class の PatternConfig（パターン未設定なら None）"""
+    if not company_id or not major_class:
+        return None
+    return get_pattern_configs(company_id).get(major_class)
+
+
+
+
+# *****************
+# 企業の コール結果（選択肢）ごとの件数
+# ・call_no（1〜3）コール目の *_call_outcome で GROUP BY する（(company, *_call_outcome) の索引に乗る）
+# ・選択肢に一致しない自由記述の結果は数えない
+# *****************
+def outcome_counts(company_id, call_no):
+    field = f"{('first', 'second', 'third')[call_no - 1]}_call_outcome"
+    rows = (
+        Student.objects
+        .filter(company_id=company_id, **{f"{field}__isnull": False})
+        .values(field, f"{field}__label")
+        .annotate(count=Count('pk'))
+        .order_by(f"{field}__call_result_id", f"{field}__sort_order", f"{field}__code")
+    )
+    return [(row[f"{field}__label"], row['count']) for row in rows]
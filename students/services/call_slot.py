@@ -0,0 +1,131 @@
+from django.db.models import Case, CharField, Q, Value, When
+
+
+CALL_TIMEZONES = ('morning', 'noon', 'evening')
+
+
+# *****************
+# 1コール目の time zone から、「次に振り分ける」2コール目の time zone を返す。
+# morning → noon, noon → evening, evening → morning
+# *****************
+def determine_second_call_timezone(first):
+    timezones = list(CALL_TIMEZONES)
+    try:
+        return timezones[(timezones.index(first) + 1) % 3]
+    except ValueError:
+        return None
+
+
+
+
+# *****************
+# 1,2コール目の time zone から、3コール目の time zone を返す。
+# - 異なる 2 つなら、残りのひとつ
+# - 同じなら、2コール目の次の time zone
+# - どちらかが未設定・不正値なら None
+# *****************
+def determine_third_call_timezone(first, second):
+    timezones = list(CALL_TIMEZONES)
+    if first not in timezones or second not in timezones:
+        return None
+    if first != second:
+        return (set(timezones) - {first, second}).pop()
+    return timezones[(timezones.index(second) + 1) % 3]
+
+
+
+
+# *****************
+# 架電ステータス（call_stage）を返す。
+# - TEL終了/処理済 → done
+# - 1コール目未実施 → first、2コール目未実施 → second、3コール目未実施 → third
+# - 3コール済み・未TEL終了 → third_done
+# *****************
+def determine_call_stage(done_tel, first_date, second_date, third_date):
+    if done_tel:
+        return 'done'
+    if first_date is None:
+        return 'first'
+    if second_date is None:
+        return 'second'
+    if third_date is None:
+        return 'third'
+    return 'third_done'
+
+
+
+
+# *****************
+# 架電ステータスと 1,2コール目の time zone から、次に架電すべき time zone を返す。
+# 2/3コール目待ち以外は None
+# *****************
+def determine_next_call_slot(stage, first_tz, second_tz):
+    if stage == 'second':
+        return determine_second_call_timezone(first_tz)
+    if stage == 'third':
+        return determine_third_call_timezone(first_tz, second_tz)
+    return None
+
+
+
+
+# *****************
+# determine_call_stage と同じ規則の Case 式（一括更新・バックフィル用）
+# *****************
+def call_stage_expression():
+    return Case(
+        When(done_tel=True, then=Value('done')),
+        When(first_call_date__isnull=True, then=Value('first')),
+        When(second_call_date__isnull=True, then=Value('second')),
+        When(third_call_date__isnull=True, then=Value('third')),
+        default=Value('third_done'),
+        output_field=CharField(),
+    )
+
+
+
+
+# *****************
+# determine_next_call_slot と同じ規則の Case 式（一括更新・バックフィル用）
+# ・2コール目待ち：1コール目の時間帯から決定
+# ・3コール目待ち：1,2コール目の時間帯の組み合わせ（3×3）から決定
+# ・それ以外（未架電、3コール済み、TEL終了、時間帯未設定）は NULL
+# *****************
+def next_call_slot_expression():
+    open_q = ~Q(done_tel=True)
+    second_pending = open_q & Q(first_call_date__isnull=False, second_call_date__isnull=True)
+    third_pending = open_q & Q(
+        first_call_date__isnull=False,
+        second_call_date__isnull=False,
+        third_call_date__isnull=True,
+    )
+    whens = [
+        When(
+            second_pending & Q(first_call_timezone=first),
+            then=Value(determine_second_call_timezone(first)),
+        )
+        for first in CALL_TIMEZONES
+    ] + [
+        When(
+            third_pending & Q(first_call_timezone=first, second_call_timezone=second),
+            then=Value(determine_third_call_timezone(first, second)),
+        )
+        for first in CALL_TIMEZONES
+        for second in CALL_TIMEZONES
+    ]
+    return Case(*whens, default=None, output_field=CharField())
+
+
+
+
+# *****************
+# 2/3コール目の架電対象となる条件
+# ・前回コール日が today より前で、次のコールが未実施、かつ TEL 未終了
+# ・永続化した call_stage を使うので (company, done_tel, call_stage, next_call_slot) の索引に乗る
+# *****************
+def call_due_q(call_no, today):
+    if call_no == 2:
+        return Q(done_tel=False, call_stage='second', first_call_date__lt=today)
+    if call_no == 3:
+        return Q(done_tel=False, call_stage='third', second_call_date__lt=today)
+    raise ValueError(f"call_no must be 2 or 3: {call_no!r}")
@@ -0,0 +1,69 @@
+from django.core.cache import cache
+
+from ..models import CLASS_CHOICES_CACHE, CacheVersion, Student
+
+
+# 分類の選択肢をキャッシュする秒数（CSV 取り込み・学生の分類や TEL終了の変更は世代番号の切り替えで即時に反映される）
+CLASS_CHOICES_TIMEOUT = 300
+
+
+
+
+def _version_name(company_id):
+    return f"{CLASS_CHOICES_CACHE}:{company_id}"
+
+
+def invalidate_class_choices(company_id):
+    """企業の分類の選択肢キャッシュを全プロセスで無効にする（CSV 取り込み・学生の分類や TEL終了の変更時）"""
+    CacheVersion.bump(_version_name(company_id))
+
+
+
+
+# *****************
+# キャッシュキー
+# ・企業ごとの CacheVersion の世代番号を含める（世代番号自体はプロセス内に
+#   CacheVersion.VERSION_CHECK_SECONDS だけ持つので、キャッシュが効いている間はクエリを出さない）
+# ・ワーカーと Web が別プロセスでも、世代番号は DB にあるので削除を伝える必要がない
+# *****************
+def _cache_key(company_id):
+    return f"students:class_choices:{company_id}:{CacheVersion.current(_version_name(company_id))}"
+
+
+
+
+# *****************
+# 企業の未完了（done_tel=False）学生にある 大分類 → 小分類一覧 の対応
+# ・DISTINCT は 1 回で大分類・小分類の両方をまかなう
+# *****************
+def get_class_map(company_id):
+    key = _cache_key(company_id)
+    class_map = cache.get(key)
+    if class_map is None:
+        pairs = (
+            Student.objects.filter(company_id=company_id, done_tel=False)
+            .values_list('major_class', 'minor_class')
+            .distinct()
+        )
+        class_map = {}
+        for major_class, minor_class in pairs:
+            if not major_class:
+                continue
+            minors = class_map.setdefault(major_class, [])
+            if minor_class:
+                minors.append(minor_class)
+        class_map = {major: sorted(minors) for major, minors in sorted(class_map.items())}
+        cache.set(key, class_map, CLASS_CHOICES_TIMEOUT)
+    return class_map
+
+
+
+
+def major_class_choices(company_id):
+    return list(get_class_map(company_id))
+
+
+
+
+def minor_class_choices(company_id, major_class):
+    return get_class_map(company_id).get(major_class, [])
@@ -0,0 +1,78 @@
+import codecs
+import csv
+
+from django.http import StreamingHttpResponse
+
+from .csv_import import OUTPUT_COLUMNS
+
+
+# 出力カラム（アップロード CSV と同じ並び。company は企業名で出力する）
+EXPORT_FIELDS = OUTPUT_COLUMNS
+EXPORT_LOOKUPS = ["company__name" if key == "company" else key for key in EXPORT_FIELDS]
+
+# サーバーサイドカーソルから 1 回に取得する件数
+EXPORT_CHUNK_SIZE = 2000
+
+# レスポンスに書き出す 1 チャンクのおおよそのバイト数
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+
+
+class _Echo:
+    """csv.writer の書き込み先。書いた内容をそのまま返す"""
+    def write(self, value):
+        return value
+
+
+
+
+# *****************
+# CSV の行を 1 行ずつ返すジェネレーター
+# ・values_list で企業名まで 1 クエリで取得し、モデルインスタンスは作らない
+# ・iterator() でサーバーサイドカーソルから少しずつ読む
+# *****************
+def iter_csv_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    # ヘッダー行：英語のフィールド名そのまま
+    yield writer.writerow(EXPORT_FIELDS)
+    rows = queryset.values_list(*EXPORT_LOOKUPS)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield writer.writerow(["" if v is None else v for v in row])
+
+
+
+
+# *****************
+# Shift_JIS (cp932) に逐次エンコードしながら返すジェネレーター
+# ・小さな行をまとめて EXPORT_BUFFER_SIZE 程度のチャンクにする
+# *****************
+def iter_cp932_chunks(lines):
+    encoder = codecs.getincrementalencoder("cp932")(errors="replace")
+    buf = []
+    size = 0
+    for line in lines:
+        chunk = encoder.encode(line)
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield b"".join(buf)
+            buf = []
+            size = 0
+    buf.append(encoder.encode("", final=True))
+    yield b"".join(buf)
+
+
+
+
+# *****************
+# 学生一覧 CSV のストリーミングレスポンス
+# 件数に関わらずメモリ使用量は一定で、クエリは 1 回
+# *****************
+def stream_students_csv(queryset, filename):
+    response = StreamingHttpResponse(
+        iter_cp932_chunks(iter_csv_lines(queryset)),
+        content_type="text/csv; charset=cp932",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
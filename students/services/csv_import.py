@@ -0,0 +1,494 @@
+import codecs
+import csv
+import io
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from ..models import Pattern, Student
+from .phone import normalize_phone
+
+
+# *****************
+# アップロード CSV のカラム定義
+# *****************
+COLUMNS = [
+    # key, label, options
+    ("company", "企業名", {"required": True}),
+    ("name", "シメイ", {"required": True}),
+    ("phone_number", "電話番号", {"required": True}),
+    ("process_destination", "初回エントリー経路", {}),
+    ("data_id", "学生ID", {}),
+    ("grad_year", "卒年度", {"required": True, "type": "int"}),
+    ("major_class", "大分類", {"required": True}),
+    ("minor_class", "小分類", {"required": True}),
+    ("first_call_date", "1コール目", {"type": "date"}),
+    ("first_call_timezone", "1コール目時間区分", {}),
+    ("first_call_notes", "1コール目結果", {}),
+    ("second_call_date", "2コール目", {"type": "date"}),
+    ("second_call_timezone", "2コール目時間区分", {}),
+    ("second_call_notes", "2コール目結果", {}),
+    ("third_call_date", "3コール目", {"type": "date"}),
+    ("third_call_timezone", "3コール目時間区分", {}),
+    ("third_call_notes", "3コール目結果", {}),
+    ("need_process", "処理必要", {}),
+    ("done_draft", "Wチェ必要", {}),
+    ("done_tel", "TEL終了/処理済", {}),
+    ("before_special_notes", "TEL前特記事項", {}),
+    ("after_special_notes", "TEL後特記事項", {}),
+    ("full_name", "氏名", {"required": True}),
+    ("university", "大学", {}),
+    ("faculty", "学部", {}),
+    ("department", "学科", {}),
+    ("first_entry_date", "初回エントリー日", {"type": "date"}),
+]
+
+# ===== 派生定義（ここから下は触らない） =====
+CSV_HEADERS = [(key, label) for key, label, _ in COLUMNS]
+OUTPUT_COLUMNS = [key for key, _, _ in COLUMNS]
+REQUIRED = [key for key, _, opt in COLUMNS if opt.get("required")]
+INT_FIELDS = [key for key, _, opt in COLUMNS if opt.get("type") == "int"]
+DATE_FIELDS = [key for key, _, opt in COLUMNS if opt.get("type") == "date"]
+
+
+# bulk_create 1 回あたりの件数
+BULK_BATCH_SIZE = 1000
+
+# 文字コード判定に使う候補と、判定に使う先頭バイト数
+CSV_ENCODINGS = ("utf-8-sig", "utf-8", "cp932", "shift_jis")
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# エラーレポートに保持する最大件数（件数自体は全件数える）
+MAX_REPORTED_ERRORS = 100
+
+# 進捗を通知する間隔（行数）
+PROGRESS_INTERVAL = 1000
+
+# 更新モードで CSV の値を反映するカラム（company は照合条件なので対象外）
+UPSERT_FIELDS = [key for key in OUTPUT_COLUMNS if key != "company"]
+
+# 更新モードの差分サマリーに保持する最大件数
+MAX_REPORTED_CHANGES = 100
+
+# 既存データ照合の IN 句 1 回あたりの件数
+LOOKUP_BATCH_SIZE = 5000
+
+ImportResult = namedtuple('ImportResult', ['created', 'elapsed', 'method'])
+UpsertResult = namedtuple('UpsertResult', ['created', 'updated', 'unchanged', 'changes', 'elapsed', 'method'])
+RowError = namedtuple('RowError', ['row_no', 'column', 'reason'])
+# 取り込み行：組み立てた Student と、CSV で値が入っていたカラム
+ImportRow = namedtuple('ImportRow', ['row_no', 'student', 'fields'])
+
+
+class CsvDecodeError(Exception):
+    """どの文字コードでも読み込めなかった"""
+
+
+
+
+def parse_bool(val):
+    if val is None:
+        return False
+    return str(val).strip().lower() in ("true", "1", "yes", "y")
+
+
+
+
+# *****************
+# 文字コード判定とストリーム読み込み
+# ・先頭 ENCODING_SAMPLE_SIZE バイトだけで文字コードを決め、残りは逐次デコードする
+# ・サンプル末尾で切れた多バイト文字はインクリメンタルデコーダで吸収する
+# *****************
+def detect_encoding(sample):
+    errors = []
+    for enc in CSV_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+            return enc
+        except UnicodeDecodeError as e:
+            errors.append(f"{enc}: {type(e).__name__}: {e}")
+    raise CsvDecodeError("\n".join(errors) + f"\n先頭バイト: {sample[:64].hex()}")
+
+
+def open_csv_stream(binary_file):
+    """バイナリファイルから (DictReader, 文字コード) を返す"""
+    sample = binary_file.read(ENCODING_SAMPLE_SIZE)
+    binary_file.seek(0)
+    encoding = detect_encoding(sample)
+    text = io.TextIOWrapper(binary_file, encoding=encoding, newline="")
+    return csv.DictReader(text), encoding
+
+
+
+
+# *****************
+# 1 行分の検証
+# ・問題があれば (カラム, 理由) を列挙する
+# *****************
+def iter_row_errors(row, company, pattern_major_classes):
+    if row.get("company") != company.name:
+        yield "company", "company が一致しません。"
+
+    major_class = row.get("major_class")
+    if major_class not in pattern_major_classes:
+        yield "major_class", f"major_class '{major_class}' がパターン一覧にまだ登録されていません。"
+
+    for key in REQUIRED:
+        if not (row.get(key) or "").strip():
+            yield key, f"「{key}」が空欄です。"
+
+    for key in INT_FIELDS:
+        val = (row.get(key) or "").strip()
+        if val:
+            try:
+                int(val)
+            except ValueError:
+                yield key, f"「{key}」が整数ではありません。"
+
+    for key in DATE_FIELDS:
+        val = (row.get(key) or "").strip()
+        if val:
+            try:
+                datetime.strptime(val, "%Y-%m-%d")
+            except ValueError:
+                yield key, f"「{key}」を YYYY-MM-DD 形式で入力してください。"
+
+
+
+
+# *****************
+# ファイル全体の検証レポート
+# ・エラーは MAX_REPORTED_ERRORS 件まで保持し、総数は別に数える
+# *****************
+class ValidationReport:
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.errors = []
+        self.error_count = 0
+        self.row_count = 0
+
+    def add(self, row_no, column, reason):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(RowError(row_no, column, reason))
+
+    @property
+    def has_errors(self):
+        return self.error_count > 0
+
+    @property
+    def truncated(self):
+        return self.error_count > len(self.errors)
+
+
+
+
+# *****************
+# 行を 1 行ずつ検証するジェネレーター
+# ・エラーは report に記録し、問題のない行だけ (行番号, 行) を返す
+# ・途中でデコードできなくなった場合もレポートに記録して終了する
+# *****************
+def iter_valid_rows(reader, company, pattern_major_classes, report):
+    row_no = 1
+    try:
+        for row_no, row in enumerate(reader, start=2):
+            if not any((v or "").strip() for v in row.values() if isinstance(v, str)):
+                continue
+            report.row_count += 1
+
+            valid = True
+            for column, reason in iter_row_errors(row, company, pattern_major_classes):
+                report.add(row_no, column, reason)
+                valid = False
+            if valid:
+                yield row_no, row
+    except UnicodeDecodeError as e:
+        report.add(row_no + 1, "", f"{e.encoding} として読み込めません（{e.reason}）。文字コードを統一してください。")
+    except csv.Error as e:
+        report.add(row_no + 1, "", f"CSV の形式が不正です: {e}")
+
+
+
+
+# *****************
+# 企業のパターンに登録済みの大分類
+# *****************
+def get_pattern_major_classes(company):
+    pattern = Pattern.objects.filter(company=company).first()
+    if not pattern:
+        return set()
+    return set(pattern.items.values_list("major_class", flat=True))
+
+
+
+
+# *****************
+# ファイル全体を検証しつつ取り込み行（ImportRow）を組み立てる
+# ・エラーが 1 件でも出たら以降は組み立てず検証だけ続ける（登録しないため）
+# ・on_progress(検証済み行数) を PROGRESS_INTERVAL 行ごとに呼ぶ
+# *****************
+def collect_rows(reader, company, report, on_progress=None):
+    pattern_major_classes = get_pattern_major_classes(company)
+    rows = []
+    for row_no, row in iter_valid_rows(reader, company, pattern_major_classes, report):
+        if not report.has_errors:
+            fields = frozenset(key for key in UPSERT_FIELDS if (row.get(key) or "").strip())
+            rows.append(ImportRow(row_no, build_student(company, row), fields))
+        if on_progress and report.row_count % PROGRESS_INTERVAL == 0:
+            on_progress(report.row_count)
+    if report.has_errors:
+        return []
+    return rows
+
+
+
+
+# *****************
+# 検証済みの 1 行から Student インスタンスを組み立てる（保存はしない）
+# bulk_create / COPY は save() を通らないので、架電ステータス・コール結果の選択肢もここで計算しておく
+# *****************
+def build_student(company, row):
+    student = Student(
+        company=company,
+        data_id=row.get("data_id"),
+        grad_year=int(row["grad_year"]),
+        major_class=row["major_class"],
+        minor_class=row["minor_class"],
+        name=row["name"],
+        phone_number=row["phone_number"],
+        process_destination=row.get("process_destination"),
+        before_special_notes=row.get("before_special_notes"),
+        first_call_date=row.get("first_call_date") or None,
+        first_call_timezone=row.get("first_call_timezone"),
+        first_call_notes=row.get("first_call_notes"),
+        second_call_date=row.get("second_call_date") or None,
+        second_call_timezone=row.get("second_call_timezone"),
+        second_call_notes=row.get("second_call_notes"),
+        third_call_date=row.get("third_call_date") or None,
+        third_call_timezone=row.get("third_call_timezone"),
+        third_call_notes=row.get("third_call_notes"),
+        need_process=parse_bool(row.get("need_process")),
+        done_draft=parse_bool(row.get("done_draft")),
+        done_tel=parse_bool(row.get("done_tel")),
+        after_special_notes=row.get("after_special_notes"),
+        full_name=row["full_name"],
+        university=row.get("university"),
+        faculty=row.get("faculty"),
+        department=row.get("department"),
+        first_entry_date=row.get("first_entry_date") or None,
+    )
+    student.refresh_call_state()
+    student.refresh_call_outcomes()
+    student.phone_key = normalize_phone(student.phone_number)
+    return student
+
+
+
+
+# *****************
+# COPY FROM STDIN（text 形式）用の値エスケープ
+# *****************
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+
+
+def _raw_cursor_supports_copy(cursor):
+    return connection.vendor == "postgresql" and hasattr(cursor.cursor, "copy_expert")
+
+
+def _copy_into(cursor, table, fields, students, add):
+    """psycopg2 の copy_expert で students の fields を table に流し込む"""
+    db = cursor.db
+    buf = io.StringIO()
+    for obj in students:
+        values = [f.get_db_prep_save(f.pre_save(obj, add), db) for f in fields]
+        buf.write("\t".join(_copy_value(v) for v in values))
+        buf.write("\n")
+    buf.seek(0)
+
+    qn = db.ops.quote_name
+    columns = ", ".join(qn(f.column) for f in fields)
+    cursor.cursor.copy_expert(f"COPY {qn(table)} ({columns}) FROM STDIN", buf)
+
+
+def _copy_students(cursor, students):
+    fields = [f for f in Student._meta.concrete_fields if not f.primary_key]
+    _copy_into(cursor, Student._meta.db_table, fields, students, add=True)
+
+
+def _copy_update_students(cursor, students, field_names):
+    """
+    更新対象を一時テーブルに COPY し、UPDATE ... FROM 1 回で反映する。
+    bulk_update の CASE WHEN より大量件数で桁違いに速い。
+    """
+    qn = cursor.db.ops.quote_name
+    table = qn(Student._meta.db_table)
+    tmp = qn("tmp_student_upsert")
+    pk = Student._meta.pk
+    fields = [pk] + [Student._meta.get_field(name) for name in field_names]
+    columns = ", ".join(qn(f.column) for f in fields)
+
+    cursor.execute(f"DROP TABLE IF EXISTS {tmp}")
+    cursor.execute(f"CREATE TEMP TABLE {tmp} AS SELECT {columns} FROM {table} WITH NO DATA")
+    _copy_into(cursor, "tmp_student_upsert", fields, students, add=False)
+    assignments = ", ".join(f"{qn(f.column)} = t.{qn(f.column)}" for f in fields[1:])
+    cursor.execute(
+        f"UPDATE {table} AS s SET {assignments} FROM {tmp} AS t "
+        f"WHERE s.{qn(pk.column)} = t.{qn(pk.column)}"
+    )
+    cursor.execute(f"DROP TABLE {tmp}")
+
+
+
+
+# *****************
+# 一括登録
+# ・全件を 1 トランザクションで登録し、途中で失敗したら何も残さない
+# ・Postgres + psycopg2 なら COPY、それ以外は bulk_create をバッチ単位で実行
+# ・save() を通らないので、コール履歴（CallAttempt）は最後に一括で反映する
+#   COPY では ID が返らないので、登録前の最大 ID より後ろの行（= 今回登録した行）だけを対象にする
+#   （ID は採番順なので、今回の行は必ず登録前にコミット済みの最大 ID より大きい）
+# *****************
+def insert_students(students, batch_size=BULK_BATCH_SIZE):
+    started = time.monotonic()
+    with transaction.atomic(), connection.cursor() as cursor:
+        last_id = Student.objects.aggregate(last=Max("id"))["last"] or 0
+        if _raw_cursor_supports_copy(cursor):
+            _copy_students(cursor, students)
+            method = "copy"
+        else:
+            Student.objects.bulk_create(students, batch_size=batch_size)
+            method = "bulk_create"
+        company_ids = {s.company_id for s in students}
+        if company_ids:
+            Student.objects.filter(id__gt=last_id, company_id__in=company_ids).sync_call_attempts()
+    return ImportResult(len(students), time.monotonic() - started, method)
+
+
+
+
+
+# *****************
+# 既存データの一括取得（照合用）
+# ・IN 句を LOOKUP_BATCH_SIZE 件ずつに分け、行ごとの SELECT はしない
+# ・同じキーの既存行が複数ある場合は最も古い行に合わせる
+# *****************
+def _existing_by(company, field, keys):
+    keys = sorted(keys)
+    found = {}
+    for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        qs = (
+            Student.objects
+            .filter(company=company, **{f"{field}__in": keys[i:i + LOOKUP_BATCH_SIZE]})
+            .order_by("-pk")
+        )
+        for student in qs:
+            found[getattr(student, field)] = student
+    return found
+
+
+
+
+# *****************
+# 更新モードの取り込み（既存行は更新、なければ新規登録）
+# ・照合キー：(company, data_id) → 正規化した電話番号 の順
+# ・CSV で空欄のカラムは既存の値を残す（架電結果などを消さない）
+# ・ファイル内の重複行も同じ 1 件にまとめる
+# ・dry_run=True なら件数と差分だけ返して書き込まない
+# *****************
+def upsert_students(company, rows, dry_run=False, batch_size=BULK_BATCH_SIZE):
+    started = time.monotonic()
+    by_data_id = _existing_by(company, "data_id", {r.student.data_id for r in rows if r.student.data_id})
+    # 電話番号での照合は学生IDで見つからなかった行の分だけ
+    by_phone = _existing_by(company, "phone_key", {
+        r.student.phone_key for r in rows
+        if r.student.phone_key and r.student.data_id not in by_data_id
+    })
+
+    fields_by_name = {name: Student._meta.get_field(name) for name in UPSERT_FIELDS}
+    to_create, to_update, changes = [], {}, []
+    matched_pks = set()
+    updated_fields = set()
+
+    for row in rows:
+        incoming = row.student
+        target = by_data_id.get(incoming.data_id)
+        if target is None:
+            # 電話番号で照合する場合、学生IDが食い違う相手は別人として扱う
+            target = by_phone.get(incoming.phone_key)
+            if target is not None and incoming.data_id and target.data_id and target.data_id != incoming.data_id:
+                target = None
+
+        if target is None:
+            to_create.append(incoming)
+            target = incoming
+        else:
+            if target.pk:
+                matched_pks.add(target.pk)
+            changed = []
+            for name in sorted(row.fields):
+                field = fields_by_name[name]
+                new = field.to_python(getattr(incoming, name))
+                old = getattr(target, name)
+                if old != new:
+                    setattr(target, name, new)
+                    changed.append(name)
+                    if target.pk and len(changes) < MAX_REPORTED_CHANGES:
+                        changes.append({
+                            "row_no": row.row_no,
+                            "name": target.name,
+                            "field": name,
+                            "old": "" if old is None else str(old),
+                            "new": "" if new is None else str(new),
+                        })
+            if changed:
+                target.refresh_call_state()
+                target.refresh_call_outcomes()
+                target.phone_key = normalize_phone(target.phone_number)
+                if target.pk:
+                    updated_fields.update(changed)
+                    to_update[target.pk] = target
+
+        # 以降の行が同じキーなら、この行（既存 or 新規）にまとめる
+        if target.data_id:
+            by_data_id.setdefault(target.data_id, target)
+        if target.phone_key:
+            by_phone.setdefault(target.phone_key, target)
+
+    method = "dry_run"
+    if not dry_run:
+        update_fields = [*sorted(updated_fields), "call_stage", "next_call_slot", "phone_key"]
+        if Student.CALL_OUTCOME_SOURCE_FIELDS.intersection(updated_fields):
+            update_fields.extend(Student.CALL_OUTCOME_FIELDS)
+        with transaction.atomic(), connection.cursor() as cursor:
+            method = insert_students(to_create, batch_size=batch_size).method
+            if to_update and _raw_cursor_supports_copy(cursor):
+                _copy_update_students(cursor, to_update.values(), update_fields)
+            elif to_update:
+                Student.objects.bulk_update(list(to_update.values()), fields=update_fields, batch_size=batch_size)
+            if to_update and Student.CALL_ATTEMPT_SOURCE_FIELDS.intersection(update_fields):
+                Student.objects.filter(pk__in=list(to_update)).sync_call_attempts()
+
+    return UpsertResult(
+        created=len(to_create),
+        updated=len(to_update),
+        unchanged=len(matched_pks - to_update.keys()),
+        changes=changes,
+        elapsed=time.monotonic() - started,
+        method=method,
+    )
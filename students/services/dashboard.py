@@ -0,0 +1,63 @@
+from django.db.models import Count, Q
+
+from ..models import CallAttempt, Company, Student
+from .call_slot import CALL_TIMEZONES, call_due_q
+
+
+# *****************
+# ポータルの企業別集計
+# ・全企業分のカウンタを Student の GROUP BY company_id 1 クエリで算出
+# ・架電日の件数だけはコール履歴（CallAttempt）から GROUP BY 1 クエリ
+# ・企業一覧の取得と合わせて、企業数に関わらず 3 クエリで完結する
+# *****************
+def build_company_dashboard(sel_date, today):
+    # ２コール目／３コール目の対象条件（DetailedCallProgressFilter と同じ）
+    base2 = call_due_q(2, today)
+    base3 = call_due_q(3, today)
+
+    aggregates = {
+        # ② 処理必要：need_process=True & done_draft=False
+        'count_need_process': Count('pk', filter=Q(need_process=True, done_draft=False)),
+        # ③ Wチェック必要：done_draft=True
+        'count_wcheck': Count('pk', filter=Q(done_draft=True)),
+        'count1': Count('pk', filter=Q(call_stage='first')),
+    }
+    for tz in CALL_TIMEZONES:
+        aggregates[f'count2_{tz}'] = Count('pk', filter=base2 & Q(next_call_slot=tz))
+        aggregates[f'count3_{tz}'] = Count('pk', filter=base3 & Q(next_call_slot=tz))
+
+    # done_tel=False は全カウンタ共通なので WHERE 側に寄せる
+    rows = (
+        Student.objects
+        .filter(company__isnull=False, done_tel=False)
+        .values('company_id')
+        .annotate(**aggregates)
+        .order_by()
+    )
+    counts_by_company = {row['company_id']: row for row in rows}
+
+    # ① 日付集計：コール履歴の (call_date, student) 索引でその日の分だけを読む
+    #   （同じ日に 2 回コールした学生も 1 人として数える）
+    on_date_by_company = dict(
+        CallAttempt.objects
+        .filter(call_date=sel_date, student__done_tel=False, student__company__isnull=False)
+        .values('student__company_id')
+        .annotate(count=Count('student_id', distinct=True))
+        .values_list('student__company_id', 'count')
+        .order_by()
+    )
+
+    companies_data = []
+    for company in Company.objects.all():
+        row = counts_by_company.get(company.pk, {})
+        companies_data.append({
+            'company': company,
+            'date': sel_date.isoformat(),
+            'count_on_date': on_date_by_company.get(company.pk, 0),
+            'count_need_process': row.get('count_need_process', 0),
+            'count_wcheck': row.get('count_wcheck', 0),
+            'count1': row.get('count1', 0),
+            'count2': {tz: row.get(f'count2_{tz}', 0) for tz in CALL_TIMEZONES},
+            'count3': {tz: row.get(f'count3_{tz}', 0) for tz in CALL_TIMEZONES},
+        })
+    return companies_data
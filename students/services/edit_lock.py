@@ -0,0 +1,180 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Student, StudentLock
+
+
+# 編集ロックの有効時間（分）。最後の生存確認からこれを過ぎたロックは他ユーザーが奪える
+LOCK_EXPIRE_MINUTES = 1
+
+# 編集画面からの生存確認の間隔（秒）。1 回取りこぼしても期限切れにならないよう有効時間の 1/3
+HEARTBEAT_INTERVAL_SECONDS = LOCK_EXPIRE_MINUTES * 60 // 3
+
+LockInfo = namedtuple('LockInfo', ['user_id', 'username', 'locked_at'])
+
+# 生存確認（テーブル版）: 空き・期限切れ・自分のロックだけを取得 / 延長し、取れた学生 ID を返す
+# ・存在しない学生は SELECT で落とす（外部キー違反にしない）
+# ・他ユーザーの有効なロックは ON CONFLICT の WHERE で書き換えない（RETURNING にも出ない）
+LOCK_KEEPALIVE_SQL = """
+INSERT INTO {lock} (student_id, locked_by_id, locked_at)
+SELECT id, %(user)s, %(now)s FROM {student} WHERE id = ANY(%(ids)s)
+ON CONFLICT (student_id) DO UPDATE
+SET locked_by_id = EXCLUDED.locked_by_id, locked_at = EXCLUDED.locked_at
+WHERE {lock}.locked_by_id = EXCLUDED.locked_by_id OR {lock}.locked_at <= %(cutoff)s
+RETURNING student_id
+"""
+
+
+
+
+def expire_cutoff(now=None):
+    """この時刻以前に生存確認されたロックは期限切れ"""
+    return (now or timezone.now()) - timedelta(minutes=LOCK_EXPIRE_MINUTES)
+
+
+
+
+# *****************
+# テーブル版（既定）
+# ・ロックは StudentLock（学生 1 人につき最大 1 行）に持ち、Student の行は書き換えない
+# ・取得 / 延長は条件付き UPDATE 1 回、行が無いときだけ INSERT（同時 INSERT は主キー違反で負けた側が False）
+# ・期限切れの行は消さずに残し、次に取得した人が UPDATE で上書きする
+# ・生存確認は複数の学生をまとめて INSERT ... ON CONFLICT 1 回、解除は DELETE 1 回
+# *****************
+class TableLockStore:
+    def acquire(self, student_id, user):
+        now = timezone.now()
+        updated = (
+            StudentLock.objects
+            .filter(student_id=student_id)
+            .filter(Q(locked_by=user) | Q(locked_at__lte=expire_cutoff(now)))
+            .update(locked_by=user, locked_at=now)
+        )
+        if updated:
+            return True
+        try:
+            with transaction.atomic():
+                StudentLock.objects.create(student_id=student_id, locked_by=user, locked_at=now)
+        except IntegrityError:
+            # 他ユーザーの有効なロックが既にある（または学生が存在しない）
+            return False
+        return True
+
+    def heartbeat(self, student_ids, user):
+        """
+        student_ids のロックを user で取得 / 延長し、取れなかった学生 ID を返す。
+        離脱時の解除が遅れて届き自分のロックが消えていても、空いていれば取り直す。
+        """
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            qn = cursor.db.ops.quote_name
+            cursor.execute(
+                LOCK_KEEPALIVE_SQL.format(lock=qn(StudentLock._meta.db_table), student=qn(Student._meta.db_table)),
+                {'user': user.pk, 'now': now, 'ids': list(student_ids), 'cutoff': expire_cutoff(now)},
+            )
+            held = {student_id for student_id, in cursor.fetchall()}
+        return [student_id for student_id in student_ids if student_id not in held]
+
+    def release(self, student_id, user=None):
+        self.release_many([student_id], user)
+
+    def release_many(self, student_ids, user=None):
+        qs = StudentLock.objects.filter(student_id__in=student_ids)
+        if user is not None:
+            qs = qs.filter(locked_by=user)
+        qs.delete()
+
+    def get_many(self, student_ids):
+        rows = (
+            StudentLock.objects
+            .filter(student_id__in=student_ids, locked_at__gt=expire_cutoff())
+            .values_list('student_id', 'locked_by_id', 'locked_by__username', 'locked_at')
+        )
+        return {student_id: LockInfo(*info) for student_id, *info in rows}
+
+
+
+
+# *****************
+# キャッシュ版
+# ・ロックを Django キャッシュに TTL 付きで置く（期限切れはキャッシュ側で消える）
+# ・取得は cache.add（キーが無いときだけ書ける）なので、空きロックの取り合いは 1 人だけが勝つ
+# ・生存確認 / 解除は get_many + set_many / delete_many でまとめて行う
+# ・LocMem のようなプロセスごとのキャッシュでは他プロセスのロックが見えない。
+#   Redis / Memcached など全プロセスで共有されるバックエンドで使うこと
+# *****************
+class CacheLockStore:
+    key_prefix = 'students:lock:'
+
+    def _key(self, student_id):
+        return f"{self.key_prefix}{student_id}"
+
+    def acquire(self, student_id, user):
+        key = self._key(student_id)
+        value = LockInfo(user.pk, user.get_username(), timezone.now())
+        timeout = LOCK_EXPIRE_MINUTES * 60
+        if cache.add(key, value, timeout):
+            return True
+        current = cache.get(key)
+        if current is not None and current.user_id != user.pk:
+            return False
+        # 自分のロック（またはこの間に期限切れ）なら延長
+        cache.set(key, value, timeout)
+        return True
+
+    def heartbeat(self, student_ids, user):
+        """
+        student_ids のロックを user で取得 / 延長し、取れなかった学生 ID を返す。
+        空いているキーは cache.add で取り直す（他ユーザーと同時なら 1 人だけが勝つ）。
+        """
+        value = LockInfo(user.pk, user.get_username(), timezone.now())
+        timeout = LOCK_EXPIRE_MINUTES * 60
+        keys = {self._key(student_id): student_id for student_id in student_ids}
+        current = cache.get_many(keys)
+        mine = {key: value for key, info in current.items() if info.user_id == user.pk}
+        cache.set_many(mine, timeout)
+        lost = []
+        for key, student_id in keys.items():
+            if key in mine:
+                continue
+            if key in current or not cache.add(key, value, timeout):
+                lost.append(student_id)
+        return lost
+
+    def release(self, student_id, user=None):
+        self.release_many([student_id], user)
+
+    def release_many(self, student_ids, user=None):
+        keys = [self._key(student_id) for student_id in student_ids]
+        if user is not None:
+            keys = [key for key, info in cache.get_many(keys).items() if info.user_id == user.pk]
+        cache.delete_many(keys)
+
+    def get_many(self, student_ids):
+        keys = {self._key(student_id): student_id for student_id in student_ids}
+        return {keys[key]: LockInfo(*info) for key, info in cache.get_many(keys).items()}
+
+
+
+
+LOCK_STORES = {
+    'table': TableLockStore,
+    'cache': CacheLockStore,
+}
+
+
+def get_lock_store():
+    """settings.STUDENT_LOCK_BACKEND（"table" / "cache"）に応じたロックストアを返す"""
+    backend = getattr(settings, 'STUDENT_LOCK_BACKEND', 'table')
+    return LOCK_STORES[backend]()
+
+
+def get_lock(student_id):
+    """有効なロックの LockInfo（無ければ None）"""
+    return get_lock_store().get_many([student_id]).get(student_id)
@@ -0,0 +1,224 @@
+import io
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import ImportJob
+from .class_choices import invalidate_class_choices
+from .csv_import import (
+    CsvDecodeError,
+    ValidationReport,
+    collect_rows,
+    insert_students,
+    open_csv_stream,
+    upsert_students,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# 検証フェーズが占める進捗の割合（残りは登録フェーズ）
+VALIDATION_PROGRESS = 90
+
+# 処理中のジョブの生存確認（heartbeat_at の更新）間隔（秒）
+JOB_HEARTBEAT_SECONDS = 30
+
+# 生存確認がこれより長く途絶えた処理中のジョブは、ワーカーが落ちたものとして取り直す（秒）
+JOB_STALE_SECONDS = 300
+
+# 取り直しを含めた実行回数の上限（取り込みはトランザクション内なので、途中で落ちても再実行できる）
+MAX_JOB_ATTEMPTS = 2
+
+
+
+
+# *****************
+# アップロードされたファイルをジョブとして保存する
+# リクエスト内ではファイルの保存だけを行い、取り込みはワーカーに任せる
+# *****************
+def enqueue_import(company, uploaded_file, user=None, mode='create', dry_run=False):
+    return ImportJob.objects.create(
+        company=company,
+        filename=uploaded_file.name,
+        data=b"".join(uploaded_file.chunks()),
+        mode=mode,
+        dry_run=dry_run,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+
+
+# *****************
+# 待機中のジョブを 1 件取り出して処理中にする
+# ・SELECT ... FOR UPDATE SKIP LOCKED で、複数ワーカーが同じジョブを取らないようにする
+# ・生存確認が JOB_STALE_SECONDS 以上途絶えた処理中のジョブ（ワーカーが落ちた）も取り直す
+#   MAX_JOB_ATTEMPTS 回実行済みなら、再実行せず失敗にする
+# *****************
+def claim_next_job():
+    while True:
+        now = timezone.now()
+        stale = Q(status='running', heartbeat_at__lt=now - timedelta(seconds=JOB_STALE_SECONDS))
+        with transaction.atomic():
+            job = (
+                ImportJob.objects
+                .select_for_update(skip_locked=True)
+                .filter(Q(status='pending') | stale)
+                .order_by('created_at', 'pk')
+                .first()
+            )
+            if job is None:
+                return None
+            if job.status == 'running':
+                logger.warning("import job %s stalled (attempt %s)", job.pk, job.attempts)
+                if job.attempts >= MAX_JOB_ATTEMPTS:
+                    _finish(job, 'failed', message="取り込み中にワーカーが停止しました。もう一度アップロードしてください。")
+                    continue
+            job.status = 'running'
+            job.started_at = now
+            job.heartbeat_at = now
+            job.attempts += 1
+            job.save(update_fields=('status', 'started_at', 'heartbeat_at', 'attempts'))
+        return job
+
+
+
+
+# *****************
+# ジョブの実行中、別スレッドで heartbeat_at を JOB_HEARTBEAT_SECONDS ごとに更新する
+# ・COPY など 1 文が長い処理の間も生存確認が途切れないようにする
+# ・スレッドは自分の DB 接続を使い、終了時に閉じる
+# *****************
+@contextmanager
+def _heartbeat(job):
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(JOB_HEARTBEAT_SECONDS):
+                ImportJob.objects.filter(pk=job.pk, status='running').update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"import-job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+
+
+def _update_progress(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    ImportJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def _finish(job, status, **fields):
+    # 取り込みが終わったらファイル内容は不要なので消しておく
+    _update_progress(
+        job,
+        status=status,
+        finished_at=timezone.now(),
+        data=b"",
+        **fields,
+    )
+    return job
+
+
+
+
+# *****************
+# ジョブの実行
+# ・検証 → 一括登録（services.csv_import と同じ処理）
+# ・進捗は PROGRESS_INTERVAL 行ごとに、読み込んだバイト数の割合で更新する
+# *****************
+def run_import_job(job):
+    data = bytes(job.data)
+    stream = io.BytesIO(data)
+    try:
+        reader, encoding = open_csv_stream(stream)
+    except CsvDecodeError as e:
+        return _finish(job, 'failed', message=f"CSVを読み込めませんでした。\n{e}")
+
+    def on_progress(row_count):
+        percent = stream.tell() * VALIDATION_PROGRESS // max(len(data), 1)
+        _update_progress(job, processed_rows=row_count, progress=percent)
+
+    try:
+        report = ValidationReport()
+        rows = collect_rows(reader, job.company, report, on_progress=on_progress)
+
+        if report.has_errors:
+            summary = f"{report.row_count} 行中 {report.error_count} 件のエラーがあるため登録しませんでした。"
+            if report.truncated:
+                summary += f"（先頭 {len(report.errors)} 件を表示）"
+            return _finish(
+                job, 'failed',
+                processed_rows=report.row_count,
+                error_count=report.error_count,
+                errors=[err._asdict() for err in report.errors],
+                message=summary,
+            )
+
+        _update_progress(job, processed_rows=report.row_count, progress=VALIDATION_PROGRESS)
+        if job.mode == 'upsert':
+            result = upsert_students(job.company, rows, dry_run=job.dry_run)
+        else:
+            result = insert_students([r.student for r in rows])
+    except Exception as e:
+        logger.exception("import job %s failed", job.pk)
+        return _finish(job, 'failed', message=f"取り込み中にエラーが発生しました: {e}")
+
+    if not job.dry_run:
+        # 大分類・小分類が増えた / 変わった可能性があるので、選択肢キャッシュを切り替える
+        invalidate_class_choices(job.company_id)
+
+    rate = len(rows) / result.elapsed if result.elapsed else len(rows)
+    stats = f"encoding={encoding}, {result.elapsed:.2f} 秒, {rate:.0f} 件/秒, {result.method}"
+    if job.mode != 'upsert':
+        return _finish(
+            job, 'succeeded',
+            progress=100,
+            created_count=result.created,
+            message=f"新規登録完了: {result.created} 件（{stats}）",
+        )
+
+    label = "確認結果（未登録）" if job.dry_run else "更新完了"
+    return _finish(
+        job, 'succeeded',
+        progress=100,
+        created_count=result.created,
+        updated_count=result.updated,
+        unchanged_count=result.unchanged,
+        changes=result.changes,
+        message=(
+            f"{label}: 新規 {result.created} 件 / 更新 {result.updated} 件 / "
+            f"変更なし {result.unchanged} 件（{stats}）"
+        ),
+    )
+
+
+
+
+# *****************
+# 待機中のジョブを順に処理する（処理した件数を返す）
+# *****************
+def process_pending_jobs(limit=None):
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        with _heartbeat(job):
+            run_import_job(job)
+        processed += 1
+    return processed
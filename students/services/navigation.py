@@ -0,0 +1,143 @@
+from django.db import connection
+from django.db.models import BooleanField, Func, Value, Window
+from django.db.models.functions import Collate, Lag, Lead
+
+
+# 一覧の並び順（student_company_name_idx と同じ照合順序）
+NAME_COLLATION = "ja-x-icu"
+
+
+
+
+def name_sort_key():
+    return Collate("name", NAME_COLLATION)
+
+
+
+
+# *****************
+# 行値比較 (a, b) > (x, y)
+# ・索引の列と同じ並びの行値で比較すると、Postgres は索引のその位置から読み始められる
+#   （a > x OR (a = x AND b > y) と展開すると索引の条件にならず、手前の行を全部読んでから捨てる）
+# *****************
+class RowCompare(Func):
+    output_field = BooleanField()
+
+    def __init__(self, lhs, op, rhs):
+        rhs = [value if hasattr(value, "resolve_expression") else Value(value) for value in rhs]
+        super().__init__(*lhs, *rhs)
+        self.op = op
+        self.width = len(lhs)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        lhs, rhs = ", ".join(sqls[:self.width]), ", ".join(sqls[self.width:])
+        return f"({lhs}) {self.op} ({rhs})", params
+
+
+
+
+def _key_compare(op, name, pk):
+    return RowCompare([name_sort_key(), "id"], op, [name, pk])
+
+
+def _named_rows(queryset):
+    return queryset.alias(name_key=name_sort_key()).filter(name_key__isnull=False)
+
+
+def _null_rows(queryset):
+    return queryset.alias(name_key=name_sort_key()).filter(name_key__isnull=True)
+
+
+
+
+# *****************
+# 一覧の並び（シメイ昇順・NULL は最後、同名は id 昇順）で指定行の後ろ / 前を読むクエリセット
+# ・どれも student_company_name_idx の (company, シメイ, id) をその位置からたどる（OFFSET も読み飛ばしもなし）
+#   後ろは「>」の昇順、前は「<」の降順（索引を逆向きにたどる）
+# ・シメイが NULL の行は行値比較に乗らないので別のクエリセットにし、足りない分だけ続けて読む
+# *****************
+def _after_querysets(queryset, name, pk):
+    nulls = _null_rows(queryset).order_by("id")
+    if name is None:
+        return [nulls.filter(id__gt=pk)]
+    named = (
+        _named_rows(queryset)
+        .filter(_key_compare(">", name, pk))
+        .order_by(name_sort_key().asc(), "id")
+    )
+    return [named, nulls]
+
+
+def _before_querysets(queryset, name, pk):
+    named = _named_rows(queryset).order_by(name_sort_key().desc(), "-id")
+    if name is None:
+        return [_null_rows(queryset).filter(id__lt=pk).order_by("-id"), named]
+    return [named.filter(_key_compare("<", name, pk))]
+
+
+def _take(querysets, limit):
+    rows = []
+    for qs in querysets:
+        if len(rows) >= limit:
+            break
+        rows += list(qs[:limit - len(rows)])
+    return rows
+
+
+
+
+def rows_after(queryset, name, pk, limit):
+    """一覧の並びで指定行より後ろの行を最大 limit 件（前から順）"""
+    return _take(_after_querysets(queryset, name, pk), limit)
+
+
+def rows_before(queryset, name, pk, limit):
+    """一覧の並びで指定行より前の行を最大 limit 件（近い順）"""
+    return _take(_before_querysets(queryset, name, pk), limit)
+
+
+
+
+# *****************
+# 列ヘッダーで並び替えた一覧（?o=）での前後の学生 ID
+# ・並び替え列は NULL や重複を含み行値比較にできないので、LAG / LEAD のウィンドウ関数で求める
+#   （絞り込み後の行を並べて読むクエリ 1 回。既定の並びより重いが、並び替えているときだけ）
+# ・学生の行は外側の SELECT で選ぶ（内側で絞るとウィンドウがその 1 行だけになる）
+# *****************
+def _ordered_neighbour_ids(queryset, student, ordering):
+    rows = (
+        queryset.order_by()
+        .annotate(
+            prev_id=Window(Lag("id"), order_by=ordering),
+            next_id=Window(Lead("id"), order_by=ordering),
+        )
+        .values_list("id", "prev_id", "next_id")
+    )
+    sql, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT prev_id, next_id FROM ({sql}) AS list WHERE id = %s", (*params, student.id))
+        row = cursor.fetchone()
+    return row or (None, None)
+
+
+
+
+# *****************
+# 一覧の並びで前後の学生 ID を返す
+# ・ID リストを保持せず、キーセット条件で 1 件ずつ取得する（前後それぞれ LIMIT 1 のクエリ 1 回。
+#   シメイありの行と NULL の行の境目だけ 2 回）
+# ・queryset は一覧と同じ条件で絞り込み済みのもの
+# ・ordering を渡すと（一覧を列ヘッダーで並び替えているとき）その並びで求める
+# *****************
+def get_neighbour_ids(queryset, student, ordering=None):
+    if ordering:
+        return _ordered_neighbour_ids(queryset, student, ordering)
+    ids = queryset.values_list("id", flat=True)
+    prev_ids = _take(_before_querysets(ids, student.name, student.id), 1)
+    next_ids = _take(_after_querysets(ids, student.name, student.id), 1)
+    return (prev_ids or [None])[0], (next_ids or [None])[0]
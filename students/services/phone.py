@@ -0,0 +1,17 @@
+import re
+import unicodedata
+
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+# *****************
+# 電話番号の正規化（照合用）
+# ・全角数字は NFKC で半角にし、ハイフン・空白・括弧などの数字以外を取り除く
+# ・数字が残らなければ None
+# *****************
+def normalize_phone(value):
+    if not value:
+        return None
+    digits = _NON_DIGITS.sub('', unicodedata.normalize('NFKC', str(value)))
+    return digits or None
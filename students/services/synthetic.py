@@ -0,0 +1,147 @@
+import csv
+import io
+import random
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ..models import CALL_RESULTS_CACHE, CacheVersion, CallResult, CallResultOption, Company, Pattern, PatternItem
+from .call_slot import CALL_TIMEZONES
+from .csv_import import OUTPUT_COLUMNS, build_student, insert_students
+
+
+# *****************
+# 合成データの分布
+# ・分類ごとの学生の割合、コール回数の割合（0〜3 回）、TEL終了の割合
+# *****************
+SYNTHETIC_COMPANY_PREFIX = "合成企業"
+
+CALL_RESULT_SETS = {
+    "合成_通常": ["不在", "留守電", "折り返し待ち", "日程調整済", "辞退", "番号違い"],
+    "合成_説明会": ["不在", "参加予定", "検討中", "不参加"],
+}
+MAJOR_CLASSES = [
+    # 大分類, 割合, 分類
+    ("直確TEL", 40, "合成_通常"),
+    ("即TEL", 25, "合成_通常"),
+    ("説明会予約", 20, "合成_説明会"),
+    ("面接調整", 10, "合成_通常"),
+    ("内定フォロー", 5, "合成_通常"),
+]
+MINOR_CLASSES = ["A", "B", "C", "D"]
+CALL_COUNT_WEIGHTS = [35, 30, 20, 15]
+DONE_TEL_RATE = 0.15
+
+KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワ"
+UNIVERSITIES = ["東京大学", "京都大学", "大阪大学", "早稲田大学", "慶應義塾大学", "明治大学", "同志社大学"]
+FACULTIES = ["経済学部", "法学部", "文学部", "工学部", "理学部", "商学部"]
+
+
+
+
+def _kana(rng, length):
+    return "".join(rng.choice(KANA) for _ in range(length))
+
+
+
+
+# *****************
+# 合成の学生 1 行（アップロード CSV と同じ形式の dict）
+# ・1〜3 コール目は前のコールの 1〜3 日後
+# *****************
+def synthetic_row(rng, company_name, serial, today):
+    major_class = rng.choices(
+        [m for m, _, _ in MAJOR_CLASSES], weights=[w for _, w, _ in MAJOR_CLASSES]
+    )[0]
+    row = dict.fromkeys(OUTPUT_COLUMNS, "")
+    row.update({
+        "company": company_name,
+        "name": f"{_kana(rng, 3)} {_kana(rng, 2)}",
+        "phone_number": f"090{rng.randrange(10**8):08d}",
+        "process_destination": rng.choice(["マイナビ", "リクナビ", "自社サイト"]),
+        "data_id": f"S{serial:08d}",
+        "grad_year": str(today.year + rng.choice([1, 2])),
+        "major_class": major_class,
+        "minor_class": rng.choice(MINOR_CLASSES),
+        "full_name": f"合成 {serial}",
+        "university": rng.choice(UNIVERSITIES),
+        "faculty": rng.choice(FACULTIES),
+        "first_entry_date": (today - timedelta(days=rng.randrange(1, 120))).isoformat(),
+    })
+
+    call_date = today - timedelta(days=rng.randrange(0, 14))
+    calls = rng.choices(range(4), weights=CALL_COUNT_WEIGHTS)[0]
+    for prefix in ("first", "second", "third")[:calls]:
+        row[f"{prefix}_call_date"] = call_date.isoformat()
+        row[f"{prefix}_call_timezone"] = rng.choice(CALL_TIMEZONES)
+        row[f"{prefix}_call_notes"] = rng.choice(["不在", "留守電", "折り返し待ち"])
+        call_date += timedelta(days=rng.randrange(1, 4))
+    if rng.random() < DONE_TEL_RATE:
+        row["done_tel"] = "True"
+    return row
+
+
+
+
+def synthetic_rows(count, company_name, seed=0, start=0, today=None):
+    rng = random.Random(f"{seed}:{company_name}:{start}")
+    today = today or timezone.localdate()
+    return [synthetic_row(rng, company_name, start + i, today) for i in range(count)]
+
+
+
+
+# *****************
+# 合成の CSV（アップロード・変換のベンチマーク用）
+# *****************
+def synthetic_csv(count, company_name, seed=0, start=0):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=OUTPUT_COLUMNS)
+    writer.writeheader()
+    writer.writerows(synthetic_rows(count, company_name, seed=seed, start=start))
+    return output.getvalue().encode("cp932", errors="replace")
+
+
+
+
+# *****************
+# 企業とパターン（大分類 → 分類・トークスクリプト）
+# *****************
+def create_synthetic_company(name):
+    results = {}
+    for key, labels in CALL_RESULT_SETS.items():
+        results[key], created = CallResult.objects.get_or_create(name=key)
+        if created:
+            CallResultOption.objects.bulk_create(
+                CallResultOption(call_result=results[key], code=i + 1, label=label, sort_order=i)
+                for i, label in enumerate(labels)
+            )
+    company = Company.objects.create(name=name)
+    pattern = Pattern.objects.create(company=company)
+    PatternItem.objects.bulk_create(
+        PatternItem(
+            pattern=pattern, major_class=major_class, classification=results[result_key],
+            talk_script=f"https://example.com/scripts/{i}",
+        )
+        for i, (major_class, _, result_key) in enumerate(MAJOR_CLASSES)
+    )
+    # bulk_create は save() を通らないので選択肢キャッシュの世代を自分で進める
+    CacheVersion.bump(CALL_RESULTS_CACHE)
+    return company
+
+
+
+
+# *****************
+# 合成データセット一式を作成する
+# ・学生は CSV 取り込みと同じ build_student → insert_students（COPY）で登録する
+# *****************
+def generate_dataset(companies, students_per_company, seed=0, prefix=SYNTHETIC_COMPANY_PREFIX):
+    start = Company.objects.filter(name__startswith=prefix).count()
+    created = []
+    for i in range(start, start + companies):
+        company = create_synthetic_company(f"{prefix}{i:04d}")
+        rows = synthetic_rows(students_per_company, company.name, seed=seed)
+        insert_students([build_student(company, row) for row in rows])
+        created.append(company)
+    return created
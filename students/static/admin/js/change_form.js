@@ -1,6 +1,114 @@
-document.addEventListener("DOMContentLoaded", function() {
-    window.addEventListener("beforeunload", function() {
-      const url = "{{ unlock_url }}";
-      if (url) navigator.sendBeacon(url);
+// ───────────── 編集ロックの生存確認・解除 ─────────────
+// ・開いている編集画面（タブ）ごとに学生 ID を localStorage に登録する
+// ・生存確認は最初に間隔を迎えたタブが、全タブ分の学生 ID をまとめて 1 回だけ送る
+//   （タブを何枚開いていても、1 ユーザーにつき間隔ごとに 1 リクエスト）
+// ・生存確認はロックが空いていれば取り直す。他ユーザーに取られていた学生（lost）は
+//   localStorage で全タブに知らせ、その学生を開いているタブは警告して開き直す
+// ・ページ離脱時は、他のタブで開いていない学生のロックだけを解除する
+//   （フォーム送信時は送らない。保存後はサーバー側で解除し、次の画面が取り直す）
+// ・戻る / 進むでキャッシュ（bfcache）から復元されたときは登録し直し、すぐ生存確認を送る
+// ・送信はフォームの CSRF トークン付き POST（sendBeacon でも同じ FormData を送る）
+document.addEventListener("DOMContentLoaded", function () {
+    const config = document.getElementById("edit-lock");
+    const tokenInput = document.querySelector("input[name=csrfmiddlewaretoken]");
+    if (!config || !tokenInput) return;
+
+    const studentId = config.dataset.studentId;
+    const url = config.dataset.url;
+    const interval = parseInt(config.dataset.interval, 10) * 1000;
+    const tabPrefix = "edit-lock:tab:";
+    const tabKey = `${tabPrefix}${Date.now()}:${Math.random().toString(36).slice(2)}`;
+    const beatKey = "edit-lock:last-beat";
+    const lostKey = "edit-lock:lost";
+    let submitting = false;
+
+    function register() {
+      localStorage.setItem(tabKey, JSON.stringify({ id: studentId, seen: Date.now() }));
+    }
+
+    // 生きているタブが開いている学生 ID（しばらく登録が更新されていないタブは消す）
+    function openStudentIds() {
+      const ids = new Set();
+      const keys = [];
+      for (let i = 0; i < localStorage.length; i++) {
+        const key = localStorage.key(i);
+        if (key && key.startsWith(tabPrefix)) keys.push(key);
+      }
+      keys.forEach(key => {
+        const tab = JSON.parse(localStorage.getItem(key) || "null");
+        if (!tab || Date.now() - tab.seen > interval * 3) {
+          localStorage.removeItem(key);
+        } else {
+          ids.add(tab.id);
+        }
+      });
+      return Array.from(ids);
+    }
+
+    function send(action, ids, beacon) {
+      if (ids.length === 0) return Promise.resolve(null);
+      const body = new FormData();
+      body.append("csrfmiddlewaretoken", tokenInput.value);
+      body.append("action", action);
+      body.append("ids", ids.join(","));
+      if (beacon && navigator.sendBeacon) {
+        navigator.sendBeacon(url, body);
+        return Promise.resolve(null);
+      }
+      return fetch(url, { method: "POST", body: body, credentials: "same-origin", keepalive: beacon })
+        .then(response => response.ok ? response.json() : null)
+        .catch(() => null);
+    }
+
+    // このタブの学生のロックが他ユーザーに取られていたら、警告して開き直す
+    // （開き直すと change_view がロックを取り直すか、編集中のユーザー名を出して一覧へ戻す）
+    function checkLost(ids) {
+      if (!ids.map(String).includes(String(studentId))) return;
+      alert("編集ロックが切れ、他のユーザーが編集を始めました。画面を開き直します（未保存の変更は破棄されます）。");
+      location.reload();
+    }
+
+    function keepalive(ids) {
+      localStorage.setItem(beatKey, String(Date.now()));
+      send("keepalive", ids, false).then(data => {
+        if (!data || data.held >= ids.length) return;
+        localStorage.setItem(lostKey, JSON.stringify({ ids: data.lost, at: Date.now() }));
+        checkLost(data.lost);
+      });
+    }
+
+    function heartbeat() {
+      register();
+      const lastBeat = parseInt(localStorage.getItem(beatKey) || "0", 10);
+      if (Date.now() - lastBeat < interval * 0.8) return;  // 他のタブが送ったばかり
+      keepalive(openStudentIds());
+    }
+
+    // 他のタブが受け取った lost の通知
+    window.addEventListener("storage", function (event) {
+      if (event.key !== lostKey || !event.newValue) return;
+      checkLost(JSON.parse(event.newValue).ids || []);
     });
+
+    document.querySelectorAll("form").forEach(form => {
+      form.addEventListener("submit", function () { submitting = true; });
+    });
+
+    window.addEventListener("pagehide", function () {
+      localStorage.removeItem(tabKey);
+      if (submitting) return;
+      if (!openStudentIds().includes(studentId)) {
+        send("release", [studentId], true);
+      }
+    });
+
+    window.addEventListener("pageshow", function (event) {
+      if (!event.persisted) return;
+      submitting = false;
+      register();
+      keepalive([studentId]);
+    });
+
+    register();
+    setInterval(heartbeat, interval);
   });
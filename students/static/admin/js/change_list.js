@@ -14,3 +14,34 @@ document.addEventListener("DOMContentLoaded", function () {
       }
     });
   });
+
+// ───────────── 編集中表示の定期更新 ─────────────
+// 表示中の行の学生 ID をまとめて 1 回問い合わせ、各行のバッジを差し替える
+document.addEventListener("DOMContentLoaded", function () {
+    const config = document.getElementById("lock-status");
+    const badges = document.querySelectorAll(".lock-badge[data-student-id]");
+    if (!config || badges.length === 0) return;
+
+    const ids = Array.from(badges, badge => badge.dataset.studentId);
+    const url = `${config.dataset.url}?ids=${ids.join(",")}`;
+    const interval = parseInt(config.dataset.interval, 10) * 1000;
+
+    function refresh() {
+      if (document.visibilityState === "hidden") return;
+      fetch(url, { credentials: "same-origin" })
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+          if (!data) return;
+          badges.forEach(badge => {
+            const lock = data.locks[badge.dataset.studentId];
+            badge.textContent = lock ? lock.user : "";
+            badge.classList.toggle("is-locked", !!lock && !lock.mine);
+            badge.classList.toggle("is-mine", !!lock && lock.mine);
+          });
+        })
+        .catch(() => {});
+    }
+
+    setInterval(refresh, interval);
+    document.addEventListener("visibilitychange", refresh);
+  });
@@ -1,4 +1,6 @@
 document.addEventListener("DOMContentLoaded", function () {
+    pollImportJob();
+
     const fileInput = document.getElementById("csv_file");
     const fileName = document.getElementById("file-name");
     const form = fileInput.closest("form");
@@ -22,3 +24,53 @@ document.addEventListener("DOMContentLoaded", function () {
       }
     });
   });
+
+// 取り込みジョブの進捗をポーリングして表示する
+function pollImportJob() {
+    const panel = document.getElementById("import-job");
+    if (!panel) return;
+
+    const statusEl = panel.querySelector(".import-job-status");
+    const barEl = panel.querySelector(".import-job-bar-fill");
+    const messageEl = panel.querySelector(".import-job-message");
+    const errorsEl = panel.querySelector(".import-job-errors");
+    const changesEl = panel.querySelector(".import-job-changes tbody");
+
+    const render = (job) => {
+      let status = job.status_display;
+      if (!job.finished && job.processed_rows) {
+        status += `（${job.processed_rows} 行確認済み）`;
+      }
+      statusEl.textContent = status;
+      barEl.style.width = `${job.progress}%`;
+      panel.classList.toggle("failed", job.status === "failed");
+      messageEl.textContent = job.message;
+      errorsEl.innerHTML = "";
+      (job.errors || []).forEach(err => {
+        const li = document.createElement("li");
+        li.textContent = `${err.row_no}行目: ${err.reason}`;
+        errorsEl.appendChild(li);
+      });
+      changesEl.innerHTML = "";
+      (job.changes || []).forEach(change => {
+        const tr = document.createElement("tr");
+        [`${change.row_no}行目`, change.name, change.field, change.old, "→", change.new].forEach(text => {
+          const td = document.createElement("td");
+          td.textContent = text;
+          tr.appendChild(td);
+        });
+        changesEl.appendChild(tr);
+      });
+    };
+
+    const tick = () => {
+      fetch(panel.dataset.statusUrl, { credentials: "same-origin" })
+        .then(res => res.json())
+        .then(job => {
+          render(job);
+          if (!job.finished) setTimeout(tick, 2000);
+        })
+        .catch(() => setTimeout(tick, 5000));
+    };
+    tick();
+  }
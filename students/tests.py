@@ -1,3 +1,1048 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Collate
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .admin.changelist import estimate_count
+from .admin.student import StudentAdmin
+from .filters.grad_year import GradYearFilter
+from .middleware import QueryBudgetExceeded
+from .forms.student import StudentAdminForm
+from .models import CLASS_CHOICES_CACHE, CacheVersion, CallAttempt, CallQueueEntry, CallResult, CallResultOption, Company, ImportJob, Pattern, PatternItem, Student, StudentLock
+from .services.benchmark import run_suite
+from .services.call_slot import (
+    CALL_TIMEZONES,
+    determine_second_call_timezone,
+    determine_third_call_timezone,
+)
+from .services.csv_import import (
+    OUTPUT_COLUMNS,
+    ImportRow,
+    UPSERT_FIELDS,
+    ValidationReport,
+    build_student,
+    insert_students,
+    iter_valid_rows,
+    open_csv_stream,
+    upsert_students,
+)
+from .services.call_queue import build_call_queue, claim_next_entry
+from .services.call_results import get_pattern_config, outcome_counts
+from .services.class_choices import invalidate_class_choices, major_class_choices, minor_class_choices
+from .services.csv_export import stream_students_csv
+from .services.dashboard import build_company_dashboard
+from .services.edit_lock import LOCK_EXPIRE_MINUTES, CacheLockStore, TableLockStore, get_lock
+from .services.navigation import get_neighbour_ids, name_sort_key, rows_after
+from .services.import_jobs import JOB_STALE_SECONDS, MAX_JOB_ATTEMPTS, enqueue_import, process_pending_jobs
+
+
+# *****************
+# ポータル集計のテスト
+# *****************
+class CompanyDashboardTests(TestCase):
+    today = date(2025, 7, 10)
+    yesterday = today - timedelta(days=1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='A社')
+        Company.objects.create(name='B社')
+
+        def add(**kwargs):
+            Student.objects.create(company=cls.company, name='テスト', **kwargs)
+
+        add()
+        add(need_process=True)
+        add(done_draft=True)
+        add(done_tel=True)
+        add(first_call_date=cls.yesterday, first_call_timezone='morning')
+        add(first_call_date=cls.yesterday, first_call_timezone='evening')
+        add(first_call_date=cls.today, first_call_timezone='noon')
+        add(
+            first_call_date=cls.yesterday, first_call_timezone='morning',
+            second_call_date=cls.yesterday, second_call_timezone='noon',
+        )
+        add(
+            first_call_date=cls.yesterday, first_call_timezone='noon',
+            second_call_date=cls.yesterday, second_call_timezone='noon',
+        )
+
+    def test_counts(self):
+        data = {d['company'].name: d for d in build_company_dashboard(self.today, self.today)}
+        a = data['A社']
+        self.assertEqual(a['count_on_date'], 1)
+        self.assertEqual(a['count_need_process'], 1)
+        self.assertEqual(a['count_wcheck'], 1)
+        self.assertEqual(a['count1'], 3)
+        self.assertEqual(a['count2'], {'morning': 1, 'noon': 1, 'evening': 0})
+        self.assertEqual(a['count3'], {'morning': 0, 'noon': 0, 'evening': 2})
+
+        b = data['B社']
+        self.assertEqual(b['count1'], 0)
+        self.assertEqual(b['count3'], {'morning': 0, 'noon': 0, 'evening': 0})
+
+    def test_count_on_date_uses_call_attempts(self):
+        data = {d['company'].name: d for d in build_company_dashboard(self.yesterday, self.today)}
+        self.assertEqual(data['A社']['count_on_date'], 4)  # 1・2コール目とも前日の学生は 1 人
+
+    def test_query_count_does_not_grow_with_companies(self):
+        with self.assertNumQueries(3):
+            build_company_dashboard(self.today, self.today)
+
+        for i in range(5):
+            Company.objects.create(name=f'追加{i}')
+        with self.assertNumQueries(3):
+            build_company_dashboard(self.today, self.today)
+
+
+
+# *****************
+# 架電ステータス・次の架電時間帯のテスト
+# *****************
+class NextCallSlotTests(TestCase):
+    today = date(2025, 7, 10)
+    yesterday = today - timedelta(days=1)
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='A社')
+        for first in CALL_TIMEZONES:
+            Student.objects.create(
+                company=company, name=f'2-{first}',
+                first_call_date=cls.yesterday, first_call_timezone=first,
+            )
+            for second in CALL_TIMEZONES:
+                Student.objects.create(
+                    company=company, name=f'3-{first}-{second}',
+                    first_call_date=cls.yesterday, first_call_timezone=first,
+                    second_call_date=cls.yesterday, second_call_timezone=second,
+                )
+
+    def test_saved_state_matches_python_rules(self):
+        for s in Student.objects.all():
+            if s.second_call_date is None:
+                expected = determine_second_call_timezone(s.first_call_timezone)
+            else:
+                expected = determine_third_call_timezone(s.first_call_timezone, s.second_call_timezone)
+            self.assertEqual(s.next_call_slot, expected, s.name)
+
+    def test_bulk_refresh_matches_save(self):
+        saved = dict(Student.objects.values_list('pk', 'next_call_slot'))
+        Student.objects.update(call_stage='first', next_call_slot=None)
+        Student.objects.all().refresh_call_state()
+        self.assertEqual(dict(Student.objects.values_list('pk', 'next_call_slot')), saved)
+        self.assertEqual(
+            set(Student.objects.values_list('call_stage', flat=True)), {'second', 'third'},
+        )
+
+    def test_update_fields_keeps_state_in_sync(self):
+        s = Student.objects.get(name='2-morning')
+        s.second_call_date = self.today
+        s.second_call_timezone = 'noon'
+        s.save(update_fields=['second_call_date', 'second_call_timezone'])
+        s.refresh_from_db()
+        self.assertEqual((s.call_stage, s.next_call_slot), ('third', 'evening'))
+
+    def test_call_attempts_follow_columns(self):
+        s = Student.objects.get(name='2-morning')
+        self.assertEqual(list(s.call_attempts.values_list('attempt_no', 'call_date', 'slot')), [(1, self.yesterday, 'morning')])
+        s.second_call_date = self.today
+        s.second_call_timezone = 'noon'
+        s.save(update_fields=['second_call_date', 'second_call_timezone'])
+        self.assertEqual(
+            list(s.call_attempts.order_by('attempt_no').values_list('attempt_no', 'call_date')),
+            [(1, self.yesterday), (2, self.today)],
+        )
+        Student.objects.filter(pk=s.pk).update(first_call_date=None, first_call_timezone=None)
+        Student.objects.filter(pk=s.pk).sync_call_attempts()
+        self.assertEqual(list(s.call_attempts.values_list('attempt_no', flat=True)), [2])
+
+    def test_due_for_call_is_single_query(self):
+        with self.assertNumQueries(1):
+            names = set(
+                Student.objects.due_for_call(3, 'morning', today=self.today)
+                .values_list('name', flat=True)
+            )
+        self.assertEqual(names, {'3-noon-evening', '3-evening-noon', '3-evening-evening'})
+
+
+
+# *****************
+# 詳細画面の前後遷移のテスト
+# ・キーセットで求めた前後が一覧の並び（NULL・同名を含む）と一致すること
+# *****************
+class NavigationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='A社')
+        other = Company.objects.create(name='B社')
+        for name in ['サトウ', None, 'アベ', 'サトウ', None, 'イトウ', 'アベ']:
+            Student.objects.create(company=company, name=name)
+        Student.objects.create(company=other, name='アオキ')
+        cls.qs = Student.objects.filter(company=company)
+
+    def test_neighbours_follow_list_order(self):
+        ids = list(self.qs.order_by(name_sort_key(), 'id').values_list('id', flat=True))
+        last_named = self.qs.filter(name__isnull=False).order_by(name_sort_key(), 'id').last()
+        first_null = self.qs.filter(name__isnull=True).order_by('id').first()
+        for i, student in enumerate(self.qs.order_by(name_sort_key(), 'id')):
+            # シメイありの行と NULL の行の境目だけ、次（前）の学生をもう一方の側からもう 1 回読む
+            with self.assertNumQueries(3 if student in (last_named, first_null) else 2):
+                prev_id, next_id = get_neighbour_ids(self.qs, student)
+            self.assertEqual(prev_id, ids[i - 1] if i > 0 else None)
+            self.assertEqual(next_id, ids[i + 1] if i + 1 < len(ids) else None)
+
+    def test_keyset_changelist_pages(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+
+        company = Company.objects.create(name='C社')
+        for name in ['サトウ', 'アベ', 'サトウ', 'イトウ', 'アベ', 'ウエノ', 'アベ']:
+            Student.objects.create(company=company, name=name)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        ids = list(company.students.order_by(name_sort_key(), 'id').values_list('id', flat=True))
+        seen = []
+        base = reverse('admin:students_student_changelist')
+        query = f'?company={company.id}'
+        with mock.patch.object(StudentAdmin, 'list_per_page', 3):
+            while query:
+                cl = self.client.get(base + query).context_data['cl']
+                seen += [student.pk for student in cl.result_list]
+                query = cl.next_page_url
+        self.assertEqual(seen, ids)
+
+    def test_neighbours_follow_sorted_list(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+
+        company = Company.objects.create(name='D社')
+        for name, major in [('サトウ', 'B'), ('アベ', None), ('イトウ', 'A'), ('アベ', 'B'), ('エノモト', 'A'), ('ウエノ', 'B')]:
+            Student.objects.create(company=company, name=name, major_class=major)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        filters = urlencode({'company': company.id, 'o': '-3.1'})  # 大分類の降順 → シメイ
+        cl = self.client.get(f"{reverse('admin:students_student_changelist')}?{filters}").context_data['cl']
+        ids = [student.pk for student in cl.result_list]
+        self.assertNotEqual(ids, list(company.students.order_by(name_sort_key(), 'id').values_list('id', flat=True)))
+
+        def linked_id(url):
+            return url and int(url.split('/')[-3])
+
+        for i, pk in enumerate(ids):
+            url = reverse('admin:students_student_change', args=[pk])
+            context = self.client.get(url, {'_changelist_filters': filters}).context_data
+            self.assertEqual(linked_id(context['prev_student_url']), ids[i - 1] if i > 0 else None)
+            self.assertEqual(linked_id(context['next_student_url']), ids[i + 1] if i + 1 < len(ids) else None)
+
+
+
+
+# *****************
+# 大分類・小分類フィルターの選択肢のテスト
+# *****************
+class ClassChoicesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='A社')
+        for major, minor, done in [('直確TEL', 'B', False), ('直確TEL', 'A', False), ('説明会', 'C', False), ('完了済', 'D', True)]:
+            Student.objects.create(company=cls.company, major_class=major, minor_class=minor, done_tel=done)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_choices_are_cached_until_classes_change(self):
+        self.assertEqual(major_class_choices(self.company.id), ['直確TEL', '説明会'])
+        with self.assertNumQueries(0):  # 世代番号もプロセス内のキャッシュから読む
+            self.assertEqual(minor_class_choices(self.company.id, '直確TEL'), ['A', 'B'])
+
+        student = Student.objects.get(minor_class='C')
+        student.phone_number = '09000000000'
+        student.save()
+        with self.assertNumQueries(0):  # 分類・TEL終了以外の変更では切り替えない
+            major_class_choices(self.company.id)
+
+        student.major_class = '新規'
+        student.save()
+        self.assertEqual(major_class_choices(self.company.id), ['新規', '直確TEL'])
+
+        student.done_tel = True  # TEL終了で選択肢から外れる
+        student.save()
+        self.assertEqual(major_class_choices(self.company.id), ['直確TEL'])
+        student.done_tel = False
+        student.save(update_fields=['done_tel'])
+        self.assertEqual(major_class_choices(self.company.id), ['新規', '直確TEL'])
+
+        Student.objects.filter(pk=student.pk).update(major_class='一括')  # save() を通らない更新
+        self.assertNotIn('一括', major_class_choices(self.company.id))
+        invalidate_class_choices(self.company.id)  # CSV 取り込みジョブの完了時
+        self.assertIn('一括', major_class_choices(self.company.id))
+
+
+
+
+# *****************
+# 架電結果の選択肢・トークスクリプトのキャッシュのテスト
+# ・温まっていればフォーム生成でクエリが走らず、設定を保存すると世代が進んで反映されること
+# ・コール結果の文字列が選択肢（コード）に紐づき、結果別の件数を集計できること
+# *****************
+class CallResultChoicesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='A社')
+        cls.call_result = CallResult.objects.create(name='即TEL')
+        for label in ['不在', '折り返し']:
+            CallResultOption.objects.create(call_result=cls.call_result, label=label)
+        PatternItem.objects.create(
+            pattern=Pattern.objects.create(company=cls.company), major_class='直確TEL',
+            classification=cls.call_result, talk_script='https://example.com/script',
+        )
+        cls.student = Student.objects.create(company=cls.company, name='テスト', major_class='直確TEL')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_choices_cached_until_config_changes(self):
+        config = get_pattern_config(self.company.id, '直確TEL')
+        self.assertEqual(config.results, ('不在', '折り返し'))
+        self.assertEqual(config.talk_script_url, 'https://example.com/script')
+        with self.assertNumQueries(0):
+            form = StudentAdminForm(instance=self.student)
+        self.assertEqual([c for c, _ in form.fields['first_call_notes'].widget.choices], ['', '不在', '折り返し'])
+
+        CallResultOption.objects.create(call_result=self.call_result, label='留守電')
+        form = StudentAdminForm(instance=self.student)
+        self.assertEqual([c for c, _ in form.fields['first_call_notes'].widget.choices], ['', '不在', '折り返し', '留守電'])
+
+    def test_admin_bulk_delete_refreshes_choices(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.assertEqual(get_pattern_config(self.company.id, '直確TEL').results, ('不在', '折り返し'))
+        # 管理画面の「選択された コール結果 の削除」は QuerySet.delete()（選択肢は CASCADE で消える）
+        response = self.client.post(reverse('admin:students_callresult_changelist'), {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [self.call_result.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(CallResult.objects.exists())
+        self.assertIsNone(get_pattern_config(self.company.id, '直確TEL').results)
+
+        other = Company.objects.create(name='B社')
+        pattern = Pattern.objects.get(company=self.company)
+        pattern.company = other  # 企業の付け替え
+        pattern.save()
+        self.assertIsNone(get_pattern_config(self.company.id, '直確TEL'))
+
+    def test_bump_is_one_upsert(self):
+        # 行の有無を読まずに INSERT ... ON CONFLICT 1 文で進める（初回の同時 bump でも取りこぼさない）
+        with self.assertNumQueries(1):
+            CacheVersion.bump('test:new')
+        CacheVersion.bump('test:new')
+        self.assertEqual(CacheVersion.current('test:new'), 2)
+
+    def test_outcome_codes(self):
+        self.student.first_call_notes = '折り返し'
+        self.student.second_call_notes = '自由記述'
+        self.student.save()
+        option = CallResultOption.objects.get(label='折り返し')
+        self.assertEqual(option.code, 2)
+        self.assertEqual(self.student.first_call_outcome_id, option.pk)
+        self.assertIsNone(self.student.second_call_outcome_id)
+
+        Student.objects.filter(pk=self.student.pk).update(first_call_outcome=None)
+        Student.objects.all().refresh_call_outcomes()
+        self.assertEqual(outcome_counts(self.company.id, 1), [('折り返し', 1)])
+
+
+
+
+# *****************
+# 一覧のフィルター件数表示（?_facets=True）のテスト
+# ・一括集計の件数が、フィルターを 1 つずつ当てて数えた件数と一致すること
+# *****************
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+
+        cls.company = Company.objects.create(name='A社')
+        today = date.today()
+        tzs = ('morning', 'noon', 'evening')
+        for i in range(30):
+            Student.objects.create(
+                company=cls.company, name=f'テスト{i:02d}', grad_year=2026 + i % 2,
+                major_class=('直確TEL', '説明会')[i % 2], minor_class='ABC'[i % 3],
+                first_call_date=today - timedelta(days=1 + i % 2) if i % 4 else None,
+                first_call_timezone=tzs[i % 3], done_tel=(i % 7 == 0),
+            )
+        Student.objects.create(company=Company.objects.create(name='B社'), name='他社', major_class='直確TEL')
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def changelist(self, facets=True, **params):
+        from django.urls import reverse
+
+        params = {'company': self.company.id, **params}
+        if facets:
+            params['_facets'] = 'True'
+        response = self.client.get(reverse('admin:students_student_changelist'), params)
+        return response.context_data['cl']
+
+    def test_counts_match_per_filter_queries(self):
+        cl = self.changelist(major_class='直確TEL', call_progress='second', grad_year='2026')
+        base = Student.objects.filter(company=self.company)
+        for spec in cl.filter_specs:
+            if not spec.lookup_choices:
+                continue
+            others = base
+            for other in cl.filter_specs:
+                if other is not spec:
+                    others = other.queryset(cl.request, others)
+            counts = cl.get_facet_counts(spec)
+            for i, choice in enumerate(spec.lookup_choices):
+                q = Q(grad_year=choice) if isinstance(spec, GradYearFilter) else spec.choice_q(choice[0])
+                self.assertEqual(counts[f'{i}__c'], others.filter(q).count(), (spec.title, choice))
+
+    def test_query_count_is_bounded(self):
+        params = {'major_class': '直確TEL', 'minor_class': 'A', 'detailed_call': '2_noon'}
+        self.changelist(facets=False, **params)  # 分類の選択肢をキャッシュさせる
+        with CaptureQueriesContext(connection) as plain:
+            self.changelist(facets=False, **params)
+        with CaptureQueriesContext(connection) as facets:
+            self.changelist(**params)
+        with CaptureQueriesContext(connection) as cached:
+            self.changelist(**params)
+        # 件数表示は全フィルター分で集計 1 回だけ増え、キャッシュ済みなら増えない
+        self.assertEqual(len(facets), len(plain) + 1)
+        self.assertEqual(len(cached), len(plain))
+
+
+
+
+# *****************
+# 主要画面のクエリ数上限（QUERY_BUDGETS）のテスト
+# ・企業や学生が増えてもクエリ数が上限内に収まること（N+1 の検出）
+# *****************
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+
+        yesterday = date.today() - timedelta(days=1)
+        for i in range(5):
+            company = Company.objects.create(name=f'企業{i}')
+            Student.objects.bulk_create(
+                Student(company=company, name=f'テスト{n:02d}', major_class='直確TEL', minor_class='A',
+                        first_call_date=yesterday, first_call_timezone='noon')
+                for n in range(30)
+            )
+        cls.company = company
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_views_stay_within_budget(self):
+        from django.urls import reverse
+
+        student = self.company.students.first()
+        changelist = reverse('admin:students_student_changelist')
+        filters = f'company={self.company.id}&major_class=直確TEL'
+        for url in [
+            reverse('company_portal_index'),
+            f'{changelist}?{filters}',
+            f'{changelist}?{filters}&_facets=True&detailed_call=2_evening',
+            f"{reverse('admin:students_student_change', args=[student.pk])}?_changelist_filters=company%3D{self.company.id}",
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('db;dur=', response['Server-Timing'])
+
+    @override_settings(QUERY_BUDGETS={'company_portal_index': 0})
+    def test_over_budget_raises(self):
+        from django.urls import reverse
+
+        with self.assertRaises(QueryBudgetExceeded), self.assertLogs('students.queries', 'WARNING'):
+            self.client.get(reverse('company_portal_index'))
+
+
+
+
+# *****************
+# 合成データとベンチマークのテスト（小さいデータ量で一通り動くこと）
+# *****************
+class BenchmarkSuiteTests(TestCase):
+    def test_run_suite(self):
+        results = run_suite(20, companies=2, repeat=1, upload_rows=10)
+        self.assertEqual(Company.objects.filter(name__startswith='合成企業').count(), 2)
+        self.assertEqual(Student.objects.count(), 2 * 20 + 10)
+        self.assertEqual(Student.objects.exclude(call_stage='first').exclude(done_tel=True).exists(), True)
+        statuses = {r['name']: r['status'] for r in results}
+        self.assertEqual(statuses.pop('csv_upload'), 302)
+        self.assertEqual(set(statuses.values()), {200})
+
+
+
+
+# *****************
+# 編集ロックのテスト
+# ・有効なロックがある間は他ユーザーが取れないこと（テーブル版・キャッシュ版とも）
+# ・ロックの取得・延長・解除で Student の行を書き換えないこと
+# ・一覧・ロック状態エンドポイントは表示行分のロックを 1 クエリで読むこと
+# ・生存確認は複数の学生を 1 文で取得 / 延長し（空きは取り直す）、CSRF トークンが必要なこと
+# *****************
+class EditLockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+
+        cls.alice = User.objects.create_superuser('alice', 'alice@example.com', 'pw')
+        cls.bob = User.objects.create_superuser('bob', 'bob@example.com', 'pw')
+        cls.student = Student.objects.create(company=Company.objects.create(name='A社'), name='テスト')
+
+    def assert_lock_cycle(self, store):
+        student_id = self.student.pk
+        self.assertTrue(store.acquire(student_id, self.alice))
+        self.assertFalse(store.acquire(student_id, self.bob))
+        self.assertTrue(store.acquire(student_id, self.alice))  # 自分のロックは延長
+
+        store.release(student_id, self.bob)  # 他人のロックは解除しない
+        self.assertEqual(store.get_many([student_id])[student_id].username, 'alice')
+        self.assertEqual(store.heartbeat([student_id], self.bob), [student_id])
+        store.release(student_id, self.alice)
+        self.assertEqual(store.get_many([student_id]), {})
+
+        # 解除が遅れて届いた後の生存確認は、空いていれば取り直す
+        self.assertEqual(store.heartbeat([student_id], self.alice), [])
+        self.assertEqual(store.get_many([student_id])[student_id].username, 'alice')
+        store.release(student_id, self.alice)
+
+    def test_table_store(self):
+        store = TableLockStore()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assert_lock_cycle(store)
+        self.assertFalse(any('UPDATE "students_student"' in q['sql'] for q in ctx.captured_queries))
+
+        store.acquire(self.student.pk, self.alice)
+        StudentLock.objects.update(locked_at=timezone.now() - timedelta(minutes=LOCK_EXPIRE_MINUTES))
+        self.assertEqual(store.get_many([self.student.pk]), {})
+        self.assertTrue(store.acquire(self.student.pk, self.bob))  # 期限切れは奪える
+
+    def test_cache_store(self):
+        cache.clear()
+        self.assert_lock_cycle(CacheLockStore())
+
+    def test_change_view_redirects_when_locked(self):
+        from django.urls import reverse
+
+        TableLockStore().acquire(self.student.pk, self.alice)
+        self.client.force_login(self.bob)
+        url = reverse('admin:students_student_change', args=[self.student.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_lock(self.student.pk).username, 'alice')
+
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.post(
+            reverse('admin:students_student_lock_heartbeat'),
+            {'action': 'release', 'ids': str(self.student.pk)},
+        )
+        self.assertIsNone(get_lock(self.student.pk))
+
+    def test_heartbeat(self):
+        from django.test import Client
+        from django.urls import reverse
+
+        other = Student.objects.create(company=self.student.company, name='テスト2')
+        released = Student.objects.create(company=self.student.company, name='テスト3')
+        store = TableLockStore()
+        store.acquire(self.student.pk, self.alice)
+        store.acquire(other.pk, self.bob)
+        StudentLock.objects.update(locked_at=timezone.now() - timedelta(seconds=30))
+
+        url = reverse('admin:students_student_lock_heartbeat')
+        ids = f"{self.student.pk},{other.pk},{released.pk}"
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.alice)
+        self.assertEqual(client.post(url, {'ids': ids}).status_code, 403)  # CSRF トークンなし
+
+        self.client.force_login(self.alice)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.post(url, {'ids': ids}).json()
+        self.assertEqual(data['held'], 2)  # 解除済みのロックは取り直す
+        self.assertEqual(data['lost'], [other.pk])  # 他人のロックは取らない
+        self.assertEqual(get_lock(released.pk).username, 'alice')
+        lock_queries = [q for q in ctx.captured_queries if 'students_student' in q['sql']]
+        self.assertEqual(len(lock_queries), 1)
+        self.assertGreater(get_lock(self.student.pk).locked_at, get_lock(other.pk).locked_at)
+
+    def test_lock_status(self):
+        from django.urls import reverse
+
+        other = Student.objects.create(company=self.student.company, name='テスト2')
+        TableLockStore().acquire(self.student.pk, self.alice)
+        self.client.force_login(self.bob)
+
+        url = reverse('admin:students_student_lock_status')
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url, {'ids': f"{self.student.pk},{other.pk}"}).json()
+        self.assertEqual(data['locks'], {str(self.student.pk): {'user': 'alice', 'mine': False}})
+        lock_queries = [q for q in ctx.captured_queries if 'students_studentlock' in q['sql']]
+        self.assertEqual(len(lock_queries), 1)
+
+        response = self.client.get(reverse('admin:students_student_changelist'), {'company': self.student.company_id})
+        self.assertContains(response, f'class="lock-badge is-locked" data-student-id="{self.student.pk}">alice<')
+
+
+
+
+# *****************
+# 架電キューのテスト
+# *****************
+class CallQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+
+        cls.alice = User.objects.create_superuser('alice', 'alice@example.com', 'pw')
+        cls.bob = User.objects.create_superuser('bob', 'bob@example.com', 'pw')
+        cls.company = Company.objects.create(name='A社')
+        yesterday = timezone.localdate() - timedelta(days=1)
+        for name in ('ウ', 'ア', 'イ', 'エ'):
+            Student.objects.create(
+                company=cls.company, name=name, first_call_date=yesterday, first_call_timezone='morning',
+            )
+        Student.objects.create(company=cls.company, name='オ', first_call_date=timezone.localdate())  # 今日かけた
+        cls.slot = Student.objects.get(name='ア').next_call_slot
+
+    def test_build_and_claim(self):
+        self.assertEqual(build_call_queue(operators=[self.alice, self.bob]), 4)
+        entries = CallQueueEntry.objects.order_by('position')
+        self.assertEqual([e.student.name for e in entries], ['ア', 'イ', 'ウ', 'エ'])
+        self.assertEqual([e.assigned_to for e in entries], [self.alice, self.bob, self.alice, self.bob])
+
+        with CaptureQueriesContext(connection) as ctx:
+            student_id = claim_next_entry(self.company.pk, 2, self.slot, self.bob)
+        self.assertEqual(Student.objects.get(pk=student_id).name, 'イ')
+        self.assertEqual(get_lock(student_id).username, 'bob')  # 同じトランザクションで編集ロックも取る
+        self.assertTrue(any('FOR UPDATE OF' in q['sql'] and 'SKIP LOCKED' in q['sql'] for q in ctx.captured_queries))
+
+        # 作り直しても取得済みの行は残り、未取得の行だけ入れ替わる
+        self.assertEqual(build_call_queue(), 3)
+        self.assertEqual(CallQueueEntry.objects.get(student_id=student_id).claimed_by, self.bob)
+
+        # 他ユーザーが編集中の学生は飛ばす
+        TableLockStore().acquire(Student.objects.get(name='ア').pk, self.bob)
+        claimed = [claim_next_entry(self.company.pk, 2, self.slot, self.alice) for _ in range(3)]
+        self.assertEqual([Student.objects.get(pk=pk).name for pk in claimed[:2]], ['ウ', 'エ'])
+        self.assertIsNone(claimed[2])
+
+    def test_claims_follow_student_state(self):
+        build_call_queue()
+        a, i, u = (Student.objects.get(name=name) for name in ('ア', 'イ', 'ウ'))
+        self.assertEqual(claim_next_entry(self.company.pk, 2, self.slot, self.alice), a.pk)
+
+        # キュー作成後に一覧から 2コール目を入れた学生は出さない
+        i.second_call_date = timezone.localdate()
+        i.save()
+        self.assertEqual(claim_next_entry(self.company.pk, 2, self.slot, self.bob), u.pk)
+
+        # 架電結果を保存した行は片付け、編集画面を閉じて（放置して）ロックが切れた行は未取得に戻す
+        u.second_call_date = timezone.localdate()
+        u.save()
+        TableLockStore().release(a.pk)
+        CallQueueEntry.objects.filter(claimed_at__isnull=False).update(
+            claimed_at=timezone.now() - timedelta(minutes=LOCK_EXPIRE_MINUTES),
+        )
+        self.assertEqual(claim_next_entry(self.company.pk, 2, self.slot, self.bob), a.pk)
+        self.assertFalse(CallQueueEntry.objects.filter(student=u).exists())
+
+    def test_next_in_queue_view(self):
+        from django.test import Client
+        from django.urls import reverse
+
+        build_call_queue()
+        params = urlencode({'company': self.company.pk, 'detailed_call': f"2_{self.slot}"})
+        url = f"{reverse('admin:students_student_queue_next')}?{params}"
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.alice)
+        self.assertEqual(client.get(url).status_code, 405)  # 状態を変えるので GET は不可
+        self.assertEqual(client.post(url).status_code, 403)  # CSRF トークンなし
+        self.assertFalse(CallQueueEntry.objects.filter(claimed_at__isnull=False).exists())
+
+        self.client.force_login(self.alice)
+        response = self.client.post(url)
+        first = Student.objects.get(name='ア')
+        self.assertTrue(response['Location'].startswith(reverse('admin:students_student_change', args=[first.pk])))
+        self.assertIn('_changelist_filters=', response['Location'])
+
+        response = self.client.post(f"{reverse('admin:students_student_queue_next')}?company={self.company.pk}")
+        self.assertTrue(response['Location'].startswith(reverse('admin:students_student_changelist')))
+
+        changelist = self.client.get(reverse('admin:students_student_changelist'), {'company': self.company.pk, 'detailed_call': f"2_{self.slot}"})
+        self.assertContains(changelist, f'<form method="post" action="{reverse("admin:students_student_queue_next")}?')
+
+
+
+
+# *****************
+# 実行計画（EXPLAIN）のテスト
+# ・Postgres にデータを投入し、一覧系の主要クエリが想定したインデックスを使っていることを確認する
+# ・enable_seqscan=off で「使えるインデックスがあるか」を判定する
+# ・Seq Scan が無いだけでは別のインデックス（student_company_name_idx など）に逃げても通ってしまうので、
+#   プランに出てくる Index Name で想定のインデックスを確認する
+# *****************
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN の検証は Postgres のみ')
+class QueryPlanTests(TestCase):
+    companies = 20
+    students_per_company = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        base = date(2025, 7, 1)
+        tzs = ('morning', 'noon', 'evening')
+        Company.objects.bulk_create(Company(name=f'企業{i}') for i in range(cls.companies))
+        students = []
+        for company in Company.objects.all():
+            for i in range(cls.students_per_company):
+                students.append(Student(
+                    company=company,
+                    name=f'テスト{i:05d}',
+                    major_class=f'大分類{i % 5}',
+                    minor_class=f'小分類{i % 7}',
+                    first_call_date=base + timedelta(days=i % 30) if i % 4 else None,
+                    first_call_timezone=tzs[i % 3],
+                    second_call_date=base + timedelta(days=i % 20) if i % 3 == 0 else None,
+                    second_call_timezone=tzs[(i + 1) % 3],
+                    done_tel=(i % 10 == 0),
+                ))
+        Student.objects.bulk_create(students, batch_size=2000)
+        Student.objects.all().refresh_call_state()
+        Student.objects.all().sync_call_attempts()
+        cls.company = Company.objects.first()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE students_student')
+            cursor.execute('ANALYZE students_callattempt')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def plan_nodes(self, query):
+        # query はクエリセット、または実行された SQL（CaptureQueriesContext で取ったもの）
+        def walk(node):
+            yield node
+            for child in node.get('Plans', []):
+                yield from walk(child)
+        if isinstance(query, str):
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {query}')
+                plan = cursor.fetchone()[0][0]['Plan']
+        else:
+            plan = json.loads(query.explain(format='json'))[0]['Plan']
+        return list(walk(plan))
+
+    def assertUsesIndex(self, qs, index_name, allow_sort=True):
+        nodes = self.plan_nodes(qs)
+        seq = [n for n in nodes if n['Node Type'] == 'Seq Scan' and n.get('Relation Name') == 'students_student']
+        self.assertFalse(seq, f'Seq Scan on students_student:\n{qs.explain()}')
+        used = {n['Index Name'] for n in nodes if 'Index Name' in n}
+        self.assertIn(index_name, used, f'{index_name} not used:\n{qs.explain()}')
+        if not allow_sort:
+            sorts = [n for n in nodes if n['Node Type'] in ('Sort', 'Incremental Sort')]
+            self.assertFalse(sorts, f'Sort node found:\n{qs.explain()}')
+
+    def test_changelist_ordering(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_sort = off')
+        qs = Student.objects.filter(company=self.company).order_by(Collate('name', 'ja-x-icu'), 'id')[:100]
+        self.assertUsesIndex(qs, 'student_company_name_idx', allow_sort=False)
+
+    def test_keyset_page(self):
+        # 深い位置のカーソルでも、(シメイ, id) の境界が索引の条件になっていること
+        # （フィルターで捨てるのではなく、索引のその位置から読み始める）
+        students = Student.objects.filter(company=self.company)
+        ordered = list(students.order_by(Collate('name', 'ja-x-icu'), 'id'))
+        anchor = ordered[400]
+        with CaptureQueriesContext(connection) as ctx:
+            rows = rows_after(students, anchor.name, anchor.pk, 50)
+        self.assertEqual(rows, ordered[401:451])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        nodes = self.plan_nodes(ctx.captured_queries[0]['sql'])
+        scans = [n for n in nodes if n.get('Index Name') == 'student_company_name_idx']
+        self.assertTrue(scans, nodes)
+        self.assertIn('ROW(', scans[0].get('Index Cond', ''), scans[0])
+        self.assertFalse([n for n in nodes if n['Node Type'] in ('Sort', 'Incremental Sort')], nodes)
+
+    def test_neighbours_seek(self):
+        students = Student.objects.filter(company=self.company)
+        ordered = list(students.order_by(Collate('name', 'ja-x-icu'), 'id'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(get_neighbour_ids(students, ordered[400]), (ordered[399].pk, ordered[401].pk))
+        for query in ctx.captured_queries:
+            scans = [n for n in self.plan_nodes(query['sql']) if n.get('Index Name') == 'student_company_name_idx']
+            self.assertIn('ROW(', scans[0].get('Index Cond', '') if scans else '', query['sql'])
+
+    def test_estimated_count(self):
+        qs = Student.objects.filter(company=self.company)
+        self.assertAlmostEqual(estimate_count(qs), self.students_per_company, delta=self.students_per_company * 0.2)
+
+    def test_called_on(self):
+        d = date(2025, 7, 5)
+        qs = Student.objects.filter(company=self.company).called_on(d)
+        self.assertUsesIndex(qs, 'callattempt_date_student_idx')
+        seq = [n for n in self.plan_nodes(qs) if n.get('Relation Name') == 'students_callattempt' and n['Node Type'] == 'Seq Scan']
+        self.assertFalse(seq, qs.explain())
+        expected = Student.objects.filter(company=self.company).filter(
+            Q(first_call_date=d) | Q(second_call_date=d) | Q(third_call_date=d)
+        )
+        self.assertEqual(set(qs.values_list('pk', flat=True)), set(expected.values_list('pk', flat=True)))
+
+    def test_call_progress(self):
+        qs = Student.objects.filter(company=self.company, done_tel=False, call_stage='first')
+        self.assertUsesIndex(qs, 'student_call_state_idx')
+
+    def test_detailed_call(self):
+        qs = Student.objects.filter(company=self.company).due_for_call(2, 'noon', today=date(2025, 8, 1))
+        self.assertUsesIndex(qs, 'student_call_state_idx')
+
+    def test_major_minor_class_lookups(self):
+        # DISTINCT は索引順（大分類・小分類）で読めること。テスト DB は VACUUM 前で Index Only Scan が
+        # 割高に見積もられるので、Sort / HashAggregate を止めて索引順で返せるかを見る
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_hashagg = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+        qs = (
+            Student.objects.filter(company=self.company, done_tel=False)
+            .values_list('major_class', 'minor_class').distinct()
+        )
+        self.assertUsesIndex(qs, 'student_open_class_idx', allow_sort=False)
+        qs = Student.objects.filter(company=self.company, done_tel=False, major_class='大分類1', minor_class='小分類2')
+        self.assertUsesIndex(qs, 'student_open_class_idx')
+
+
+
+# *****************
+# CSV 一括登録のテスト
+# *****************
+class CsvImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='A社')
+
+    def row(self, **kwargs):
+        row = {
+            'company': 'A社', 'name': 'テスト', 'phone_number': '09000000000',
+            'grad_year': '2026', 'major_class': '直確TEL', 'minor_class': 'A',
+            'full_name': '試験 太郎', 'first_call_date': '2025-07-01',
+            'first_call_timezone': 'noon', 'before_special_notes': 'タブ\tと改行\nと\\',
+        }
+        row.update(kwargs)
+        return row
+
+    def test_insert_students(self):
+        # 既存の学生（save() を通らずに履歴がずれた行）はコール履歴の同期対象にしない
+        existing = Student.objects.create(company=self.company, name='既存', first_call_date=date(2025, 6, 1))
+        existing.call_attempts.all().delete()
+
+        students = [build_student(self.company, self.row(data_id=str(i))) for i in range(25)]
+        with CaptureQueriesContext(connection) as ctx:
+            result = insert_students(students, batch_size=10)
+        self.assertEqual(result.created, 25)
+        self.assertEqual(Student.objects.count(), 26)
+        self.assertEqual(CallAttempt.objects.filter(student__data_id__isnull=False).count(), 25)
+        self.assertFalse(existing.call_attempts.exists())
+        self.assertTrue(any('"students_student"."id" >' in q['sql'] for q in ctx.captured_queries))
+
+        s = Student.objects.get(data_id='7')
+        self.assertEqual(s.before_special_notes, 'タブ\tと改行\nと\\')
+        self.assertEqual(s.first_call_date, date(2025, 7, 1))
+        self.assertEqual((s.call_stage, s.next_call_slot), ('second', 'evening'))
+        self.assertIsNotNone(s.created_at)
+        self.assertIsNone(s.third_call_date)
+
+    def test_insert_is_atomic(self):
+        students = [build_student(self.company, self.row()) for _ in range(3)]
+        students[-1].phone_number = 'x' * 100  # max_length 超過で DB エラー
+        with self.assertRaises(Exception):
+            insert_students(students, batch_size=1)
+        self.assertFalse(Student.objects.exists())
+
+
+    def csv_bytes(self, rows, encoding):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=OUTPUT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+        return out.getvalue().encode(encoding)
+
+    def test_stream_reports_all_errors(self):
+        rows = [self.row() for _ in range(10)]
+        rows[2]['grad_year'] = 'abc'
+        rows[5]['first_call_date'] = '2025/07/01'
+        rows[5]['name'] = ''
+        rows[8]['major_class'] = '未登録'
+        reader, encoding = open_csv_stream(io.BytesIO(self.csv_bytes(rows, 'cp932')))
+        self.assertEqual(encoding, 'cp932')
+
+        report = ValidationReport(max_errors=3)
+        valid = list(iter_valid_rows(reader, self.company, {'直確TEL'}, report))
+        self.assertEqual(len(valid), 7)
+        self.assertEqual(report.row_count, 10)
+        self.assertEqual(report.error_count, 4)
+        self.assertTrue(report.truncated)
+        self.assertEqual(
+            [(e.row_no, e.column) for e in report.errors],
+            [(4, 'grad_year'), (7, 'name'), (7, 'first_call_date')],
+        )
+
+
+    def test_import_job(self):
+        pattern = Pattern.objects.create(company=self.company)
+        PatternItem.objects.create(pattern=pattern, major_class='直確TEL')
+        good = SimpleUploadedFile('good.csv', self.csv_bytes([self.row() for _ in range(5)], 'utf-8-sig'))
+        bad = SimpleUploadedFile('bad.csv', self.csv_bytes([self.row(grad_year='x')], 'utf-8'))
+        good_job = enqueue_import(self.company, good)
+        bad_job = enqueue_import(self.company, bad)
+
+        self.assertEqual(process_pending_jobs(), 2)
+        self.assertEqual(process_pending_jobs(), 0)
+
+        good_job.refresh_from_db()
+        self.assertEqual((good_job.status, good_job.created_count, good_job.progress), ('succeeded', 5, 100))
+        self.assertEqual(bytes(good_job.data), b'')
+        bad_job.refresh_from_db()
+        self.assertEqual((bad_job.status, bad_job.error_count), ('failed', 1))
+        self.assertEqual(bad_job.errors[0]['column'], 'grad_year')
+        self.assertEqual(Student.objects.count(), 5)
+        self.assertEqual(CacheVersion.current(f'{CLASS_CHOICES_CACHE}:{self.company.pk}'), 1)  # 成功した 1 件だけ
+
+    def test_stalled_job_is_reclaimed(self):
+        pattern = Pattern.objects.create(company=self.company)
+        PatternItem.objects.create(pattern=pattern, major_class='直確TEL')
+        stalled_at = timezone.now() - timedelta(seconds=JOB_STALE_SECONDS + 1)
+        retry = enqueue_import(self.company, SimpleUploadedFile('a.csv', self.csv_bytes([self.row()], 'utf-8')))
+        given_up = enqueue_import(self.company, SimpleUploadedFile('b.csv', self.csv_bytes([self.row()], 'utf-8')))
+        ImportJob.objects.filter(pk=retry.pk).update(status='running', heartbeat_at=stalled_at, attempts=1)
+        ImportJob.objects.filter(pk=given_up.pk).update(status='running', heartbeat_at=stalled_at, attempts=MAX_JOB_ATTEMPTS)
+        live = enqueue_import(self.company, SimpleUploadedFile('c.csv', self.csv_bytes([self.row()], 'utf-8')))
+        ImportJob.objects.filter(pk=live.pk).update(status='running', heartbeat_at=timezone.now(), attempts=1)
+
+        self.assertEqual(process_pending_jobs(), 1)
+        retry.refresh_from_db()
+        given_up.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((retry.status, retry.attempts), ('succeeded', 2))
+        self.assertEqual(given_up.status, 'failed')
+        self.assertEqual(live.status, 'running')  # 生存確認が続いているジョブは取らない
+
+    def test_import_job_status_is_restricted(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+
+        owner = User.objects.create_user('owner', is_staff=True)
+        other = User.objects.create_user('other', is_staff=True)
+        job = enqueue_import(self.company, SimpleUploadedFile('a.csv', self.csv_bytes([self.row()], 'utf-8')), owner)
+        url = reverse('student_import_job_status', args=[job.pk])
+
+        self.assertEqual(self.client.get(url).status_code, 403)  # 未ログイン
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.assertEqual(self.client.get(url).status_code, 403)  # スタッフ以外
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)  # 他人のジョブ
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get(url).json()['id'], job.pk)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+    def import_rows(self, rows):
+        return [
+            ImportRow(i, build_student(self.company, row), frozenset(k for k in UPSERT_FIELDS if row.get(k)))
+            for i, row in enumerate(rows, start=2)
+        ]
+
+    def test_upsert(self):
+        by_id = Student.objects.create(
+            company=self.company, name='旧', data_id='A1', phone_number='090-1111-2222',
+            first_call_date=date(2025, 7, 1), first_call_notes='不在',
+        )
+        by_phone = Student.objects.create(company=self.company, name='電話', phone_number='090-3333-4444')
+        rows = self.import_rows([
+            self.row(data_id='A1', name='新', first_call_date='', first_call_timezone=''),
+            self.row(phone_number='０９０３３３３４４４４', name='電話', first_call_date='', first_call_timezone='', before_special_notes=''),
+            self.row(data_id='B1'),
+            self.row(data_id='B1', name='重複'),
+        ])
+
+        result = upsert_students(self.company, rows, dry_run=True)
+        self.assertEqual((result.created, result.updated), (1, 2))
+        self.assertIn({'row_no': 2, 'name': '新', 'field': 'name', 'old': '旧', 'new': '新'}, result.changes)
+        self.assertEqual(Student.objects.count(), 2)
+
+        rows = self.import_rows([
+            self.row(data_id='A1', name='新', first_call_date='', first_call_timezone=''),
+            self.row(phone_number='０９０３３３３４４４４', name='電話', first_call_date='', first_call_timezone='', before_special_notes=''),
+            self.row(data_id='B1'),
+            self.row(data_id='B1', name='重複'),
+        ])
+        # 照合 2 + 登録（登録前の最大 ID の取得を含む）+ 更新（一時テーブル・SAVEPOINT 含む）
+        # + コール履歴の反映で、行数に比例しない
+        with CaptureQueriesContext(connection) as queries:
+            upsert_students(self.company, rows)
+        self.assertLessEqual(len(queries), 15)
+        self.assertEqual(Student.objects.count(), 3)
+
+        by_id.refresh_from_db()
+        self.assertEqual(by_id.name, '新')
+        self.assertEqual(by_id.first_call_date, date(2025, 7, 1))  # 空欄は既存値を残す
+        self.assertEqual(by_id.first_call_notes, '不在')
+        by_phone.refresh_from_db()
+        self.assertEqual(by_phone.full_name, '試験 太郎')
+        self.assertEqual(Student.objects.get(data_id='B1').name, '重複')
+
+    def test_streaming_export(self):
+        insert_students([build_student(self.company, self.row(data_id=str(i), name='髙橋①')) for i in range(3)])
+        with self.assertNumQueries(1):
+            response = stream_students_csv(Student.objects.order_by('id'), '学生.csv')
+            body = b''.join(response.streaming_content)
+        lines = list(csv.reader(io.StringIO(body.decode('cp932'))))
+        self.assertEqual(lines[0], OUTPUT_COLUMNS)
+        self.assertEqual(len(lines), 4)
+        row = dict(zip(lines[0], lines[1]))
+        self.assertEqual((row['company'], row['name'], row['data_id']), ('A社', '髙橋①', '0'))
+        self.assertEqual((row['first_call_date'], row['done_tel'], row['second_call_date']), ('2025-07-01', 'False', ''))
+        self.assertEqual(row['before_special_notes'], 'タブ\tと改行\nと\\')
+
+    def test_filtered_export(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+
+        other = Company.objects.create(name='B社')
+        insert_students([
+            build_student(self.company, self.row(data_id='1', major_class='直確TEL')),
+            build_student(self.company, self.row(data_id='2', major_class='説明会')),
+            build_student(self.company, self.row(data_id='3', major_class='直確TEL', done_tel='True')),
+            build_student(other, self.row(data_id='4', major_class='直確TEL')),
+        ])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get(reverse('admin:students_student_export'), {
+            'company': self.company.id, 'major_class': '直確TEL', 'call_progress': 'second',
+        })
+        lines = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('cp932'))))
+        self.assertEqual([row[4] for row in lines[1:]], ['1'])
@@ -6,43 +6,13 @@ import pandas as pd
 from django.http import HttpResponse
 from django.utils import timezone
 from datetime import datetime
-from .models import Company, Student, Pattern
+from .models import Company, Student, Pattern, ImportJob
 from django.db.models import Q
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404
-
-
-# -------------------------
-# 1コール目、2コール目の時間帯から3コール目の時間帯を決定する
-# -------------------------
-def determine_third_call_timezone(first, second):
-    timezones = ['morning', 'noon', 'evening']
-    used = {first, second}
-    if len(used) == 2:
-        remaining = list(set(timezones) - used)
-        return remaining[0] if remaining else None
-    try:
-        idx = timezones.index(second)
-        return timezones[(idx + 1) % 3]
-    except ValueError:
-        return None
-
-
-
-# -------------------------
-# 編集ロックのメソッド
-# -------------------------
-@require_POST
-def lock_keepalive(request, pk):
-    student = get_object_or_404(Student, pk=pk)
-    # ロックが空いていたら取得、既に自分が持っていたら時刻更新
-    if not student.is_locked(request.user) or student.locked_by == request.user:
-        student.acquire_lock(request.user)
-        return JsonResponse({'status':'locked'})
-    return JsonResponse({'status':'busy'}, status=423)
-
-
+from .services.dashboard import build_company_dashboard
+from .services.csv_import import CSV_HEADERS, OUTPUT_COLUMNS, REQUIRED
+from .services.import_jobs import enqueue_import
 
 
 # -------------------------
@@ -58,82 +28,8 @@ def portal_index(request):
     except (ValueError, TypeError):
         sel_date = today
 
-    companies_data = []
-
-    for company in Company.objects.all():
-        # ① 日付集計（OR で合算）
-        count_on_date = Student.objects.filter(
-            company=company,
-            done_tel=False
-        ).filter(
-            Q(first_call_date=sel_date) |
-            Q(second_call_date=sel_date) |
-            Q(third_call_date=sel_date)
-        ).count()
-
-        # ② 処理必要：need_process=True & done_draft=False & done_tel=False
-        count_need_process = Student.objects.filter(
-            company=company,
-            need_process=True,
-            done_draft=False,
-            done_tel=False,
-        ).count()
-
-        # ③ Wチェック必要：done_draft=True & done_tel=False
-        count_wcheck = Student.objects.filter(
-            company=company,
-            done_draft=True,
-            done_tel=False,
-        ).count()
-
-        count1 = Student.objects.filter(
-            company=company,
-            first_call_date__isnull=True,
-            done_tel=False
-        ).count()
-
-        base2 = Student.objects.filter(
-            company=company,
-            first_call_date__isnull=False,
-            second_call_date__isnull=True,
-            first_call_date__lt=today,
-            done_tel=False
-        )
-
-        count2 = {'morning': 0, 'noon': 0, 'evening': 0}
-        for s in base2:
-            if s.first_call_timezone == 'morning':
-                count2['noon'] += 1
-            elif s.first_call_timezone == 'noon':
-                count2['evening'] += 1
-            elif s.first_call_timezone == 'evening':
-                count2['morning'] += 1
-
-        base3 = Student.objects.filter(
-            company=company,
-            first_call_date__isnull=False,
-            second_call_date__isnull=False,
-            third_call_date__isnull=True,
-            second_call_date__lt=today,
-            done_tel=False
-        )
-
-        count3 = {'morning':0,'noon':0,'evening':0}
-        for s in base3:
-            tz3 = determine_third_call_timezone(s.first_call_timezone, s.second_call_timezone)
-            if tz3 in count3:
-                count3[tz3] += 1
-
-        companies_data.append({
-            'company': company,
-            'date': sel_date.isoformat(),
-            'count_on_date': count_on_date,
-            'count_need_process': count_need_process,
-            'count_wcheck': count_wcheck,
-            'count1': count1,
-            'count2': count2,
-            'count3': count3,
-        })
+    # 全企業分のカウンタを集約クエリでまとめて取得
+    companies_data = build_company_dashboard(sel_date, today)
 
     return render(request, "portal/index.html", {
         "companies_data": companies_data,
@@ -158,45 +54,6 @@ def redirect_to_company_students(request, company_id):
 
 # ***********************************************************************************************************************************
 
-COLUMNS = [
-    # key, label, options
-    ("company", "企業名", {"required": True}),
-    ("name", "シメイ", {"required": True}),
-    ("phone_number", "電話番号", {"required": True}),
-    ("process_destination", "初回エントリー経路", {}),
-    ("data_id", "学生ID", {}),
-    ("grad_year", "卒年度", {"required": True, "type": "int"}),
-    ("major_class", "大分類", {"required": True}),
-    ("minor_class", "小分類", {"required": True}),
-    ("first_call_date", "1コール目", {"type": "date"}),
-    ("first_call_timezone", "1コール目時間区分", {}),
-    ("first_call_notes", "1コール目結果", {}),
-    ("second_call_date", "2コール目", {"type": "date"}),
-    ("second_call_timezone", "2コール目時間区分", {}),
-    ("second_call_notes", "2コール目結果", {}),
-    ("third_call_date", "3コール目", {"type": "date"}),
-    ("third_call_timezone", "3コール目時間区分", {}),
-    ("third_call_notes", "3コール目結果", {}),
-    ("need_process", "処理必要", {}),
-    ("done_draft", "Wチェ必要", {}),
-    ("done_tel", "TEL終了/処理済", {}),
-    ("before_special_notes", "TEL前特記事項", {}),
-    ("after_special_notes", "TEL後特記事項", {}),
-    ("full_name", "氏名", {"required": True}),
-    ("university", "大学", {}),
-    ("faculty", "学部", {}),
-    ("department", "学科", {}),
-    ("first_entry_date", "初回エントリー日", {"type": "date"}),
-]
-
-# ===== 派生定義（ここから下は触らない） =====
-CSV_HEADERS = [(key, label) for key, label, _ in COLUMNS]
-OUTPUT_COLUMNS = [key for key, _, _ in COLUMNS]
-REQUIRED = [key for key, _, opt in COLUMNS if opt.get("required")]
-INT_FIELDS = [key for key, _, opt in COLUMNS if opt.get("type") == "int"]
-DATE_FIELDS = [key for key, _, opt in COLUMNS if opt.get("type") == "date"]
-
-
 # -------------------------
 # CSVアップロード
 # -------------------------
@@ -206,114 +63,28 @@ def upload_csv(request, company_id):
         messages.error(request, "指定された企業が見つかりません。")
         return redirect("students:portal_index")
 
+    # ファイルを保存してジョブ化するだけで応答を返す（取り込みは run_import_worker が行う）
     if request.method == "POST" and request.FILES.get("csv_file"):
-        file = request.FILES["csv_file"]
-        raw = file.read()
-
-        text = None
-        used_enc = None
-
-        errors = []
-        for enc in ("utf-8-sig", "utf-8", "cp932", "shift_jis"):
-            try:
-                text = raw.decode(enc)
-                used_enc = enc
-                break
-            except Exception as e:
-                errors.append(f"{enc}: {type(e).__name__}: {e}")
-        else:
-            head = raw[:64].hex()
-            messages.error(request, "CSVを読み込めませんでした。\n" + "\n".join(errors) + f"\n先頭バイト: {head}")
-            return redirect(request.path)
-
-        reader = csv.DictReader(io.StringIO(text))
-
-        # ★ここに置く（関数内で完結させるならここが一番自然）
-        def parse_bool(val):
-            if val is None:
-                return False
-            return str(val).strip().lower() in ("true", "1", "yes", "y")
-
-        pattern = Pattern.objects.filter(company=company).first()
-        pattern_major_classes = set()
-        if pattern:
-            pattern_major_classes = set(pattern.items.values_list("major_class", flat=True))
-
-        rows = []
-        for row_no, row in enumerate(reader, start=2):
-            if not any((v or "").strip() for v in row.values()):
-                continue
-
-            if row.get("company") != company.name:
-                messages.error(request, f"{row_no}行目: company が一致しません。")
-                return redirect(request.path)
-
-            major_class = row.get("major_class")
-            if major_class not in pattern_major_classes:
-                messages.error(request, f"{row_no}行目: major_class '{major_class}' がパターン一覧にまだ登録されていません。")
-                return redirect(request.path)
-
-            for key in REQUIRED:
-                if not (row.get(key) or "").strip():
-                    messages.error(request, f"{row_no}行目: 「{key}」が空欄です。")
-                    return redirect(request.path)
-
-            for key in INT_FIELDS:
-                try:
-                    int((row.get(key) or "").strip())
-                except ValueError:
-                    messages.error(request, f"{row_no}行目: 「{key}」が整数ではありません。")
-                    return redirect(request.path)
-
-            for key in DATE_FIELDS:
-                val = (row.get(key) or "").strip()
-                if val:
-                    try:
-                        datetime.strptime(val, "%Y-%m-%d")
-                    except ValueError:
-                        messages.error(request, f"{row_no}行目: 「{key}」を YYYY-MM-DD 形式で入力してください。")
-                        return redirect(request.path)
-
-            rows.append(row)
-
-        created = 0
-        for row in rows:
-            Student.objects.create(
-                company=company,
-                data_id=row.get("data_id"),
-                grad_year=int(row["grad_year"]),
-                major_class=row["major_class"],
-                minor_class=row["minor_class"],
-                name=row["name"],
-                phone_number=row["phone_number"],
-                process_destination=row.get("process_destination"),
-                before_special_notes=row.get("before_special_notes"),
-                first_call_date=row.get("first_call_date") or None,
-                first_call_timezone=row.get("first_call_timezone"),
-                first_call_notes=row.get("first_call_notes"),
-                second_call_date=row.get("second_call_date") or None,
-                second_call_timezone=row.get("second_call_timezone"),
-                second_call_notes=row.get("second_call_notes"),
-                third_call_date=row.get("third_call_date") or None,
-                third_call_timezone=row.get("third_call_timezone"),
-                third_call_notes=row.get("third_call_notes"),
-                need_process=parse_bool(row.get("need_process")),
-                done_draft=parse_bool(row.get("done_draft")),
-                done_tel=parse_bool(row.get("done_tel")),
-                after_special_notes=row.get("after_special_notes"),
-                full_name=row["full_name"],
-                university=row["university"],
-                faculty=row["faculty"],
-                department=row["department"],
-                first_entry_date=row.get("first_entry_date") or None,
-            )
-            created += 1
-
-        messages.success(request, f"新規登録完了: {created} 件（encoding={used_enc}）")
-        return redirect(request.path)
+        mode = request.POST.get("mode")
+        if mode not in dict(ImportJob.MODE_CHOICES):
+            mode = "create"
+        job = enqueue_import(
+            company, request.FILES["csv_file"], request.user,
+            mode=mode,
+            dry_run=mode == "upsert" and bool(request.POST.get("dry_run")),
+        )
+        messages.info(request, f"「{job.filename}」を受け付けました。取り込み状況は下に表示されます。")
+        return redirect(f"{request.path}?job={job.pk}")
+
+    job = None
+    job_id = request.GET.get("job")
+    if job_id and job_id.isdigit():
+        job = ImportJob.objects.filter(pk=job_id, company=company).defer("data").first()
 
     return render(request, "portal/upload_csv.html", {
         "company": company,
+        "job": job,
+        "import_modes": ImportJob.MODE_CHOICES,
         "csv_headers": CSV_HEADERS,
         "required_fields": REQUIRED,
     })
@@ -321,6 +92,42 @@ def upload_csv(request, company_id):
 
 
 
+# -------------------------
+# CSV取り込みジョブの進捗（アップロード画面からポーリング）
+# ・終了後はエラー行・変更内容（氏名や電話番号の新旧の値）を返すので、スタッフのみ
+# ・見られるのは自分が登録したジョブだけ（管理画面で取り込みジョブを閲覧できるユーザーは全件）
+# -------------------------
+def import_job_status(request, job_id):
+    user = request.user
+    if not (user.is_active and user.is_staff):
+        return JsonResponse({"status": "forbidden"}, status=403)
+    jobs = ImportJob.objects.defer("data")
+    if not user.has_perm("students.view_importjob"):
+        jobs = jobs.filter(created_by=user)
+    job = get_object_or_404(jobs, pk=job_id)
+    payload = {
+        "id": job.pk,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "finished": job.is_finished,
+        "progress": job.progress,
+        "processed_rows": job.processed_rows,
+        "created_count": job.created_count,
+        "updated_count": job.updated_count,
+        "unchanged_count": job.unchanged_count,
+        "error_count": job.error_count,
+        "mode": job.mode,
+        "dry_run": job.dry_run,
+        "message": job.message,
+    }
+    if job.is_finished:
+        payload["errors"] = job.errors
+        payload["changes"] = job.changes
+    return JsonResponse(payload)
+
+
+
+
 # -------------------------
 # CSVテンプレートダウンロード
 # -------------------------